@@ -206,17 +206,22 @@ def retrieve_chunk(entry):
     entry['retrieved_contexts'] = retrieved_chunks
     return entry
 
-for e_data in data_hostpot1k:
-    question = e_data['question']
-    retrieved_chunks = []
+# batch the dense search: one vector store call per RETRIEVE_BATCH_SIZE questions
+RETRIEVE_BATCH_SIZE = 64
+
+questions = data_hostpot1k['question']
+retrieved_contexts = []
+for start in range(0, len(questions), RETRIEVE_BATCH_SIZE):
+    batch_questions = questions[start : start + RETRIEVE_BATCH_SIZE]
+    batch_nodes = dense_retriever.batch_retrieve(batch_questions)
+    for question, retrieved_nodes in zip(batch_questions, batch_nodes):
+        retrieved_nodes = model_rerank.postprocess_nodes(
+            retrieved_nodes, str_or_query_bundle=question
+        )
+        print(retrieved_nodes)
+        retrieved_contexts.append(
+            [[node.text for node in retrieved_nodes]]
+        )
 
-    retrieved_nodes = query_engine.retrieve(
-        question
-    )
-    print(retrieved_nodes)
-    retrieved_chunks.append(
-        [node.text for node in retrieved_nodes]
-    )
-    e_data['retrieved_contexts'] = retrieved_chunks
-    
-data_hostpot1k.save_to_disk("data/evaluate/")
\ No newline at end of file
+data_hostpot1k = data_hostpot1k.add_column('retrieved_contexts', retrieved_contexts)
+data_hostpot1k.save_to_disk("data/evaluate/")
@@ -25,6 +25,8 @@ class CBEventType(str, Enum):
         SYNTHESIZE: Logs for the result for synthesize calls.
         TREE: Logs for the summary and level of summaries generated.
         SUB_QUESTION: Logs for a generated sub question and answer.
+        INSERT: Logs for the rows, bytes and throughput of vector store inserts.
+        CACHE: Logs for the hits and misses of a cache lookup.
     """
 
     CHUNKING = "chunking"
@@ -41,6 +43,8 @@ class CBEventType(str, Enum):
     RERANKING = "reranking"
     EXCEPTION = "exception"
     AGENT_STEP = "agent_step"
+    INSERT = "insert"
+    CACHE = "cache"
 
 
 class EventPayload(str, Enum):
@@ -65,10 +69,18 @@ class EventPayload(str, Enum):
     TEMPLATE_VARS = "template_vars"  # template variables used in LLM call
     SYSTEM_PROMPT = "system_prompt"  # system prompt used in LLM call
     EXCEPTION = "exception"  # exception raised in an event
+    INSERT_STATS = "insert_stats"  # rows / bytes / throughput of an insert
+    CACHE_STATS = "cache_stats"  # hits / misses of a cache lookup
 
 
 # events that will never have children events
-LEAF_EVENTS = (CBEventType.CHUNKING, CBEventType.LLM, CBEventType.EMBEDDING)
+LEAF_EVENTS = (
+    CBEventType.CHUNKING,
+    CBEventType.LLM,
+    CBEventType.EMBEDDING,
+    CBEventType.INSERT,
+    CBEventType.CACHE,
+)
 
 
 @dataclass
@@ -1,7 +1,8 @@
 from typing import (
     Dict,
     Any,
-    List
+    List,
+    Optional
 )
 from dataclasses import dataclass
 
@@ -29,6 +30,20 @@ class FaissConfig:
     vectorstore_name: str
     embedding_dim: int
     index_build: str
+    # for ivf / ivfpq / opq_ivfpq / hnsw index_build
+    metric: str = "l2"
+    # ivf / pq: embeddings buffered before training, ~39 * nlist at least
+    train_sample_size: int = 100000
+    # ivf
+    nlist: int = 1024
+    nprobe: int = 8
+    # pq
+    pq_m: int = 16
+    pq_nbits: int = 8
+    # hnsw
+    hnsw_m: int = 32
+    ef_construction: int = 40
+    ef_search: int = 16
 
 @dataclass
 class NodeParserConfig:
@@ -78,6 +93,14 @@ class EmbeddingConfig:
     trust_remote_code: bool
     use_async: bool
     show_progress: bool
+    # huggingface: token budget of length-bucketed batches, None for fixed size
+    max_batch_tokens: Optional[int] = None
+    # truncate | pca | random_projection before storage, None to keep the full dim
+    reduction: Optional[str] = None
+    reduced_dim: Optional[int] = None
+    # fitted pca / random projection, loaded if it exists, else saved once fitted,
+    # None for embedding_reducer.npz in the default storage persist dir
+    reduction_path: Optional[str] = None
 
 @dataclass
 class RetrieverConfig:
@@ -97,6 +120,12 @@ class RetrieverConfig:
     vector_store_query_mode: str
     alpha: float
     sparse_top_k: int 
+    # bm25: persisted index, loaded if it exists, None to keep it in memory
+    bm25_persist_dir: Optional[str] = None
+    # bm25: processes tokenizing the nodes, None to tokenize in the calling process
+    bm25_num_workers: Optional[int] = None
+    # bm25: top k search, exhaustive or block_max pruning, same results
+    bm25_query_mode: str = "exhaustive"
 
 @dataclass
 class RerankConfig:
@@ -1,22 +1,37 @@
 """Base embeddings file."""
 
 import asyncio
+import logging
+import math
+import weakref
 from abc import abstractmethod
 from enum import Enum
-from typing import Any, Callable, Coroutine, List, Optional, Tuple, Union
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
 
 import numpy as np
 
-from rag.bridge.pydantic import Field, validator
+from rag.bridge.pydantic import Field, PrivateAttr, validator
 from rag.callbacks import CallbackManager, CBEventType, EventPayload
 from rag.schema.component import TransformComponent
 from rag.node.base_node import MetadataMode, BaseNode
 from rag.rag_utils.utils import get_tqdm_iterable
 
+from .query_cache import DEFAULT_QUERY_CACHE_SIZE, CacheLookup, QueryEmbeddingCache
+
+logger = logging.getLogger(__name__)
+
 # TODO: change to numpy array
 Embedding = List[float]
 
 DEFAULT_EMBED_BATCH_SIZE = 10
+DEFAULT_MAX_CONCURRENT_BATCHES = 8
+
+
+class LoopLocal(weakref.WeakKeyDictionary):
+    """Event loop -> asyncio objects bound to it, a copy starts empty."""
+
+    def __reduce__(self) -> Any:
+        return (self.__class__, ())
 
 
 class SimilarityMode(str, Enum):
@@ -27,9 +42,17 @@ class SimilarityMode(str, Enum):
     EUCLIDEAN = "euclidean"
 
 
-def mean_agg(embeddings: List[Embedding]) -> Embedding:
+def mean_agg(embeddings: Union[np.ndarray, List[Embedding]]) -> np.ndarray:
     """Mean aggregation for embeddings."""
-    return list(np.array(embeddings).mean(axis=0))
+    return np.asarray(embeddings).mean(axis=0)
+
+
+def as_embedding_matrix(embeddings: Any) -> np.ndarray:
+    """Get embeddings as a (num_embeddings, dim) float32 array."""
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if matrix.size == 0:
+        return matrix.reshape(len(matrix), 0)
+    return matrix
 
 
 def similarity(
@@ -64,6 +87,32 @@ class BaseEmbedding(TransformComponent):
     callback_manager: CallbackManager = Field(
         default_factory=lambda: CallbackManager([]), exclude=True
     )
+    query_cache_size: int = Field(
+        default=DEFAULT_QUERY_CACHE_SIZE,
+        description="Max number of cached query embeddings, 0 disables the cache.",
+        ge=0,
+    )
+    query_cache_ttl: Optional[float] = Field(
+        default=None,
+        description="Seconds after which a cached query embedding expires.",
+        gt=0,
+    )
+    max_concurrent_batches: int = Field(
+        default=DEFAULT_MAX_CONCURRENT_BATCHES,
+        description="Max number of batches embedded concurrently in async calls.",
+        gt=0,
+    )
+    max_retries: int = Field(
+        default=0, description="Number of retries of a failed async batch.", ge=0
+    )
+    retry_backoff: float = Field(
+        default=1.0,
+        description="Seconds before the first retry, doubled at each retry.",
+        ge=0,
+    )
+
+    _query_cache: Optional[QueryEmbeddingCache] = PrivateAttr(default=None)
+    _batch_semaphores: LoopLocal = PrivateAttr(default_factory=LoopLocal)
 
     class Config:
         arbitrary_types_allowed = True
@@ -94,16 +143,39 @@ class BaseEmbedding(TransformComponent):
         docstring for more information.
         """
 
-    def get_query_embedding(self, query: str) -> Embedding:
-        """
-        Embed the input query.
+    @property
+    def query_cache(self) -> QueryEmbeddingCache:
+        """The query embedding cache, rebuilt if its settings changed."""
+        cache = self._query_cache
+        if (
+            cache is None
+            or cache.max_size != self.query_cache_size
+            or cache.ttl != self.query_cache_ttl
+        ):
+            cache = self._query_cache = QueryEmbeddingCache(
+                max_size=self.query_cache_size, ttl=self.query_cache_ttl
+            )
+        return cache
+
+    @property
+    def query_cache_stats(self) -> Dict[str, Any]:
+        """Hits / misses / hit rate of the query embedding cache."""
+        return self.query_cache.stats
+
+    def _on_query_cache_lookup(self, lookup: CacheLookup) -> None:
+        event_id = self.callback_manager.on_event_start(CBEventType.CACHE)
+        self.callback_manager.on_event_end(
+            CBEventType.CACHE,
+            payload={
+                EventPayload.CACHE_STATS: {
+                    "lookup": lookup.value,
+                    **self.query_cache_stats,
+                }
+            },
+            event_id=event_id,
+        )
 
-        When embedding a query, depending on the model, a special instruction
-        can be prepended to the raw query string. For example, "Represent the
-        question for retrieving supporting documents: ". If you're curious,
-        other examples of predefined instructions can be found in
-        embeddings/huggingface_utils.py.
-        """
+    def _embed_query(self, query: str) -> Embedding:
         with self.callback_manager.event(
             CBEventType.EMBEDDING, payload={EventPayload.SERIALIZED: self.to_dict()}
         ) as event:
@@ -117,8 +189,7 @@ class BaseEmbedding(TransformComponent):
             )
         return query_embedding
 
-    async def aget_query_embedding(self, query: str) -> Embedding:
-        """Get query embedding."""
+    async def _aembed_query(self, query: str) -> Embedding:
         with self.callback_manager.event(
             CBEventType.EMBEDDING, payload={EventPayload.SERIALIZED: self.to_dict()}
         ) as event:
@@ -132,25 +203,152 @@ class BaseEmbedding(TransformComponent):
             )
         return query_embedding
 
+    def get_query_embedding(self, query: str) -> Embedding:
+        """
+        Embed the input query.
+
+        When embedding a query, depending on the model, a special instruction
+        can be prepended to the raw query string. For example, "Represent the
+        question for retrieving supporting documents: ". If you're curious,
+        other examples of predefined instructions can be found in
+        embeddings/huggingface_utils.py.
+
+        Query embeddings are cached (see `query_cache_size`), concurrent calls
+        for the same query share a single model call.
+        """
+        if not self.query_cache_size:
+            return self._embed_query(query)
+        query_embedding, lookup = self.query_cache.get_or_compute(
+            query, lambda: self._embed_query(query)
+        )
+        self._on_query_cache_lookup(lookup)
+        return query_embedding
+
+    async def aget_query_embedding(self, query: str) -> Embedding:
+        """Get query embedding."""
+        if not self.query_cache_size:
+            return await self._aembed_query(query)
+        query_embedding, lookup = await self.query_cache.aget_or_compute(
+            query, lambda: self._aembed_query(query)
+        )
+        self._on_query_cache_lookup(lookup)
+        return query_embedding
+
+    def _get_query_embeddings(self, queries: List[str]) -> List[Embedding]:
+        """
+        Embed the input sequence of queries synchronously.
+
+        Subclasses can implement this method if batch queries are supported.
+        """
+        # Default implementation just loops over _get_query_embedding
+        return [self._get_query_embedding(query) for query in queries]
+
+    async def _aget_query_embeddings(self, queries: List[str]) -> List[Embedding]:
+        """
+        Embed the input sequence of queries asynchronously.
+
+        Subclasses can implement this method if batch queries are supported.
+        """
+        return await asyncio.gather(
+            *[self._aget_query_embedding(query) for query in queries]
+        )
+
+    def _lookup_queries(
+        self, queries: List[str]
+    ) -> Tuple[List[Optional[Embedding]], List[str]]:
+        """Get the cached query embeddings, and the distinct queries missing."""
+        if not self.query_cache_size:
+            return [None] * len(queries), list(dict.fromkeys(queries))
+        cached = [self.query_cache.get(query) for query in queries]
+        missing_count = sum(embedding is None for embedding in cached)
+        self._on_query_cache_lookup(
+            CacheLookup.HIT if missing_count == 0 else CacheLookup.MISS
+        )
+        missing = [query for query, embedding in zip(queries, cached) if embedding is None]
+        return cached, list(dict.fromkeys(missing))
+
+    def _merge_queries(
+        self,
+        queries: List[str],
+        cached: List[Optional[Embedding]],
+        missing: List[str],
+        new_embeddings: List[Embedding],
+    ) -> List[Embedding]:
+        """Cache the new query embeddings and merge them with the cached ones."""
+        new_by_query = dict(zip(missing, new_embeddings))
+        if self.query_cache_size:
+            for query, embedding in new_by_query.items():
+                self.query_cache.put(query, embedding)
+        return [
+            embedding if embedding is not None else list(new_by_query[query])
+            for query, embedding in zip(queries, cached)
+        ]
+
+    def get_query_embedding_batch(self, queries: List[str]) -> List[Embedding]:
+        """Embed queries, the ones not cached in a single batched model call."""
+        cached, missing = self._lookup_queries(queries)
+        new_embeddings: List[Embedding] = []
+        if missing:
+            with self.callback_manager.event(
+                CBEventType.EMBEDDING,
+                payload={EventPayload.SERIALIZED: self.to_dict()},
+            ) as event:
+                new_embeddings = self._get_query_embeddings(missing)
+                event.on_end(
+                    payload={
+                        EventPayload.CHUNKS: missing,
+                        EventPayload.EMBEDDINGS: new_embeddings,
+                    },
+                )
+        return self._merge_queries(queries, cached, missing, new_embeddings)
+
+    async def aget_query_embedding_batch(self, queries: List[str]) -> List[Embedding]:
+        """Asynchronously embed queries, the ones not cached in a single batch."""
+        cached, missing = self._lookup_queries(queries)
+        new_embeddings: List[Embedding] = []
+        if missing:
+            with self.callback_manager.event(
+                CBEventType.EMBEDDING,
+                payload={EventPayload.SERIALIZED: self.to_dict()},
+            ) as event:
+                new_embeddings = await self._aget_query_embeddings(missing)
+                event.on_end(
+                    payload={
+                        EventPayload.CHUNKS: missing,
+                        EventPayload.EMBEDDINGS: new_embeddings,
+                    },
+                )
+        return self._merge_queries(queries, cached, missing, new_embeddings)
+
     def get_agg_embedding_from_queries(
         self,
         queries: List[str],
-        agg_fn: Optional[Callable[..., Embedding]] = None,
+        agg_fn: Optional[Callable[..., Any]] = None,
     ) -> Embedding:
-        """Get aggregated embedding from multiple queries."""
-        query_embeddings = [self.get_query_embedding(query) for query in queries]
+        """Get aggregated embedding from multiple queries.
+
+        The queries are embedded in one batch, agg_fn gets the embeddings as a
+        (num_queries, dim) numpy array and returns the aggregated embedding.
+        """
+        if len(queries) == 1:
+            query_embeddings = [self.get_query_embedding(queries[0])]
+        else:
+            query_embeddings = self.get_query_embedding_batch(queries)
         agg_fn = agg_fn or mean_agg
-        return agg_fn(query_embeddings)
+        return np.asarray(agg_fn(np.asarray(query_embeddings))).tolist()
 
     async def aget_agg_embedding_from_queries(
         self,
         queries: List[str],
-        agg_fn: Optional[Callable[..., Embedding]] = None,
+        agg_fn: Optional[Callable[..., Any]] = None,
     ) -> Embedding:
         """Async get aggregated embedding from multiple queries."""
-        query_embeddings = [await self.aget_query_embedding(query) for query in queries]
+        if len(queries) == 1:
+            query_embeddings = [await self.aget_query_embedding(queries[0])]
+        else:
+            query_embeddings = await self.aget_query_embedding_batch(queries)
         agg_fn = agg_fn or mean_agg
-        return agg_fn(query_embeddings)
+        return np.asarray(agg_fn(np.asarray(query_embeddings))).tolist()
 
     @abstractmethod
     def _get_text_embedding(self, text: str) -> Embedding:
@@ -230,6 +428,66 @@ class BaseEmbedding(TransformComponent):
 
         return text_embedding
 
+    def _get_text_embeddings_array(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed the input sequence of text as a (len(texts), dim) float32 array.
+
+        Subclasses computing numpy embeddings can implement this method to skip
+        the round trip through lists.
+        """
+        return as_embedding_matrix(self._get_text_embeddings(texts))
+
+    def _get_text_embedding_matrix_batched(
+        self, texts: List[str], show_progress: bool = False
+    ) -> np.ndarray:
+        """Embed texts by batches of embed_batch_size into one float32 array."""
+        blocks: List[np.ndarray] = []
+        starts = get_tqdm_iterable(
+            range(0, len(texts), self.embed_batch_size),
+            show_progress,
+            "Generating embeddings",
+        )
+        for start in starts:
+            cur_batch = texts[start : start + self.embed_batch_size]
+            with self.callback_manager.event(
+                CBEventType.EMBEDDING,
+                payload={EventPayload.SERIALIZED: self.to_dict()},
+            ) as event:
+                block = self._get_text_embeddings_array(cur_batch)
+                event.on_end(
+                    payload={
+                        EventPayload.CHUNKS: cur_batch,
+                        EventPayload.EMBEDDINGS: block,
+                    },
+                )
+            blocks.append(block)
+        if not blocks:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.concatenate(blocks)
+
+    def get_text_embedding_matrix(
+        self,
+        texts: List[str],
+        show_progress: bool = False,
+        **kwargs: Any,
+    ) -> np.ndarray:
+        """Get the text embeddings as a (len(texts), dim) float32 array.
+
+        Used when indexing, so the embeddings stay in numpy down to the vector
+        store. Models computing numpy embeddings override it to skip lists.
+        """
+        return as_embedding_matrix(
+            self.get_text_embedding_batch(texts, show_progress=show_progress, **kwargs)
+        )
+
+    async def aget_text_embedding_matrix(
+        self, texts: List[str], show_progress: bool = False
+    ) -> np.ndarray:
+        """Asynchronously get the text embeddings as a float32 array."""
+        return as_embedding_matrix(
+            await self.aget_text_embedding_batch(texts, show_progress=show_progress)
+        )
+
     def get_text_embedding_batch(
         self,
         texts: List[str],
@@ -264,61 +522,138 @@ class BaseEmbedding(TransformComponent):
 
         return result_embeddings
 
-    async def aget_text_embedding_batch(
+    def _get_batch_semaphore(self) -> asyncio.Semaphore:
+        """Semaphore bounding the concurrent batches of the running loop."""
+        loop = asyncio.get_running_loop()
+        semaphore = self._batch_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._batch_semaphores[loop] = asyncio.Semaphore(
+                self.max_concurrent_batches
+            )
+        return semaphore
+
+    def _should_retry(self, exc: Exception) -> bool:
+        """Whether a failed async embedding batch is retried.
+
+        Subclasses can override it to only retry transient errors.
+        """
+        return True
+
+    def _retry_delay(self, attempt: int) -> float:
+        """Seconds to wait before the given retry (from 1), exponential backoff."""
+        return self.retry_backoff * 2 ** (attempt - 1)
+
+    async def _aembed_batch_with_retry(self, texts: List[str]) -> List[Embedding]:
+        attempt = 0
+        while True:
+            try:
+                async with self._get_batch_semaphore():
+                    return await self._aget_text_embeddings(texts)
+            except Exception as exc:
+                attempt += 1
+                if attempt > self.max_retries or not self._should_retry(exc):
+                    raise
+                delay = self._retry_delay(attempt)
+                logger.warning(
+                    "Embedding batch failed (%s), retry %d/%d in %.1fs",
+                    exc,
+                    attempt,
+                    self.max_retries,
+                    delay,
+                )
+                await asyncio.sleep(delay)
+
+    async def aiter_text_embedding_batches(
         self, texts: List[str], show_progress: bool = False
-    ) -> List[Embedding]:
-        """Asynchronously get a list of text embeddings, with batching."""
-        cur_batch: List[str] = []
-        callback_payloads: List[Tuple[str, List[str]]] = []
-        result_embeddings: List[Embedding] = []
-        embeddings_coroutines: List[Coroutine] = []
-        for idx, text in enumerate(texts):
-            cur_batch.append(text)
-            if idx == len(texts) - 1 or len(cur_batch) == self.embed_batch_size:
-                # flush
-                event_id = self.callback_manager.on_event_start(
-                    CBEventType.EMBEDDING,
-                    payload={EventPayload.SERIALIZED: self.to_dict()},
+    ) -> AsyncIterator[Tuple[int, List[Embedding]]]:
+        """Embed texts by batches, yielding the batches as they complete.
+
+        A sliding window keeps at most `max_concurrent_batches` batches in
+        flight (a semaphore shared by the concurrent calls on this model also
+        bounds them), so only the batches not consumed yet are held in memory.
+        Failed batches are retried `max_retries` times, see `_should_retry` and
+        `_retry_delay`.
+
+        Yields:
+            Tuple[int, List[Embedding]]: the index in `texts` of the first text
+                of the batch and the batch embeddings, in completion order.
+        """
+        starts = iter(range(0, len(texts), self.embed_batch_size))
+        # task -> (start index, event id)
+        pending: Dict["asyncio.Future", Tuple[int, str]] = {}
+
+        def schedule_next() -> None:
+            start = next(starts, None)
+            if start is None:
+                return
+            event_id = self.callback_manager.on_event_start(
+                CBEventType.EMBEDDING,
+                payload={EventPayload.SERIALIZED: self.to_dict()},
+            )
+            task = asyncio.ensure_future(
+                self._aembed_batch_with_retry(
+                    texts[start : start + self.embed_batch_size]
                 )
-                callback_payloads.append((event_id, cur_batch))
-                embeddings_coroutines.append(self._aget_text_embeddings(cur_batch))
-                cur_batch = []
+            )
+            pending[task] = (start, event_id)
+
+        for _ in range(self.max_concurrent_batches):
+            schedule_next()
 
-        # flatten the results of asyncio.gather, which is a list of embeddings lists
-        nested_embeddings = []
+        progress_bar = None
         if show_progress:
             try:
                 from tqdm.auto import tqdm
 
-                nested_embeddings = [
-                    await f
-                    for f in tqdm(
-                        asyncio.as_completed(embeddings_coroutines),
-                        total=len(embeddings_coroutines),
-                        desc="Generating embeddings",
-                    )
-                ]
+                progress_bar = tqdm(
+                    total=math.ceil(len(texts) / self.embed_batch_size),
+                    desc="Generating embeddings",
+                )
             except ImportError:
-                nested_embeddings = await asyncio.gather(*embeddings_coroutines)
-        else:
-            nested_embeddings = await asyncio.gather(*embeddings_coroutines)
+                pass
 
-        result_embeddings = [
-            embedding for embeddings in nested_embeddings for embedding in embeddings
-        ]
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    start, event_id = pending.pop(task)
+                    embeddings = task.result()
+                    self.callback_manager.on_event_end(
+                        CBEventType.EMBEDDING,
+                        payload={
+                            EventPayload.CHUNKS: texts[
+                                start : start + self.embed_batch_size
+                            ],
+                            EventPayload.EMBEDDINGS: embeddings,
+                        },
+                        event_id=event_id,
+                    )
+                    if progress_bar is not None:
+                        progress_bar.update(1)
+                    # refill the window before handing the batch over
+                    schedule_next()
+                    yield start, embeddings
+        finally:
+            for task in pending:
+                task.cancel()
+            if progress_bar is not None:
+                progress_bar.close()
 
-        for (event_id, text_batch), embeddings in zip(
-            callback_payloads, nested_embeddings
-        ):
-            self.callback_manager.on_event_end(
-                CBEventType.EMBEDDING,
-                payload={
-                    EventPayload.CHUNKS: text_batch,
-                    EventPayload.EMBEDDINGS: embeddings,
-                },
-                event_id=event_id,
-            )
+    async def aget_text_embedding_batch(
+        self, texts: List[str], show_progress: bool = False
+    ) -> List[Embedding]:
+        """Asynchronously get a list of text embeddings, with batching.
 
+        At most `max_concurrent_batches` batches are embedded concurrently, see
+        `aiter_text_embedding_batches`.
+        """
+        result_embeddings: List[Embedding] = [[] for _ in texts]
+        async for start, embeddings in self.aiter_text_embedding_batches(
+            texts, show_progress=show_progress
+        ):
+            result_embeddings[start : start + len(embeddings)] = embeddings
         return result_embeddings
 
     def similarity(
@@ -0,0 +1,437 @@
+"""Persistent embedding cache.
+
+Embeddings are keyed by the content they were computed from: the embedding
+model configuration (model name, pooling, normalize, instruction, ...) and a
+hash of the `MetadataMode.EMBED` text. Rebuilding an index from the same
+documents only runs the model on the chunks that changed.
+
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from rag.bridge.pydantic import Field, PrivateAttr
+from rag.callbacks import CallbackManager, CBEventType, EventPayload
+from rag.rag_utils.utils import get_cache_dir
+
+from .base_embeddings import BaseEmbedding, Embedding, as_embedding_matrix
+
+DEFAULT_CACHE_MAX_SIZE_BYTES = 2 * 1024**3
+DEFAULT_CACHE_FNAME = "embedding_cache.sqlite3"
+
+# model attributes which change the embedding of a given text
+_MODEL_KEY_FIELDS = (
+    "model_name",
+    "pooling",
+    "normalize",
+    "text_instruction",
+    "prompts",
+    "default_prompt_name",
+    "max_length",
+)
+
+
+class BaseEmbeddingCache(ABC):
+    """Base class for embedding caches.
+
+    Caches map a key (see `CachedEmbedding.cache_key`) to an embedding, and
+    evict the least recently used embeddings once over `max_size_bytes`.
+    """
+
+    @abstractmethod
+    def get_many(self, keys: Sequence[str]) -> List[Optional[Embedding]]:
+        """Get the embeddings of the keys, None for missing keys."""
+
+    @abstractmethod
+    def put_many(self, items: Dict[str, Embedding]) -> None:
+        """Store embeddings by key."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove all embeddings."""
+
+
+class InMemoryEmbeddingCache(BaseEmbeddingCache):
+    """LRU embedding cache kept in memory.
+
+    Args:
+        max_size_bytes (int): max total size of the stored (float32) embeddings.
+
+    """
+
+    def __init__(self, max_size_bytes: int = DEFAULT_CACHE_MAX_SIZE_BYTES) -> None:
+        self.max_size_bytes = max_size_bytes
+        self._data: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[Embedding]]:
+        results: List[Optional[Embedding]] = []
+        with self._lock:
+            for key in keys:
+                embedding = self._data.get(key)
+                if embedding is None:
+                    results.append(None)
+                else:
+                    self._data.move_to_end(key)
+                    results.append(embedding.tolist())
+        return results
+
+    def put_many(self, items: Dict[str, Embedding]) -> None:
+        with self._lock:
+            for key, embedding in items.items():
+                if key in self._data:
+                    self._size_bytes -= self._data.pop(key).nbytes
+                # copy, a row must not keep the whole batch array alive
+                value = np.array(embedding, dtype=np.float32)
+                self._data[key] = value
+                self._size_bytes += value.nbytes
+            while self._size_bytes > self.max_size_bytes and self._data:
+                _, evicted = self._data.popitem(last=False)
+                self._size_bytes -= evicted.nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._size_bytes = 0
+
+
+class SQLiteEmbeddingCache(BaseEmbeddingCache):
+    """LRU embedding cache persisted in a SQLite file.
+
+    Embeddings are stored as float32 blobs with their last access time, the
+    least recently used ones are deleted once the blobs exceed `max_size_bytes`.
+
+    Args:
+        path (Optional[str]): SQLite file, defaults to a file in the cache dir.
+        max_size_bytes (int): max total size of the stored embeddings.
+
+    """
+
+    # max number of host parameters in a SQLite statement
+    _MAX_VARIABLES = 500
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_size_bytes: int = DEFAULT_CACHE_MAX_SIZE_BYTES,
+    ) -> None:
+        self.path = path or os.path.join(get_cache_dir(), DEFAULT_CACHE_FNAME)
+        self.max_size_bytes = max_size_bytes
+
+        dirpath = os.path.dirname(self.path)
+        if dirpath and not os.path.exists(dirpath):
+            os.makedirs(dirpath)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, embedding BLOB NOT NULL, "
+                "last_access REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_access "
+                "ON embeddings (last_access)"
+            )
+        self._size_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(embedding)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[Embedding]]:
+        found: Dict[str, Embedding] = {}
+        with self._lock:
+            for start in range(0, len(keys), self._MAX_VARIABLES):
+                chunk = keys[start : start + self._MAX_VARIABLES]
+                rows = self._conn.execute(
+                    "SELECT key, embedding FROM embeddings WHERE key IN "
+                    f"({','.join('?' * len(chunk))})",
+                    list(chunk),
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if found:
+                now = time.time()
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                        [(now, key) for key in found],
+                    )
+        return [found.get(key) for key in keys]
+
+    def put_many(self, items: Dict[str, Embedding]) -> None:
+        if not items:
+            return
+        now = time.time()
+        rows = [
+            (key, np.asarray(embedding, dtype=np.float32).tobytes(), now)
+            for key, embedding in items.items()
+        ]
+        with self._lock, self._conn:
+            # replaced keys are counted twice until the next size refresh,
+            # which only makes eviction slightly early
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, embedding, last_access) "
+                "VALUES (?, ?, ?)",
+                rows,
+            )
+            self._size_bytes += sum(len(blob) for _, blob, _ in rows)
+            if self._size_bytes > self.max_size_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Delete least recently used embeddings until under max_size_bytes."""
+        self._size_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(embedding)), 0) FROM embeddings"
+        ).fetchone()[0]
+        to_free = self._size_bytes - self.max_size_bytes
+        if to_free <= 0:
+            return
+        evicted_keys = []
+        cursor = self._conn.execute(
+            "SELECT key, LENGTH(embedding) FROM embeddings ORDER BY last_access"
+        )
+        for key, num_bytes in cursor:
+            evicted_keys.append((key,))
+            to_free -= num_bytes
+            self._size_bytes -= num_bytes
+            if to_free <= 0:
+                break
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", evicted_keys)
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM embeddings")
+            self._size_bytes = 0
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Embedding model wrapper looking up text embeddings in a cache first.
+
+    Text embeddings are keyed by the configuration of the wrapped model and a
+    hash of the text, only cache misses are sent to the wrapped model (with its
+    own batching). Query embeddings are only kept in the in-memory query cache.
+
+    Each batch lookup sends a CACHE event with the hits / misses of the batch
+    and the running totals, also available through `cache_stats`.
+
+    Args:
+        embed_model (BaseEmbedding): the embedding model to wrap.
+        cache (Optional[BaseEmbeddingCache]): defaults to a SQLiteEmbeddingCache.
+
+    """
+
+    embed_model: BaseEmbedding = Field(description="The wrapped embedding model.")
+    cache: Any = Field(description="The embedding cache.", exclude=True)
+
+    _model_key: str = PrivateAttr()
+    _hits: int = PrivateAttr(default=0)
+    _misses: int = PrivateAttr(default=0)
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        cache: Optional[BaseEmbeddingCache] = None,
+        callback_manager: Optional[CallbackManager] = None,
+    ) -> None:
+        super().__init__(
+            embed_model=embed_model,
+            cache=cache or SQLiteEmbeddingCache(),
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            callback_manager=callback_manager or embed_model.callback_manager,
+        )
+        model_config = {"class_name": embed_model.class_name()}
+        for field in _MODEL_KEY_FIELDS:
+            value = getattr(embed_model, field, None)
+            model_config[field] = value.value if hasattr(value, "value") else value
+        self._model_key = json.dumps(model_config, sort_keys=True, default=str)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def cache_stats(self) -> Dict[str, int]:
+        """Total cache hits / misses of this model."""
+        return {"hits": self._hits, "misses": self._misses}
+
+    def cache_key(self, text: str) -> str:
+        """Get the cache key of a text for the wrapped model."""
+        text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return hashlib.sha256(
+            f"{self._model_key}\n{text_hash}".encode("utf-8")
+        ).hexdigest()
+
+    def _lookup(self, texts: List[str]) -> List[Optional[Embedding]]:
+        """Look up texts in the cache and report the hits / misses."""
+        cached = self.cache.get_many([self.cache_key(text) for text in texts])
+        num_hits = sum(embedding is not None for embedding in cached)
+        self._hits += num_hits
+        self._misses += len(texts) - num_hits
+        event_id = self.callback_manager.on_event_start(CBEventType.CACHE)
+        self.callback_manager.on_event_end(
+            CBEventType.CACHE,
+            payload={
+                EventPayload.CACHE_STATS: {
+                    "hits": num_hits,
+                    "misses": len(texts) - num_hits,
+                    "total_hits": self._hits,
+                    "total_misses": self._misses,
+                }
+            },
+            event_id=event_id,
+        )
+        return cached
+
+    def _store(
+        self,
+        cached: List[Optional[Embedding]],
+        texts: List[str],
+        miss_idxs: List[int],
+        new_embeddings: List[Embedding],
+    ) -> List[Embedding]:
+        """Cache the new embeddings and merge them with the cached ones."""
+        self.cache.put_many(
+            {
+                self.cache_key(texts[idx]): embedding
+                for idx, embedding in zip(miss_idxs, new_embeddings)
+            }
+        )
+        for idx, embedding in zip(miss_idxs, new_embeddings):
+            cached[idx] = embedding
+        return cached  # type: ignore
+
+    def _store_matrix(
+        self,
+        cached: List[Optional[Embedding]],
+        texts: List[str],
+        miss_idxs: List[int],
+        new_embeddings: Optional[np.ndarray],
+    ) -> np.ndarray:
+        """Cache the new embeddings, merged with the cached ones in an array."""
+        if new_embeddings is None:
+            return as_embedding_matrix(cached)
+        self.cache.put_many(
+            {
+                self.cache_key(texts[idx]): embedding
+                for idx, embedding in zip(miss_idxs, new_embeddings)
+            }
+        )
+        matrix = np.empty((len(texts), new_embeddings.shape[1]), dtype=np.float32)
+        matrix[miss_idxs] = new_embeddings
+        for idx, embedding in enumerate(cached):
+            if embedding is not None:
+                matrix[idx] = embedding
+        return matrix
+
+    def get_text_embedding_matrix(
+        self,
+        texts: List[str],
+        show_progress: bool = False,
+        **kwargs: Any,
+    ) -> np.ndarray:
+        """Get the text embeddings as a float32 array, embedding cache misses only."""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        cached = self._lookup(texts)
+        miss_idxs = [idx for idx, embedding in enumerate(cached) if embedding is None]
+        new_embeddings = (
+            self.embed_model.get_text_embedding_matrix(
+                [texts[idx] for idx in miss_idxs], show_progress=show_progress, **kwargs
+            )
+            if miss_idxs
+            else None
+        )
+        return self._store_matrix(cached, texts, miss_idxs, new_embeddings)
+
+    async def aget_text_embedding_matrix(
+        self, texts: List[str], show_progress: bool = False
+    ) -> np.ndarray:
+        """Asynchronously get the text embeddings as a float32 array."""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        cached = self._lookup(texts)
+        miss_idxs = [idx for idx, embedding in enumerate(cached) if embedding is None]
+        new_embeddings = (
+            await self.embed_model.aget_text_embedding_matrix(
+                [texts[idx] for idx in miss_idxs], show_progress=show_progress
+            )
+            if miss_idxs
+            else None
+        )
+        return self._store_matrix(cached, texts, miss_idxs, new_embeddings)
+
+    def get_text_embedding_batch(
+        self,
+        texts: List[str],
+        show_progress: bool = False,
+        **kwargs: Any,
+    ) -> List[Embedding]:
+        """Get a list of text embeddings, embedding cache misses only."""
+        if not texts:
+            return []
+        cached = self._lookup(texts)
+        miss_idxs = [idx for idx, embedding in enumerate(cached) if embedding is None]
+        new_embeddings = (
+            self.embed_model.get_text_embedding_batch(
+                [texts[idx] for idx in miss_idxs], show_progress=show_progress, **kwargs
+            )
+            if miss_idxs
+            else []
+        )
+        return self._store(cached, texts, miss_idxs, new_embeddings)
+
+    async def aget_text_embedding_batch(
+        self, texts: List[str], show_progress: bool = False
+    ) -> List[Embedding]:
+        """Asynchronously get a list of text embeddings, embedding cache misses only."""
+        if not texts:
+            return []
+        cached = self._lookup(texts)
+        miss_idxs = [idx for idx, embedding in enumerate(cached) if embedding is None]
+        new_embeddings = (
+            await self.embed_model.aget_text_embedding_batch(
+                [texts[idx] for idx in miss_idxs], show_progress=show_progress
+            )
+            if miss_idxs
+            else []
+        )
+        return self._store(cached, texts, miss_idxs, new_embeddings)
+
+    def get_text_embedding(self, text: str) -> Embedding:
+        return self.get_text_embedding_batch([text])[0]
+
+    async def aget_text_embedding(self, text: str) -> Embedding:
+        return (await self.aget_text_embedding_batch([text]))[0]
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self.embed_model._get_text_embedding(text)
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return await self.embed_model._aget_text_embedding(text)
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self.embed_model._get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return await self.embed_model._aget_query_embedding(query)
+
+    def _get_query_embeddings(self, queries: List[str]) -> List[Embedding]:
+        return self.embed_model._get_query_embeddings(queries)
+
+    async def _aget_query_embeddings(self, queries: List[str]) -> List[Embedding]:
+        return await self.embed_model._aget_query_embeddings(queries)
@@ -9,6 +9,110 @@ from rag.embeddings.base_embeddings import similarity as default_similarity_fn
 from rag.vector_stores.types import VectorStoreQueryMode
 
 
+def get_top_k_cosine_rows(
+    query_embedding: Any,
+    embeddings: np.ndarray,
+    norms: Optional[np.ndarray] = None,
+    similarity_top_k: Optional[int] = None,
+    similarity_cutoff: Optional[float] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Get top rows of a 2D embedding block by cosine similarity to the query.
+
+    Scores every row with a single matrix-vector product and selects the top k
+    with ``argpartition``, so only the k winners are fully sorted.
+
+    Args:
+        query_embedding: query vector of shape (d,).
+        embeddings (np.ndarray): embedding block of shape (n, d).
+        norms (Optional[np.ndarray]): precomputed L2 norms of the rows of
+            ``embeddings``. Computed on the fly if not given.
+        similarity_top_k (Optional[int]): number of rows to return,
+            all rows if None.
+        similarity_cutoff (Optional[float]): drop rows scoring at or below this.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: similarities and row indices,
+            sorted by descending similarity.
+    """
+    if len(embeddings) == 0:
+        return np.empty((0,), dtype=np.float32), np.empty((0,), dtype=np.int64)
+
+    query_embedding_np = np.asarray(query_embedding, dtype=embeddings.dtype)
+    if norms is None:
+        norms = np.linalg.norm(embeddings, axis=1)
+
+    similarities = embeddings @ query_embedding_np
+    denominator = norms * np.linalg.norm(query_embedding_np)
+    # zero vectors have a dot product of 0, leave them at 0 instead of nan
+    np.divide(similarities, denominator, out=similarities, where=denominator > 0)
+
+    return _get_top_k_rows(similarities, similarity_top_k, similarity_cutoff)
+
+
+def get_batch_top_k_cosine_rows(
+    query_embeddings: Any,
+    embeddings: np.ndarray,
+    norms: Optional[np.ndarray] = None,
+    similarity_top_k: Optional[int] = None,
+) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Batched get_top_k_cosine_rows for a (q, d) block of query embeddings.
+
+    All queries are scored with a single matrix-matrix product.
+
+    Returns:
+        List[Tuple[np.ndarray, np.ndarray]]: similarities and row indices
+            for each query, sorted by descending similarity.
+    """
+    query_embeddings_np = np.asarray(query_embeddings, dtype=embeddings.dtype)
+    if len(embeddings) == 0:
+        return [
+            (np.empty((0,), dtype=np.float32), np.empty((0,), dtype=np.int64))
+            for _ in range(len(query_embeddings_np))
+        ]
+    if norms is None:
+        norms = np.linalg.norm(embeddings, axis=1)
+
+    # (q, n) so that each query's similarities are contiguous
+    similarities = query_embeddings_np @ embeddings.T
+    denominator = (
+        np.linalg.norm(query_embeddings_np, axis=1)[:, np.newaxis]
+        * norms[np.newaxis, :]
+    )
+    np.divide(similarities, denominator, out=similarities, where=denominator > 0)
+
+    return [
+        _get_top_k_rows(query_similarities, similarity_top_k)
+        for query_similarities in similarities
+    ]
+
+
+def _get_top_k_rows(
+    similarities: np.ndarray,
+    similarity_top_k: Optional[int] = None,
+    similarity_cutoff: Optional[float] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Select the top k entries of a 1D similarity array, best first."""
+    if similarity_cutoff is not None:
+        candidate_rows = np.flatnonzero(similarities > similarity_cutoff)
+    else:
+        candidate_rows = np.arange(len(similarities))
+
+    top_k = len(candidate_rows)
+    if similarity_top_k:
+        top_k = min(similarity_top_k, top_k)
+    if top_k == 0:
+        return similarities[:0], candidate_rows[:0]
+
+    candidate_similarities = similarities[candidate_rows]
+    if top_k < len(candidate_rows):
+        top_idxs = np.argpartition(-candidate_similarities, top_k - 1)[:top_k]
+    else:
+        top_idxs = np.arange(len(candidate_rows))
+    top_idxs = top_idxs[np.argsort(-candidate_similarities[top_idxs], kind="stable")]
+
+    return candidate_similarities[top_idxs], candidate_rows[top_idxs]
+
+
 def get_top_k_embeddings(
     query_embedding: List[float],
     embeddings: List[List[float]],
@@ -21,7 +125,15 @@ def get_top_k_embeddings(
     if embedding_ids is None:
         embedding_ids = list(range(len(embeddings)))
 
-    similarity_fn = similarity_fn or default_similarity_fn
+    if similarity_fn is None:
+        # default cosine similarity, score all embeddings at once
+        top_similarities, top_rows = get_top_k_cosine_rows(
+            query_embedding,
+            np.asarray(embeddings, dtype=np.float64),
+            similarity_top_k=similarity_top_k,
+            similarity_cutoff=similarity_cutoff,
+        )
+        return top_similarities.tolist(), [embedding_ids[row] for row in top_rows]
 
     embeddings_np = np.array(embeddings)
     query_embedding_np = np.array(query_embedding)
@@ -1,10 +1,12 @@
 import asyncio
-from typing import TYPE_CHECKING, Any, List, Optional, Sequence, Union
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
 
 from rag.bridge.pydantic import Field, PrivateAttr
-from rag.callbacks import CallbackManager
+from rag.callbacks import CallbackManager, CBEventType, EventPayload
 from rag.constants.default_huggingface import DEFAULT_HUGGINGFACE_EMBEDDING_MODEL
-from rag.rag_utils.utils import get_cache_dir, infer_torch_device
+from rag.rag_utils.utils import get_cache_dir, get_tqdm_iterable, infer_torch_device
 #TODO: change rag_utils to genral_utils
 
 from .base_embeddings import (
@@ -42,6 +44,15 @@ class HuggingFaceEmbedding(BaseEmbedding):
     device: str = Field(
         description="device to load model. Default to `cpu`"
     )
+    max_batch_tokens: Optional[int] = Field(
+        default=None,
+        description=(
+            "Token budget (batch size x longest sequence) of a batch. When set, "
+            "texts are sorted by length and batched under this budget instead of "
+            "`embed_batch_size`."
+        ),
+        gt=0,
+    )
 
     _model: Any = PrivateAttr()
     _tokenizer: Any = PrivateAttr()
@@ -60,6 +71,7 @@ class HuggingFaceEmbedding(BaseEmbedding):
         cache_folder: Optional[str] = None,
         trust_remote_code: bool = False,
         device: Optional[str] = None,
+        max_batch_tokens: Optional[int] = None,
         callback_manager: Optional[CallbackManager] = None,
     ):
         try:
@@ -78,9 +90,17 @@ class HuggingFaceEmbedding(BaseEmbedding):
             tokenizer_name = model_name or DEFAULT_HUGGINGFACE_EMBEDDING_MODEL
             print(f"Using default tokenizer of model: {model_name}")
 
+        model = AutoModel.from_pretrained(
+            model_name, cache_dir=cache_folder, trust_remote_code=trust_remote_code, token=token,
+        )
+        tokenizer = AutoTokenizer.from_pretrained(
+            tokenizer_name, cache_dir=cache_folder
+        )
+
+        # pydantic fields are passed to super().__init__, not assigned before it
         if max_length is None:
             try:
-                self.max_length = int(self._model.config.max_position_embeddings)
+                max_length = int(model.config.max_position_embeddings)
             except AttributeError as exc:
                 raise ValueError(
                     "Unable to find max_length from model config. Please specify max_length."
@@ -88,7 +108,7 @@ class HuggingFaceEmbedding(BaseEmbedding):
 
         if isinstance(pooling, str):
             try:
-                self.pooling = Pooling(pooling)
+                pooling = Pooling(pooling)
             except ValueError as exc:
                 raise NotImplementedError(
                     f"Pooling {pooling} unsupported, please pick one in"
@@ -99,21 +119,17 @@ class HuggingFaceEmbedding(BaseEmbedding):
             embed_batch_size=embedding_batch_size,
             callback_manager=callback_manager or CallbackManager(),
             model_name=model_name,
+            max_length=max_length,
+            pooling=pooling,
             device=device or infer_torch_device(),
             cache_folder=cache_folder or get_cache_dir(),
             normalize=normalize,
             query_instruction=query_instruction,
             text_instruction=text_instruction,
+            max_batch_tokens=max_batch_tokens,
         )
         # set private attribute
-        model = AutoModel.from_pretrained(
-            model_name, cache_dir=cache_folder, trust_remote_code=trust_remote_code, token=token,
-        )
         self._model = model.to(self.device)
-
-        tokenizer = AutoTokenizer.from_pretrained(
-            tokenizer_name, cache_dir=cache_folder
-        )
         self._tokenizer = tokenizer
 
     def get_model_dim(self) -> int:
@@ -138,6 +154,10 @@ class HuggingFaceEmbedding(BaseEmbedding):
 
     def _embed(self, sentences: List[str]) -> List[List[float]]:
         """Embed sentences."""
+        return self._embed_array(sentences).tolist()
+
+    def _embed_array(self, sentences: List[str]) -> np.ndarray:
+        """Embed sentences as a float32 array."""
         encoded_input = self._tokenizer(
             sentences,
             padding=True,
@@ -145,12 +165,22 @@ class HuggingFaceEmbedding(BaseEmbedding):
             truncation=True,
             return_tensors="pt",
         )
+        return self._embed_encoded(encoded_input)
+
+    def _embed_encoded(self, encoded_input: Dict[str, Any]) -> np.ndarray:
+        """Embed a padded batch of tokenized sentences."""
+        import torch
 
         # move tokenizer inputs to device
         encoded_input = {
             key: val.to(self.device) for key, val in encoded_input.items()
         }
 
+        # no autograd buffers are kept for inference
+        with torch.inference_mode():
+            return self._pool(encoded_input)
+
+    def _pool(self, encoded_input: Dict[str, Any]) -> np.ndarray:
         model_output = self._model(**encoded_input)
 
         if self.pooling == Pooling.CLS:
@@ -167,7 +197,117 @@ class HuggingFaceEmbedding(BaseEmbedding):
 
             embeddings = torch.nn.functional.normalize(embeddings, p=2, dim=1)
 
-        return embeddings.tolist()
+        return embeddings.float().cpu().numpy()
+
+    def _token_budget_batches(self, lengths: List[int]) -> List[List[int]]:
+        """Group text indices, longest first, into batches under max_batch_tokens.
+
+        A batch is padded to its first (longest) text, so its cost is its size
+        times that length. A text longer than the budget gets its own batch.
+        """
+        order = sorted(range(len(lengths)), key=lambda idx: -lengths[idx])
+        batches: List[List[int]] = []
+        batch: List[int] = []
+        for idx in order:
+            padded_length = lengths[batch[0]] if batch else lengths[idx]
+            if batch and (len(batch) + 1) * padded_length > self.max_batch_tokens:
+                batches.append(batch)
+                batch = []
+            batch.append(idx)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _get_text_embeddings_dynamic(
+        self, texts: List[str], show_progress: bool = False
+    ) -> np.ndarray:
+        """Embed texts in length-sorted batches under the token budget.
+
+        Texts are tokenized once without padding, each batch is then padded to
+        its own longest text. Embeddings are returned in the order of `texts`.
+        """
+        formatted_texts = [
+            format_text(text, self.model_name, self.text_instruction) for text in texts
+        ]
+        encoded = self._tokenizer(
+            formatted_texts, max_length=self.max_length, truncation=True
+        )
+        lengths = [len(input_ids) for input_ids in encoded["input_ids"]]
+
+        result_embeddings: Optional[np.ndarray] = None
+        batches = get_tqdm_iterable(
+            self._token_budget_batches(lengths), show_progress, "Generating embeddings"
+        )
+        for batch in batches:
+            batch_input = self._tokenizer.pad(
+                {key: [encoded[key][idx] for idx in batch] for key in encoded.keys()},
+                return_tensors="pt",
+            )
+            with self.callback_manager.event(
+                CBEventType.EMBEDDING,
+                payload={EventPayload.SERIALIZED: self.to_dict()},
+            ) as event:
+                embeddings = self._embed_encoded(batch_input)
+                event.on_end(
+                    payload={
+                        EventPayload.CHUNKS: [texts[idx] for idx in batch],
+                        EventPayload.EMBEDDINGS: embeddings,
+                    },
+                )
+            if result_embeddings is None:
+                result_embeddings = np.empty(
+                    (len(texts), embeddings.shape[1]), dtype=np.float32
+                )
+            result_embeddings[batch] = embeddings
+        if result_embeddings is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return result_embeddings
+
+    def get_text_embedding_batch(
+        self,
+        texts: List[str],
+        show_progress: bool = False,
+        **kwargs: Any,
+    ) -> List[List[float]]:
+        """Get a list of text embeddings, batched under max_batch_tokens if set."""
+        if self.max_batch_tokens is None:
+            return super().get_text_embedding_batch(
+                texts, show_progress=show_progress, **kwargs
+            )
+        if not texts:
+            return []
+        return self._get_text_embeddings_dynamic(
+            texts, show_progress=show_progress
+        ).tolist()
+
+    def get_text_embedding_matrix(
+        self,
+        texts: List[str],
+        show_progress: bool = False,
+        **kwargs: Any,
+    ) -> np.ndarray:
+        """Get the text embeddings as a float32 array, never going through lists."""
+        if self.max_batch_tokens is None:
+            return self._get_text_embedding_matrix_batched(
+                texts, show_progress=show_progress
+            )
+        return self._get_text_embeddings_dynamic(texts, show_progress=show_progress)
+
+    async def aget_text_embedding_matrix(
+        self, texts: List[str], show_progress: bool = False
+    ) -> np.ndarray:
+        """Asynchronously get the text embeddings as a float32 array."""
+        return self.get_text_embedding_matrix(texts, show_progress=show_progress)
+
+    async def aget_text_embedding_batch(
+        self, texts: List[str], show_progress: bool = False
+    ) -> List[List[float]]:
+        """Asynchronously get a list of text embeddings."""
+        if self.max_batch_tokens is None:
+            return await super().aget_text_embedding_batch(
+                texts, show_progress=show_progress
+            )
+        return self.get_text_embedding_batch(texts, show_progress=show_progress)
 
     def _get_query_embedding(self, query: str) -> List[float]:
         """Get query embedding."""
@@ -178,6 +318,18 @@ class HuggingFaceEmbedding(BaseEmbedding):
         """Get query embedding async."""
         return self._get_query_embedding(query)
 
+    def _get_query_embeddings(self, queries: List[str]) -> List[List[float]]:
+        """Get query embeddings."""
+        queries = [
+            format_query(query, self.model_name, self.query_instruction)
+            for query in queries
+        ]
+        return self._embed(queries)
+
+    async def _aget_query_embeddings(self, queries: List[str]) -> List[List[float]]:
+        """Get query embeddings async."""
+        return self._get_query_embeddings(queries)
+
     async def _aget_text_embedding(self, text: str) -> List[float]:
         """Get text embedding async."""
         return self._get_text_embedding(text)
@@ -189,7 +341,11 @@ class HuggingFaceEmbedding(BaseEmbedding):
 
     def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
         """Get text embeddings."""
+        return self._get_text_embeddings_array(texts).tolist()
+
+    def _get_text_embeddings_array(self, texts: List[str]) -> np.ndarray:
+        """Get text embeddings as a float32 array."""
         texts = [
             format_text(text, self.model_name, self.text_instruction) for text in texts
         ]
-        return self._embed(texts)
+        return self._embed_array(texts)
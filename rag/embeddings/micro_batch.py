@@ -0,0 +1,210 @@
+"""Micro-batching of concurrent query embeddings.
+
+Concurrent `aget_query_embedding` calls are queued and embedded together in one
+batched model call, trading a few milliseconds of queueing delay for the
+throughput of a full batch.
+
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from rag.bridge.pydantic import Field, PrivateAttr
+from rag.callbacks import CallbackManager
+
+from .base_embeddings import BaseEmbedding, Embedding, LoopLocal
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_MAX_WAIT_MS = 5.0
+
+
+@dataclass
+class _QueryRequest:
+    query: str
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class MicroBatchingEmbedding(BaseEmbedding):
+    """Embedding model wrapper batching concurrent async query embeddings.
+
+    A batch is sent to the wrapped model once `max_batch_size` queries are
+    queued, or `max_wait_ms` after its first query was queued, whichever comes
+    first. Batches run one at a time, queries arriving meanwhile make up the
+    next batch. Sync calls and text embeddings go to the wrapped model as is.
+
+    Queueing delays and batch sizes are reported by `batching_stats`.
+
+    Args:
+        embed_model (BaseEmbedding): the embedding model to wrap.
+        max_batch_size (int): max number of queries of a batch.
+        max_wait_ms (float): max time a query waits for its batch to fill.
+        run_in_executor (bool): run the sync `_get_query_embeddings` of the
+            wrapped model in the default executor, so the event loop keeps
+            queueing while the model runs. Set to False for models with a
+            native async implementation.
+
+    """
+
+    embed_model: BaseEmbedding = Field(description="The wrapped embedding model.")
+    max_batch_size: int = Field(
+        default=DEFAULT_MAX_BATCH_SIZE, description="Max queries per batch.", gt=0
+    )
+    max_wait_ms: float = Field(
+        default=DEFAULT_MAX_WAIT_MS,
+        description="Max time in ms a query waits for its batch to fill.",
+        ge=0,
+    )
+    run_in_executor: bool = Field(
+        default=True, description="Run the batched model call in an executor."
+    )
+
+    # event loop -> (queue, batching task)
+    _queues: LoopLocal = PrivateAttr(default_factory=LoopLocal)
+    _num_queries: int = PrivateAttr(default=0)
+    _num_batches: int = PrivateAttr(default=0)
+    _total_queue_delay: float = PrivateAttr(default=0.0)
+    _max_queue_delay: float = PrivateAttr(default=0.0)
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+        run_in_executor: bool = True,
+        callback_manager: Optional[CallbackManager] = None,
+    ) -> None:
+        super().__init__(
+            embed_model=embed_model,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            run_in_executor=run_in_executor,
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            callback_manager=callback_manager or embed_model.callback_manager,
+        )
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MicroBatchingEmbedding"
+
+    @property
+    def batching_stats(self) -> Dict[str, Any]:
+        """Running totals of the batched queries and their queueing delays."""
+        return {
+            "queries": self._num_queries,
+            "batches": self._num_batches,
+            "mean_batch_size": (
+                self._num_queries / self._num_batches if self._num_batches else 0.0
+            ),
+            "mean_queue_delay_ms": (
+                1000 * self._total_queue_delay / self._num_queries
+                if self._num_queries
+                else 0.0
+            ),
+            "max_queue_delay_ms": 1000 * self._max_queue_delay,
+        }
+
+    def _get_queue(self) -> "asyncio.Queue[_QueryRequest]":
+        """Get the queue of the running loop, starting its batching task."""
+        loop = asyncio.get_running_loop()
+        entry = self._queues.get(loop)
+        if entry is None or entry[1].done():
+            queue: "asyncio.Queue[_QueryRequest]" = asyncio.Queue()
+            task = loop.create_task(self._batch_worker(queue))
+            entry = self._queues[loop] = (queue, task)
+        return entry[0]
+
+    async def _collect_batch(
+        self, queue: "asyncio.Queue[_QueryRequest]"
+    ) -> List[_QueryRequest]:
+        """Wait for a query, then for more until the batch is full or due."""
+        batch = [await queue.get()]
+        deadline = batch[0].enqueued_at + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _batch_worker(self, queue: "asyncio.Queue[_QueryRequest]") -> None:
+        while True:
+            batch = await self._collect_batch(queue)
+            # callers cancelled while queued don't need an embedding
+            batch = [request for request in batch if not request.future.done()]
+            if batch:
+                await self._run_batch(batch)
+
+    async def _run_batch(self, batch: List[_QueryRequest]) -> None:
+        started_at = time.perf_counter()
+        queue_delays = [started_at - request.enqueued_at for request in batch]
+        self._num_queries += len(batch)
+        self._num_batches += 1
+        self._total_queue_delay += sum(queue_delays)
+        self._max_queue_delay = max(self._max_queue_delay, *queue_delays)
+
+        queries = list(dict.fromkeys(request.query for request in batch))
+        try:
+            if self.run_in_executor:
+                embeddings = await asyncio.get_running_loop().run_in_executor(
+                    None, self.embed_model._get_query_embeddings, queries
+                )
+            else:
+                embeddings = await self.embed_model._aget_query_embeddings(queries)
+        except Exception as exc:
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(exc)
+            return
+
+        logger.debug(
+            "Embedded a batch of %d queries in %.1f ms, max queueing delay %.1f ms",
+            len(queries),
+            1000 * (time.perf_counter() - started_at),
+            1000 * max(queue_delays),
+        )
+        embedding_by_query = dict(zip(queries, embeddings))
+        for request in batch:
+            if not request.future.done():
+                request.future.set_result(list(embedding_by_query[request.query]))
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        request = _QueryRequest(
+            query=query, future=asyncio.get_running_loop().create_future()
+        )
+        self._get_queue().put_nowait(request)
+        return await request.future
+
+    async def _aget_query_embeddings(self, queries: List[str]) -> List[Embedding]:
+        return await asyncio.gather(
+            *[self._aget_query_embedding(query) for query in queries]
+        )
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self.embed_model._get_query_embedding(query)
+
+    def _get_query_embeddings(self, queries: List[str]) -> List[Embedding]:
+        return self.embed_model._get_query_embeddings(queries)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self.embed_model._get_text_embedding(text)
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return await self.embed_model._aget_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self.embed_model._get_text_embeddings(texts)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return await self.embed_model._aget_text_embeddings(texts)
@@ -0,0 +1,245 @@
+"""Multi-process embedding pool.
+
+Shards embedding batches across worker processes, each holding its own copy of
+the model, to scale CPU embedding with the number of cores.
+
+"""
+import asyncio
+import contextvars
+import multiprocessing
+from collections import deque
+from functools import partial
+from itertools import islice
+from typing import Any, Callable, Deque, List, Optional, Tuple, TypeVar
+
+import numpy as np
+
+from rag.bridge.pydantic import Field, PrivateAttr
+from rag.callbacks import CallbackManager, CBEventType, EventPayload
+from rag.rag_utils.utils import get_tqdm_iterable
+
+from .base_embeddings import DEFAULT_EMBED_BATCH_SIZE, BaseEmbedding, Embedding
+
+T = TypeVar("T")
+
+# model of the current worker process, built by _init_worker
+_worker_embed_model: Optional[BaseEmbedding] = None
+
+
+def _init_worker(
+    embed_model_factory: Callable[[], BaseEmbedding], num_threads: int
+) -> None:
+    """Pin the torch threads of the worker and load its model copy."""
+    global _worker_embed_model
+    try:
+        import torch
+
+        torch.set_num_threads(num_threads)
+        torch.set_num_interop_threads(1)
+    except ImportError:
+        pass
+    _worker_embed_model = embed_model_factory()
+
+
+def _embed_texts(texts: List[str]) -> np.ndarray:
+    assert _worker_embed_model is not None
+    # arrays are much cheaper than lists of floats to send back
+    return _worker_embed_model._get_text_embeddings_array(texts)
+
+
+def _embed_query(query: str) -> Embedding:
+    assert _worker_embed_model is not None
+    return _worker_embed_model._get_query_embedding(query)
+
+
+def _embed_queries(queries: List[str]) -> List[Embedding]:
+    assert _worker_embed_model is not None
+    return _worker_embed_model._get_query_embeddings(queries)
+
+
+class MultiProcessEmbedding(BaseEmbedding):
+    """Embedding model running in a pool of worker processes.
+
+    Each worker builds its own model with `embed_model_factory` and pins torch
+    to `num_threads_per_worker` threads, so the workers do not oversubscribe
+    the cores. Text batches of `embed_batch_size` are sharded across workers
+    and streamed back in order, with at most num_workers batches in flight.
+    Queries are embedded by a worker too, so the model is never loaded in the
+    calling process. The async methods wait for the workers in a thread, off
+    the event loop.
+
+    Workers are started with `spawn` on first use and kept until `close()`.
+
+    Args:
+        embed_model_factory (Callable[[], BaseEmbedding]): builds the model in
+            each worker. Must be picklable, e.g. a module level function or a
+            `functools.partial(HuggingFaceEmbedding, model_name=...)`.
+        num_workers (Optional[int]): number of worker processes, defaults to
+            the number of CPUs.
+        num_threads_per_worker (Optional[int]): torch threads of each worker,
+            defaults to the number of CPUs divided by num_workers.
+
+    """
+
+    embed_model_factory: Callable[[], BaseEmbedding] = Field(
+        description="Builds the embedding model in each worker.", exclude=True
+    )
+    num_workers: int = Field(description="Number of worker processes.", gt=0)
+    num_threads_per_worker: int = Field(
+        description="Number of torch threads of each worker.", gt=0
+    )
+
+    _pool: Any = PrivateAttr(default=None)
+
+    def __init__(
+        self,
+        embed_model_factory: Callable[[], BaseEmbedding],
+        num_workers: Optional[int] = None,
+        num_threads_per_worker: Optional[int] = None,
+        model_name: str = "unknown",
+        embed_batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
+        callback_manager: Optional[CallbackManager] = None,
+    ) -> None:
+        num_workers = num_workers or multiprocessing.cpu_count()
+        super().__init__(
+            embed_model_factory=embed_model_factory,
+            num_workers=num_workers,
+            num_threads_per_worker=num_threads_per_worker
+            or max(1, multiprocessing.cpu_count() // num_workers),
+            model_name=model_name,
+            embed_batch_size=embed_batch_size,
+            callback_manager=callback_manager or CallbackManager([]),
+        )
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MultiProcessEmbedding"
+
+    def _get_pool(self) -> Any:
+        if self._pool is None:
+            self._pool = multiprocessing.get_context("spawn").Pool(
+                self.num_workers,
+                initializer=_init_worker,
+                initargs=(self.embed_model_factory, self.num_threads_per_worker),
+            )
+        return self._pool
+
+    def close(self) -> None:
+        """Stop the worker processes."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    async def _run_async(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run a call blocking on the workers in the default thread executor."""
+        # keep the callback trace of the calling task in the thread
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, partial(context.run, func, *args, **kwargs)
+        )
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._get_pool().apply(_embed_query, (query,))
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return await self._run_async(self._get_query_embedding, query)
+
+    def _get_query_embeddings(self, queries: List[str]) -> List[Embedding]:
+        return self._get_pool().apply(_embed_queries, (queries,))
+
+    async def _aget_query_embeddings(self, queries: List[str]) -> List[Embedding]:
+        return await self._run_async(self._get_query_embeddings, queries)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._get_pool().apply(_embed_texts, ([text],))[0].tolist()
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self._get_text_embeddings_array(texts).tolist()
+
+    def _get_text_embeddings_array(self, texts: List[str]) -> np.ndarray:
+        return self._get_pool().apply(_embed_texts, (texts,))
+
+    def get_text_embedding_matrix(
+        self,
+        texts: List[str],
+        show_progress: bool = False,
+        **kwargs: Any,
+    ) -> np.ndarray:
+        """Get the text embeddings as a float32 array, embedded by the workers."""
+        batches = [
+            texts[start : start + self.embed_batch_size]
+            for start in range(0, len(texts), self.embed_batch_size)
+        ]
+        if not batches:
+            return np.empty((0, 0), dtype=np.float32)
+
+        pool = self._get_pool()
+        # (batch, event id, async result) of the batches sent to the workers
+        in_flight: Deque[Tuple[List[str], str, Any]] = deque()
+
+        def dispatch(batch: List[str]) -> None:
+            # one event per batch, from its dispatch to its result
+            event_id = self.callback_manager.on_event_start(
+                CBEventType.EMBEDDING,
+                payload={EventPayload.SERIALIZED: self.to_dict()},
+            )
+            in_flight.append(
+                (batch, event_id, pool.apply_async(_embed_texts, (batch,)))
+            )
+
+        def collect() -> np.ndarray:
+            batch, event_id, result = in_flight.popleft()
+            block = result.get()
+            self.callback_manager.on_event_end(
+                CBEventType.EMBEDDING,
+                payload={
+                    EventPayload.CHUNKS: batch,
+                    EventPayload.EMBEDDINGS: block,
+                },
+                event_id=event_id,
+            )
+            return block
+
+        pending = iter(batches)
+        for batch in islice(pending, self.num_workers):
+            dispatch(batch)
+        result_blocks: List[np.ndarray] = []
+        for _ in get_tqdm_iterable(
+            range(len(batches)), show_progress, "Generating embeddings"
+        ):
+            result_blocks.append(collect())
+            next_batch = next(pending, None)
+            if next_batch is not None:
+                dispatch(next_batch)
+        return np.concatenate(result_blocks)
+
+    async def aget_text_embedding_matrix(
+        self, texts: List[str], show_progress: bool = False
+    ) -> np.ndarray:
+        """Asynchronously get the text embeddings as a float32 array."""
+        return await self._run_async(
+            self.get_text_embedding_matrix, texts, show_progress=show_progress
+        )
+
+    def get_text_embedding_batch(
+        self,
+        texts: List[str],
+        show_progress: bool = False,
+        **kwargs: Any,
+    ) -> List[Embedding]:
+        """Get a list of text embeddings, batches embedded by the workers."""
+        if not texts:
+            return []
+        return self.get_text_embedding_matrix(
+            texts, show_progress=show_progress
+        ).tolist()
+
+    async def aget_text_embedding_batch(
+        self, texts: List[str], show_progress: bool = False
+    ) -> List[Embedding]:
+        """Asynchronously get a list of text embeddings."""
+        return await self._run_async(
+            self.get_text_embedding_batch, texts, show_progress=show_progress
+        )
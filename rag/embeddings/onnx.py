@@ -0,0 +1,338 @@
+"""ONNX Runtime embedding backend.
+
+The configured huggingface model is exported to ONNX once, optionally int8
+quantized, and cached in the cache dir. Inference runs with ONNX Runtime on
+CPU, with the same pooling, normalize and instructions as HuggingFaceEmbedding.
+
+"""
+import os
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+from rag.bridge.pydantic import Field, PrivateAttr
+from rag.callbacks import CallbackManager
+from rag.constants.default_huggingface import DEFAULT_HUGGINGFACE_EMBEDDING_MODEL
+from rag.rag_utils.utils import get_cache_dir
+
+from .base_embeddings import DEFAULT_EMBED_BATCH_SIZE, BaseEmbedding, Embedding
+from .huggingface import DEFAULT_HUGGINGFACE_LENGTH
+from .pooling import Pooling
+from .utils import format_query, format_text
+
+ONNX_OPSET_VERSION = 14
+
+
+def get_onnx_model_path(
+    model_name: str, quantize: bool = False, cache_folder: Optional[str] = None
+) -> str:
+    """Get the path of the cached ONNX export of a model."""
+    cache_folder = cache_folder or get_cache_dir()
+    fname = "model.int8.onnx" if quantize else "model.onnx"
+    return os.path.join(cache_folder, "onnx", model_name.replace("/", "__"), fname)
+
+
+class OnnxEmbedding(BaseEmbedding):
+    """Huggingface embedding model served with ONNX Runtime.
+
+    On first use of a model, it is exported to ONNX (and quantized with dynamic
+    int8 quantization if `quantize`), the export is then reused from
+    `get_onnx_model_path`. Use `check_parity` to compare the embeddings with the
+    torch path of HuggingFaceEmbedding.
+
+    Args:
+        model_name (Optional[str]): huggingface model to export.
+        tokenizer_name (Optional[str]): defaults to model_name.
+        pooling (Union[str, Pooling]): "cls" or "mean".
+        max_length (Optional[int]): max number of tokens of an input.
+        normalize (bool): L2 normalize the embeddings.
+        quantize (bool): use the dynamic int8 quantized export.
+        num_threads (Optional[int]): intra op threads of the ONNX Runtime
+            session, defaults to ONNX Runtime's choice.
+
+    """
+
+    max_length: int = Field(
+        default=DEFAULT_HUGGINGFACE_LENGTH, description="Maximum length of input.", gt=0
+    )
+    pooling: Pooling = Field(default=Pooling.CLS, description="Pooling strategy.")
+    normalize: bool = Field(default=True, description="Normalize embeddings or not.")
+    query_instruction: Optional[str] = Field(
+        description="Instruction to prepend to query text."
+    )
+    text_instruction: Optional[str] = Field(
+        description="Instruction to prepend to text."
+    )
+    cache_folder: Optional[str] = Field(
+        description="Cache folder for huggingface and ONNX files."
+    )
+    quantize: bool = Field(default=False, description="Use the int8 quantized model.")
+    onnx_path: str = Field(description="Path of the ONNX model.")
+
+    _session: Any = PrivateAttr()
+    _tokenizer: Any = PrivateAttr()
+    _input_names: List[str] = PrivateAttr()
+    _tokenizer_name: str = PrivateAttr()
+    _token: Optional[str] = PrivateAttr()
+    _trust_remote_code: bool = PrivateAttr()
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        tokenizer_name: Optional[str] = None,
+        pooling: Union[str, Pooling] = "cls",
+        max_length: int = DEFAULT_HUGGINGFACE_LENGTH,
+        query_instruction: Optional[str] = None,
+        text_instruction: Optional[str] = None,
+        normalize: bool = True,
+        quantize: bool = False,
+        embedding_batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
+        token: Optional[str] = None,
+        cache_folder: Optional[str] = None,
+        trust_remote_code: bool = False,
+        num_threads: Optional[int] = None,
+        callback_manager: Optional[CallbackManager] = None,
+    ):
+        try:
+            import onnxruntime
+            from transformers import AutoTokenizer
+        except ImportError:
+            raise ImportError(
+                "OnnxEmbedding requires onnxruntime and transformers to be installed.\n"
+                "Please install them with `pip install onnxruntime transformers`."
+            )
+
+        model_name = model_name or DEFAULT_HUGGINGFACE_EMBEDDING_MODEL
+        tokenizer_name = tokenizer_name or model_name
+
+        if isinstance(pooling, str):
+            try:
+                pooling = Pooling(pooling)
+            except ValueError as exc:
+                raise NotImplementedError(
+                    f"Pooling {pooling} unsupported, please pick one in"
+                    f" {[p.value for p in Pooling]}."
+                ) from exc
+
+        super().__init__(
+            embed_batch_size=embedding_batch_size,
+            callback_manager=callback_manager or CallbackManager(),
+            model_name=model_name,
+            max_length=max_length,
+            pooling=pooling,
+            normalize=normalize,
+            query_instruction=query_instruction,
+            text_instruction=text_instruction,
+            cache_folder=cache_folder or get_cache_dir(),
+            quantize=quantize,
+            onnx_path=get_onnx_model_path(model_name, quantize, cache_folder),
+        )
+        self._tokenizer_name = tokenizer_name
+        self._token = token
+        self._trust_remote_code = trust_remote_code
+        self._tokenizer = AutoTokenizer.from_pretrained(
+            tokenizer_name, cache_dir=cache_folder, token=token
+        )
+
+        if not os.path.exists(self.onnx_path):
+            self._export()
+
+        session_options = onnxruntime.SessionOptions()
+        session_options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        if num_threads:
+            session_options.intra_op_num_threads = num_threads
+        self._session = onnxruntime.InferenceSession(
+            self.onnx_path, session_options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = [
+            model_input.name for model_input in self._session.get_inputs()
+        ]
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "OnnxEmbedding"
+
+    def _export(self) -> None:
+        """Export the model to ONNX, then quantize it if needed."""
+        import torch
+        from transformers import AutoModel
+
+        fp32_path = get_onnx_model_path(self.model_name, False, self.cache_folder)
+        os.makedirs(os.path.dirname(fp32_path), exist_ok=True)
+
+        if not os.path.exists(fp32_path):
+            model = AutoModel.from_pretrained(
+                self.model_name,
+                cache_dir=self.cache_folder,
+                token=self._token,
+                trust_remote_code=self._trust_remote_code,
+            )
+            model.eval()
+            dummy_input = dict(self._tokenizer(["onnx export"], return_tensors="pt"))
+            dynamic_axes: Dict[str, Dict[int, str]] = {
+                name: {0: "batch", 1: "sequence"} for name in dummy_input
+            }
+            dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+            # write to a temporary file so an interrupted export is not reused
+            tmp_path = fp32_path + ".tmp"
+            with torch.no_grad():
+                torch.onnx.export(
+                    model,
+                    (dummy_input,),
+                    tmp_path,
+                    input_names=list(dummy_input),
+                    output_names=["last_hidden_state"],
+                    dynamic_axes=dynamic_axes,
+                    opset_version=ONNX_OPSET_VERSION,
+                    do_constant_folding=True,
+                )
+            os.replace(tmp_path, fp32_path)
+
+        if self.quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            tmp_path = self.onnx_path + ".tmp"
+            quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+            os.replace(tmp_path, self.onnx_path)
+
+    def _embed(self, sentences: List[str]) -> List[List[float]]:
+        """Embed sentences."""
+        return self._embed_array(sentences).tolist()
+
+    def _embed_array(self, sentences: List[str]) -> np.ndarray:
+        """Embed sentences as a float32 array."""
+        encoded_input = self._tokenizer(
+            sentences,
+            padding=True,
+            max_length=self.max_length,
+            truncation=True,
+            return_tensors="np",
+        )
+        feeds = {
+            name: encoded_input[name].astype(np.int64)
+            for name in self._input_names
+            if name in encoded_input
+        }
+        token_embeddings = self._session.run(None, feeds)[0]
+
+        if self.pooling == Pooling.CLS:
+            embeddings = self.pooling.cls_pooling(token_embeddings)
+        else:
+            # mean over the non padding tokens only
+            attention_mask = encoded_input["attention_mask"][..., None].astype(
+                token_embeddings.dtype
+            )
+            embeddings = (token_embeddings * attention_mask).sum(axis=1) / np.clip(
+                attention_mask.sum(axis=1), 1e-9, None
+            )
+
+        if self.normalize:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.clip(norms, 1e-12, None)
+
+        return embeddings.astype(np.float32, copy=False)
+
+    def check_parity(
+        self, texts: List[str], min_cosine_similarity: float = 0.99
+    ) -> float:
+        """Compare the embeddings with the torch path of HuggingFaceEmbedding.
+
+        Args:
+            texts (List[str]): texts to embed with both backends.
+            min_cosine_similarity (float): lowest accepted cosine similarity
+                between the two embeddings of a text.
+
+        Returns:
+            float: the lowest cosine similarity over texts.
+
+        Raises:
+            ValueError: if an embedding is below min_cosine_similarity.
+        """
+        from .huggingface import HuggingFaceEmbedding
+
+        torch_embed_model = HuggingFaceEmbedding(
+            model_name=self.model_name,
+            tokenizer_name=self._tokenizer_name,
+            pooling=self.pooling,
+            max_length=self.max_length,
+            normalize=self.normalize,
+            token=self._token,
+            cache_folder=self.cache_folder,
+            trust_remote_code=self._trust_remote_code,
+            device="cpu",
+        )
+        onnx_embeddings = self._embed_array(texts)
+        torch_embeddings = np.array(torch_embed_model._embed(texts))
+
+        cosine_similarities = (onnx_embeddings * torch_embeddings).sum(axis=1) / (
+            np.linalg.norm(onnx_embeddings, axis=1)
+            * np.linalg.norm(torch_embeddings, axis=1)
+        )
+        lowest = float(cosine_similarities.min())
+        if lowest < min_cosine_similarity:
+            raise ValueError(
+                f"ONNX embeddings of {self.onnx_path} diverge from the torch model: "
+                f"cosine similarity {lowest:.4f} < {min_cosine_similarity}."
+            )
+        return lowest
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        """Get query embedding."""
+        query = format_query(query, self.model_name, self.query_instruction)
+        return self._embed([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        """Get query embedding async."""
+        return self._get_query_embedding(query)
+
+    def _get_query_embeddings(self, queries: List[str]) -> List[Embedding]:
+        """Get query embeddings."""
+        queries = [
+            format_query(query, self.model_name, self.query_instruction)
+            for query in queries
+        ]
+        return self._embed(queries)
+
+    async def _aget_query_embeddings(self, queries: List[str]) -> List[Embedding]:
+        """Get query embeddings async."""
+        return self._get_query_embeddings(queries)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        """Get text embedding."""
+        text = format_text(text, self.model_name, self.text_instruction)
+        return self._embed([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        """Get text embedding async."""
+        return self._get_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        """Get text embeddings."""
+        return self._get_text_embeddings_array(texts).tolist()
+
+    def _get_text_embeddings_array(self, texts: List[str]) -> np.ndarray:
+        """Get text embeddings as a float32 array."""
+        texts = [
+            format_text(text, self.model_name, self.text_instruction) for text in texts
+        ]
+        return self._embed_array(texts)
+
+    def get_text_embedding_matrix(
+        self,
+        texts: List[str],
+        show_progress: bool = False,
+        **kwargs: Any,
+    ) -> np.ndarray:
+        """Get the text embeddings as a float32 array, never going through lists."""
+        return self._get_text_embedding_matrix_batched(
+            texts, show_progress=show_progress
+        )
+
+    async def aget_text_embedding_matrix(
+        self, texts: List[str], show_progress: bool = False
+    ) -> np.ndarray:
+        """Asynchronously get the text embeddings as a float32 array."""
+        return self.get_text_embedding_matrix(texts, show_progress=show_progress)
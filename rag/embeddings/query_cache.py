@@ -0,0 +1,210 @@
+"""Query embedding cache.
+
+Size bounded LRU cache of query embeddings, with an optional TTL. Concurrent
+lookups of a query which is being embedded wait for the running model call
+instead of starting their own.
+
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+DEFAULT_QUERY_CACHE_SIZE = 1024
+
+
+class CacheLookup(str, Enum):
+    """Outcome of a cache lookup."""
+
+    HIT = "hit"
+    MISS = "miss"
+    COALESCED = "coalesced"  # waited for an in-flight model call
+
+
+class QueryEmbeddingCache:
+    """Thread safe LRU cache of query embeddings with request coalescing.
+
+    Args:
+        max_size (int): max number of cached queries.
+        ttl (Optional[float]): seconds after which a cached embedding expires,
+            never expires if None.
+
+    """
+
+    def __init__(
+        self, max_size: int = DEFAULT_QUERY_CACHE_SIZE, ttl: Optional[float] = None
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._init_state()
+
+    def _init_state(self) -> None:
+        # query -> (embedding, expiry time)
+        self._data: "OrderedDict[str, Tuple[List[float], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        # asyncio futures are bound to their loop, hence keyed by loop too
+        self._async_in_flight: Dict[Tuple[int, str], asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # locks and futures can't be pickled, the copy starts empty
+        return {"max_size": self.max_size, "ttl": self.ttl}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._init_state()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """Running totals of the lookups."""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "size": len(self._data),
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+    def clear(self) -> None:
+        """Remove all cached embeddings, in-flight calls are left running."""
+        with self._lock:
+            self._data.clear()
+
+    def _get(self, query: str) -> Optional[List[float]]:
+        """Get a cached embedding, must hold the lock."""
+        item = self._data.get(query)
+        if item is None:
+            return None
+        embedding, expiry = item
+        if expiry < time.monotonic():
+            del self._data[query]
+            self.expirations += 1
+            return None
+        self._data.move_to_end(query)
+        return embedding
+
+    def _put(self, query: str, embedding: List[float]) -> None:
+        """Cache an embedding, must hold the lock."""
+        expiry = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        self._data[query] = (list(embedding), expiry)
+        self._data.move_to_end(query)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, query: str) -> Optional[List[float]]:
+        """Get a copy of the cached embedding of a query, None on a miss."""
+        with self._lock:
+            embedding = self._get(query)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return list(embedding)
+
+    def put(self, query: str, embedding: List[float]) -> None:
+        """Cache the embedding of a query."""
+        with self._lock:
+            self._put(query, embedding)
+
+    def get_or_compute(
+        self, query: str, compute: Callable[[], List[float]]
+    ) -> Tuple[List[float], CacheLookup]:
+        """Get the embedding of a query, calling compute on a miss.
+
+        Returns:
+            Tuple[List[float], CacheLookup]: a copy of the embedding and the
+                outcome of the lookup.
+        """
+        with self._lock:
+            embedding = self._get(query)
+            if embedding is not None:
+                self.hits += 1
+                return list(embedding), CacheLookup.HIT
+            future = self._in_flight.get(query)
+            if future is None:
+                future = self._in_flight[query] = Future()
+                self.misses += 1
+                lookup = CacheLookup.MISS
+            else:
+                self.coalesced += 1
+                lookup = CacheLookup.COALESCED
+
+        if lookup == CacheLookup.COALESCED:
+            return list(future.result()), lookup
+
+        try:
+            embedding = compute()
+        except BaseException as exc:
+            with self._lock:
+                del self._in_flight[query]
+            future.set_exception(exc)
+            raise
+        with self._lock:
+            self._put(query, embedding)
+            del self._in_flight[query]
+        future.set_result(embedding)
+        return list(embedding), lookup
+
+    async def aget_or_compute(
+        self, query: str, acompute: Callable[[], Awaitable[List[float]]]
+    ) -> Tuple[List[float], CacheLookup]:
+        """Asynchronously get the embedding of a query, awaiting acompute on a miss.
+
+        Returns:
+            Tuple[List[float], CacheLookup]: a copy of the embedding and the
+                outcome of the lookup.
+        """
+        loop = asyncio.get_running_loop()
+        in_flight_key = (id(loop), query)
+        with self._lock:
+            embedding = self._get(query)
+            if embedding is not None:
+                self.hits += 1
+                return list(embedding), CacheLookup.HIT
+            future = self._async_in_flight.get(in_flight_key)
+            if future is None:
+                future = self._async_in_flight[in_flight_key] = loop.create_future()
+                # don't warn about an exception nobody else was waiting for
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                self.misses += 1
+                lookup = CacheLookup.MISS
+            else:
+                self.coalesced += 1
+                lookup = CacheLookup.COALESCED
+
+        if lookup == CacheLookup.COALESCED:
+            # a cancelled waiter must not cancel the shared call
+            return list(await asyncio.shield(future)), lookup
+
+        try:
+            embedding = await acompute()
+        except asyncio.CancelledError:
+            with self._lock:
+                del self._async_in_flight[in_flight_key]
+            future.cancel()
+            raise
+        except BaseException as exc:
+            with self._lock:
+                del self._async_in_flight[in_flight_key]
+            future.set_exception(exc)
+            raise
+        with self._lock:
+            self._put(query, embedding)
+            del self._async_in_flight[in_flight_key]
+        future.set_result(embedding)
+        return list(embedding), lookup
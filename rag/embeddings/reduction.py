@@ -0,0 +1,391 @@
+"""Dimensionality reduction of embeddings.
+
+Embeddings are reduced before they are stored and queried, by truncation for
+Matryoshka-style models, or by a PCA / random projection fitted on a sample of
+the corpus. Halving the dimension roughly halves the memory, disk and
+search cost of the vector store.
+
+"""
+import logging
+import os
+from enum import Enum
+from typing import Any, List, Optional, Union
+
+import numpy as np
+
+from rag.bridge.pydantic import Field
+from rag.callbacks import CallbackManager
+from rag.constants.default_storage import DEFAULT_PERSIST_DIR
+
+from .base_embeddings import BaseEmbedding, Embedding, as_embedding_matrix
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FIT_SAMPLE_SIZE = 10_000
+
+# the fitted reducer is saved next to the persisted storage context
+DEFAULT_REDUCER_FNAME = "embedding_reducer.npz"
+DEFAULT_PERSIST_PATH = os.path.join(DEFAULT_PERSIST_DIR, DEFAULT_REDUCER_FNAME)
+
+
+class DimensionReduction(str, Enum):
+    """Dimensionality reduction methods."""
+
+    TRUNCATE = "truncate"  # keep the first dimensions, for Matryoshka models
+    PCA = "pca"
+    RANDOM_PROJECTION = "random_projection"
+
+
+class EmbeddingReducer:
+    """Linear map of embeddings to `output_dim` dimensions.
+
+    Args:
+        method (Union[str, DimensionReduction]): truncate, pca or
+            random_projection. pca and random_projection must be fitted.
+        output_dim (int): dimension of the reduced embeddings.
+        normalize (bool): L2 normalize the reduced embeddings.
+        seed (int): seed of the random projection.
+
+    """
+
+    def __init__(
+        self,
+        method: Union[str, DimensionReduction],
+        output_dim: int,
+        normalize: bool = True,
+        seed: int = 0,
+    ) -> None:
+        if output_dim <= 0:
+            raise ValueError(f"output_dim must be positive, got {output_dim}.")
+        self.method = DimensionReduction(method)
+        self.output_dim = output_dim
+        self.normalize = normalize
+        self.seed = seed
+        self.mean: Optional[np.ndarray] = None
+        # (input_dim, output_dim) projection
+        self.components: Optional[np.ndarray] = None
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.method == DimensionReduction.TRUNCATE or self.components is not None
+
+    def fit(self, embeddings: Any) -> "EmbeddingReducer":
+        """Fit the projection on a sample of (num_embeddings, input_dim) embeddings."""
+        matrix = as_embedding_matrix(embeddings)
+        input_dim = matrix.shape[1]
+        if self.output_dim > input_dim:
+            raise ValueError(
+                f"output_dim {self.output_dim} is larger than the embedding "
+                f"dimension {input_dim}."
+            )
+
+        if self.method == DimensionReduction.PCA:
+            if len(matrix) < self.output_dim:
+                raise ValueError(
+                    f"PCA to {self.output_dim} dimensions needs at least "
+                    f"{self.output_dim} embeddings to fit, got {len(matrix)}."
+                )
+            # eigenvectors of the covariance, cheaper than an SVD of the sample
+            mean = matrix.mean(axis=0, dtype=np.float64)
+            centered = matrix - mean.astype(np.float32)
+            covariance = centered.T.astype(np.float64) @ centered
+            _, eigenvectors = np.linalg.eigh(covariance)
+            self.mean = mean.astype(np.float32)
+            self.components = np.ascontiguousarray(
+                eigenvectors[:, ::-1][:, : self.output_dim], dtype=np.float32
+            )
+        elif self.method == DimensionReduction.RANDOM_PROJECTION:
+            rng = np.random.default_rng(self.seed)
+            self.components = (
+                rng.standard_normal((input_dim, self.output_dim))
+                / np.sqrt(self.output_dim)
+            ).astype(np.float32)
+        return self
+
+    def transform(self, embeddings: Any) -> np.ndarray:
+        """Reduce (num_embeddings, input_dim) embeddings to a float32 array."""
+        matrix = as_embedding_matrix(embeddings)
+        if self.method == DimensionReduction.TRUNCATE:
+            reduced = matrix[:, : self.output_dim]
+        else:
+            if self.components is None:
+                raise ValueError(
+                    f"The {self.method.value} reducer is not fitted, fit it or load "
+                    "it with `EmbeddingReducer.from_persist_path` first."
+                )
+            if self.mean is not None:
+                matrix = matrix - self.mean
+            reduced = matrix @ self.components
+
+        if self.normalize:
+            norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+            reduced = reduced / np.clip(norms, 1e-12, None)
+        return np.ascontiguousarray(reduced, dtype=np.float32)
+
+    def recall_at_k(self, embeddings: Any, queries: Any, k: int = 10) -> float:
+        """Measure the top-k recall of the reduced embeddings.
+
+        The exact inner product top k of each query over the full embeddings is
+        compared to the top k over the reduced ones.
+
+        Args:
+            embeddings (Any): (num_embeddings, input_dim) corpus embeddings.
+            queries (Any): (num_queries, input_dim) query embeddings.
+            k (int): number of neighbors.
+
+        Returns:
+            float: the mean fraction of the exact top k found in reduced space.
+        """
+        embeddings = as_embedding_matrix(embeddings)
+        queries = as_embedding_matrix(queries)
+        k = min(k, len(embeddings))
+
+        def top_k(scores: np.ndarray) -> np.ndarray:
+            return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+        exact = top_k(queries @ embeddings.T)
+        reduced = top_k(self.transform(queries) @ self.transform(embeddings).T)
+        hits = sum(
+            len(np.intersect1d(exact_row, reduced_row))
+            for exact_row, reduced_row in zip(exact, reduced)
+        )
+        return hits / (k * len(queries))
+
+    def persist(self, persist_path: str) -> None:
+        """Save the reducer, e.g. next to the persisted index."""
+        dirpath = os.path.dirname(persist_path)
+        if dirpath:
+            os.makedirs(dirpath, exist_ok=True)
+        arrays = {}
+        if self.mean is not None:
+            arrays["mean"] = self.mean
+        if self.components is not None:
+            arrays["components"] = self.components
+        with open(persist_path, "wb") as f:
+            np.savez(
+                f,
+                method=np.array(self.method.value),
+                output_dim=np.array(self.output_dim),
+                normalize=np.array(self.normalize),
+                seed=np.array(self.seed),
+                **arrays,
+            )
+
+    @classmethod
+    def from_persist_path(cls, persist_path: str) -> "EmbeddingReducer":
+        """Load a reducer saved by `persist`."""
+        with np.load(persist_path, allow_pickle=False) as data:
+            reducer = cls(
+                method=str(data["method"]),
+                output_dim=int(data["output_dim"]),
+                normalize=bool(data["normalize"]),
+                seed=int(data["seed"]),
+            )
+            if "mean" in data:
+                reducer.mean = data["mean"]
+            if "components" in data:
+                reducer.components = data["components"]
+        return reducer
+
+
+class ReducedEmbedding(BaseEmbedding):
+    """Embedding model wrapper reducing the text and query embeddings.
+
+    A PCA reducer is fitted with `fit` on a sample of the corpus before it is
+    indexed, or else on the first text batch embedded. A random projection only
+    depends on the embedding dimension and is fitted on the first embeddings,
+    texts or queries. Once fitted, the reducer is saved to `persist_path`, next
+    to the persisted storage context by default. If `persist_path` exists, the
+    reducer is loaded from it instead, so queries are reduced like the stored
+    embeddings.
+
+    Args:
+        embed_model (BaseEmbedding): the embedding model to wrap.
+        reduction (Union[str, DimensionReduction]): truncate, pca or
+            random_projection, ignored when the reducer is loaded.
+        output_dim (Optional[int]): dimension of the reduced embeddings,
+            required unless the reducer is loaded.
+        persist_path (Optional[str]): where the fitted reducer is saved, None
+            to keep it in memory.
+        fit_sample_size (int): max number of embeddings to fit on.
+        normalize (bool): L2 normalize the reduced embeddings.
+
+    """
+
+    embed_model: BaseEmbedding = Field(description="The wrapped embedding model.")
+    reducer: Any = Field(description="The embedding reducer.", exclude=True)
+    persist_path: Optional[str] = Field(
+        default=None, description="Where the fitted reducer is saved."
+    )
+    fit_sample_size: int = Field(
+        default=DEFAULT_FIT_SAMPLE_SIZE,
+        description="Max number of embeddings to fit the reducer on.",
+        gt=0,
+    )
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        reduction: Union[str, DimensionReduction] = DimensionReduction.TRUNCATE,
+        output_dim: Optional[int] = None,
+        persist_path: Optional[str] = DEFAULT_PERSIST_PATH,
+        fit_sample_size: int = DEFAULT_FIT_SAMPLE_SIZE,
+        normalize: bool = True,
+        callback_manager: Optional[CallbackManager] = None,
+    ) -> None:
+        if persist_path is not None and os.path.exists(persist_path):
+            reducer = EmbeddingReducer.from_persist_path(persist_path)
+            if output_dim is not None and output_dim != reducer.output_dim:
+                raise ValueError(
+                    f"The reducer saved at {persist_path} reduces to "
+                    f"{reducer.output_dim} dimensions, not {output_dim}, remove "
+                    "it to fit a new one."
+                )
+        elif output_dim is None:
+            raise ValueError("output_dim is required to build a new reducer.")
+        else:
+            reducer = EmbeddingReducer(reduction, output_dim, normalize=normalize)
+
+        super().__init__(
+            embed_model=embed_model,
+            reducer=reducer,
+            persist_path=persist_path,
+            fit_sample_size=fit_sample_size,
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            callback_manager=callback_manager or embed_model.callback_manager,
+        )
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ReducedEmbedding"
+
+    def get_model_dim(self) -> int:
+        """Get the dimension of the reduced embeddings."""
+        return self.reducer.output_dim
+
+    def _fit_reducer(self, embeddings: np.ndarray) -> None:
+        """Fit the reducer on up to fit_sample_size embeddings and save it."""
+        logger.info(
+            "Fitting the %s reducer to %d dimensions on %d embeddings",
+            self.reducer.method.value,
+            self.reducer.output_dim,
+            min(len(embeddings), self.fit_sample_size),
+        )
+        self.reducer.fit(embeddings[: self.fit_sample_size])
+        if self.persist_path is not None:
+            self.reducer.persist(self.persist_path)
+
+    def fit(self, texts: List[str], show_progress: bool = False) -> None:
+        """Fit the reducer on a sample of the corpus texts, before indexing them.
+
+        Args:
+            texts (List[str]): the texts to index, up to fit_sample_size of
+                them are sampled and embedded.
+            show_progress (bool): show the embedding progress.
+        """
+        if len(texts) > self.fit_sample_size:
+            rng = np.random.default_rng(seed=0)
+            sample_rows = rng.choice(len(texts), self.fit_sample_size, replace=False)
+            texts = [texts[i] for i in np.sort(sample_rows)]
+        self._fit_reducer(
+            as_embedding_matrix(
+                self.embed_model.get_text_embedding_matrix(
+                    texts, show_progress=show_progress
+                )
+            )
+        )
+
+    def _reduce(self, embeddings: Any) -> np.ndarray:
+        if not self.reducer.is_fitted:
+            if self.reducer.method != DimensionReduction.RANDOM_PROJECTION:
+                raise ValueError(
+                    "The embedding reducer is not fitted yet, fit it on the "
+                    "corpus or load a fitted reducer from persist_path."
+                )
+            # a random projection only needs the embedding dimension
+            self._fit_reducer(as_embedding_matrix(embeddings))
+        return self.reducer.transform(embeddings)
+
+    def _fit_and_reduce(self, embeddings: np.ndarray) -> np.ndarray:
+        """Fit the reducer on the first batch if needed, then reduce it."""
+        if not self.reducer.is_fitted and len(embeddings):
+            if self.reducer.method == DimensionReduction.PCA:
+                logger.warning(
+                    "Fitting PCA on the first batch of %d embeddings only, fit "
+                    "it on the corpus with ReducedEmbedding.fit first.",
+                    len(embeddings),
+                )
+            self._fit_reducer(embeddings)
+        if not len(embeddings):
+            return np.empty((0, self.reducer.output_dim), dtype=np.float32)
+        return self.reducer.transform(embeddings)
+
+    def get_text_embedding_matrix(
+        self,
+        texts: List[str],
+        show_progress: bool = False,
+        **kwargs: Any,
+    ) -> np.ndarray:
+        """Get the reduced text embeddings as a float32 array."""
+        return self._fit_and_reduce(
+            self.embed_model.get_text_embedding_matrix(
+                texts, show_progress=show_progress, **kwargs
+            )
+        )
+
+    async def aget_text_embedding_matrix(
+        self, texts: List[str], show_progress: bool = False
+    ) -> np.ndarray:
+        """Asynchronously get the reduced text embeddings as a float32 array."""
+        return self._fit_and_reduce(
+            await self.embed_model.aget_text_embedding_matrix(
+                texts, show_progress=show_progress
+            )
+        )
+
+    def get_text_embedding_batch(
+        self,
+        texts: List[str],
+        show_progress: bool = False,
+        **kwargs: Any,
+    ) -> List[Embedding]:
+        """Get a list of reduced text embeddings."""
+        return self.get_text_embedding_matrix(
+            texts, show_progress=show_progress, **kwargs
+        ).tolist()
+
+    async def aget_text_embedding_batch(
+        self, texts: List[str], show_progress: bool = False
+    ) -> List[Embedding]:
+        """Asynchronously get a list of reduced text embeddings."""
+        return (
+            await self.aget_text_embedding_matrix(texts, show_progress=show_progress)
+        ).tolist()
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._reduce([self.embed_model._get_query_embedding(query)])[0].tolist()
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        embedding = await self.embed_model._aget_query_embedding(query)
+        return self._reduce([embedding])[0].tolist()
+
+    def _get_query_embeddings(self, queries: List[str]) -> List[Embedding]:
+        return self._reduce(self.embed_model._get_query_embeddings(queries)).tolist()
+
+    async def _aget_query_embeddings(self, queries: List[str]) -> List[Embedding]:
+        embeddings = await self.embed_model._aget_query_embeddings(queries)
+        return self._reduce(embeddings).tolist()
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._reduce([self.embed_model._get_text_embedding(text)])[0].tolist()
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        embedding = await self.embed_model._aget_text_embedding(text)
+        return self._reduce([embedding])[0].tolist()
+
+    def _get_text_embeddings_array(self, texts: List[str]) -> np.ndarray:
+        return self._reduce(self.embed_model._get_text_embeddings_array(texts))
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self._get_text_embeddings_array(texts).tolist()
@@ -122,6 +122,19 @@ class SBertEmbedding(BaseEmbedding):
         return self._embed([text])[0]
 
 
+    def _get_query_embeddings(self, queries: List[str]) -> List[List[float]]:
+        """Get query embeddings."""
+        query_instruction = self.prompts.get("query", "")
+        queries = [
+            format_query(query, self.model_name, query_instruction)
+            for query in queries
+        ]
+        return self._embed(queries)
+
+    async def _aget_query_embeddings(self, queries: List[str]) -> List[List[float]]:
+        """Get query embeddings async."""
+        return self._get_query_embeddings(queries)
+
     async def _aget_query_embedding(self, query: str) -> List[float]:
         """Get query embedding async."""
         return self._get_query_embedding(query)
@@ -4,6 +4,8 @@ import re
 from hashlib import sha256
 from typing import Dict, List, Optional, Sequence, Set, Tuple, Any, TYPE_CHECKING
 
+import numpy as np
+
 from rag.node.base_node import BaseNode, MetadataMode
 from rag.rag_utils.utils import globals_helper, truncate_text
 from rag.vector_stores.base_vector import VectorStoreQueryResult
@@ -116,7 +118,7 @@ def default_parse_choice_select_answer_fn(
 
 def embed_nodes(
     nodes: Sequence[BaseNode], embed_model: "BaseEmbedding", show_progress: bool = False
-) -> Dict[str, List[float]]:
+) -> Dict[str, np.ndarray]:
     """Get embeddings of the given nodes, run embedding model if necessary.
 
     Args:
@@ -125,9 +127,10 @@ def embed_nodes(
         show_progress (bool): Whether to show progress bar.
 
     Returns:
-        Dict[str, List[float]]: A map from node id to embedding.
+        Dict[str, np.ndarray]: A map from node id to float32 embedding, the new
+            embeddings are rows of a single (n, dim) array.
     """
-    id_to_embed_map: Dict[str, List[float]] = {}
+    id_to_embed_map: Dict[str, np.ndarray] = {}
 
     texts_to_embed = []
     ids_to_embed = []
@@ -136,9 +139,11 @@ def embed_nodes(
             ids_to_embed.append(node.node_id)
             texts_to_embed.append(node.get_content(metadata_mode=MetadataMode.EMBED))
         else:
-            id_to_embed_map[node.node_id] = node.embedding
+            id_to_embed_map[node.node_id] = np.asarray(
+                node.embedding, dtype=np.float32
+            )
 
-    new_embeddings = embed_model.get_text_embedding_batch(
+    new_embeddings = embed_model.get_text_embedding_matrix(
         texts_to_embed, show_progress=show_progress
     )
 
@@ -151,7 +156,7 @@ def embed_nodes(
 
 async def async_embed_nodes(
     nodes: Sequence[BaseNode], embed_model: "BaseEmbedding", show_progress: bool = False
-) -> Dict[str, List[float]]:
+) -> Dict[str, np.ndarray]:
     """Async get embeddings of the given nodes, run embedding model if necessary.
 
     Args:
@@ -160,9 +165,10 @@ async def async_embed_nodes(
         show_progress (bool): Whether to show progress bar.
 
     Returns:
-        Dict[str, List[float]]: A map from node id to embedding.
+        Dict[str, np.ndarray]: A map from node id to float32 embedding, the new
+            embeddings are rows of a single (n, dim) array.
     """
-    id_to_embed_map: Dict[str, List[float]] = {}
+    id_to_embed_map: Dict[str, np.ndarray] = {}
 
     texts_to_embed = []
     ids_to_embed = []
@@ -171,9 +177,11 @@ async def async_embed_nodes(
             ids_to_embed.append(node.node_id)
             texts_to_embed.append(node.get_content(metadata_mode=MetadataMode.EMBED))
         else:
-            id_to_embed_map[node.node_id] = node.embedding
+            id_to_embed_map[node.node_id] = np.asarray(
+                node.embedding, dtype=np.float32
+            )
 
-    new_embeddings = await embed_model.aget_text_embedding_batch(
+    new_embeddings = await embed_model.aget_text_embedding_matrix(
         texts_to_embed, show_progress=show_progress
     )
 
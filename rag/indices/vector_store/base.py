@@ -3,6 +3,7 @@
 An index that that is built on top of an existing vector store.
 
 """
+import asyncio
 import logging
 from typing import Any, Dict, List, Optional, Sequence, TYPE_CHECKING
 
@@ -133,15 +134,36 @@ class VectorStoreIndex(BaseIndex):
         show_progress: bool = False,
         **insert_kwargs: Any,
     ) -> None:
-        """Asynchronously add nodes to index."""
+        """Asynchronously add nodes to index.
+
+        The next batch is embedded while the current one is written to the
+        vector store, so at most two batches of embeddings are held in memory.
+        """
         if not nodes:
             return
 
-        for nodes_batch in iter_batch(nodes, self._insert_batch_size):
-            nodes_batch = await self._aget_node_with_embedding(
-                nodes_batch, show_progress
-            )
-            new_ids = await self._vector_store.async_add(nodes_batch, **insert_kwargs)
+        batches = iter_batch(nodes, self._insert_batch_size)
+        next_embedding: Optional[asyncio.Future] = asyncio.ensure_future(
+            self._aget_node_with_embedding(next(batches), show_progress)
+        )
+        while next_embedding is not None:
+            try:
+                nodes_batch = await next_embedding
+                next_batch = next(batches, None)
+                next_embedding = (
+                    asyncio.ensure_future(
+                        self._aget_node_with_embedding(next_batch, show_progress)
+                    )
+                    if next_batch is not None
+                    else None
+                )
+                new_ids = await self._vector_store.async_add(
+                    nodes_batch, **insert_kwargs
+                )
+            except BaseException:
+                if next_embedding is not None:
+                    next_embedding.cancel()
+                raise
 
             # if the vector store doesn't store text, we need to add the nodes to the
             # index struct and document store
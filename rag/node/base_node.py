@@ -4,6 +4,8 @@ import uuid
 from abc import abstractmethod
 from hashlib import sha256
 
+import numpy as np
+
 from .types import *
 from rag.rag_utils.utils import SAMPLE_TEXT, truncate_text
 
@@ -25,7 +27,13 @@ class BaseNode(BaseModel):
     id_: str = Field(
         default_factory=lambda: str(uuid.uuid4()), description="Unique ID of the node."
     )
-    embedding: Optional[List[float]] = Field(
+    class Config:
+        arbitrary_types_allowed = True
+        # array embeddings are serialized as lists
+        json_encoders = {np.ndarray: lambda array: array.tolist()}
+
+    # a float32 array when set by `embed_nodes` for indexing
+    embedding: Optional[Union[List[float], np.ndarray]] = Field(
         default=None, description="Embedding of the node."
     )
 
@@ -143,7 +151,14 @@ class BaseNode(BaseModel):
             raise ValueError("Child objects must be a list of RelatedNodeInfo objects.")
         return relation
 
-    def get_embedding(self) -> List[float]:
+    def dict(self, **kwargs: Any) -> Dict[str, Any]:
+        data = super().dict(**kwargs)
+        # json serializable, whatever the embedding is held in
+        if isinstance(data.get("embedding"), np.ndarray):
+            data["embedding"] = data["embedding"].tolist()
+        return data
+
+    def get_embedding(self) -> Union[List[float], np.ndarray]:
         """Get embedding.
 
         Errors if embedding is None.
@@ -352,7 +367,7 @@ class NodeWithScore(BaseModel):
     def get_content(self, metadata_mode: MetadataMode = MetadataMode.NONE) -> str:
         return self.node.get_content(metadata_mode=metadata_mode)
 
-    def get_embedding(self) -> List[float]:
+    def get_embedding(self) -> Union[List[float], np.ndarray]:
         return self.node.get_embedding()
 
 
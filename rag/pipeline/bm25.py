@@ -1,5 +1,7 @@
 import logging 
+import os
 import time
+from typing import List, Optional
 
 from transformers import AutoTokenizer
 
@@ -12,12 +14,34 @@ from rag.node_parser.text.sentence import SentenceSplitter
 from rag.callbacks import CallbackManager
 from rag.core.service_context import ServiceContext
 from rag.engine.retriever_engine import RetrieverEngine
+from rag.node.base_node import Document, TextNode
 from rag.retrievers.sparse.bm25 import BM25Retriever
+from rag.retrievers.sparse.bm25_index import DEFAULT_PERSIST_DIRNAME
+from rag.storage.docstore.base import DEFAULT_PERSIST_FNAME as DOCSTORE_FNAME
+from rag.storage.docstore.simple_docstore import SimpleDocumentStore
 
 
 logger = logging.getLogger(__name__)
 
+
+def _document_hash(document: Document) -> str:
+    """Hash the text and metadata of a document, `Document.hash` is not set."""
+    return TextNode._generate_hash(
+        {"text": document.text, "metadata": document.metadata}
+    )["hash"]
+
+
 class BM25Pipeline:
+    """BM25 retrieval over the documents passed to `main`.
+
+    The index is updated rather than rebuilt on each call: documents are
+    matched to the indexed ones by doc_id and content hash, new and changed
+    documents are (re)indexed, and the indexed documents not passed anymore
+    are deleted. A persisted index (bm25_persist_dir) is best used with stable
+    doc ids, e.g. `DirectoryReader(filename_as_id=True)`: documents with random
+    ids are then only matched by their content hash.
+    """
+
     def __init__(
         self,
         splitter_config: NodeParserConfig,
@@ -47,39 +71,104 @@ class BM25Pipeline:
             node_parser=node_parser,
             callback_manager=callback_manager,
         )
-              
+
+        # built on the first query, then only updated with new documents
+        self.retriever: Optional[BM25Retriever] = None
+        self.docstore = SimpleDocumentStore()
+
+    def _load_retriever(self) -> BM25Retriever:
+        """Load the persisted retriever and its nodes, or start an empty one."""
+        persist_dir = self.index_retriver_config.bm25_persist_dir
+        if persist_dir and os.path.exists(
+            os.path.join(persist_dir, DEFAULT_PERSIST_DIRNAME)
+        ):
+            self.docstore = SimpleDocumentStore.from_persist_dir(persist_dir)
+            return BM25Retriever.from_persist_dir(
+                persist_dir,
+                docstore=self.docstore,
+                similarity_top_k= self.index_retriver_config.similarity_top_k,
+                callback_manager= self.service_context.callback_manager,
+                num_workers= self.index_retriver_config.bm25_num_workers,
+                query_mode= self.index_retriver_config.bm25_query_mode,
+            )
+        return BM25Retriever(
+            nodes= [],
+            similarity_top_k= self.index_retriver_config.similarity_top_k,
+            callback_manager= self.service_context.callback_manager,
+            num_workers= self.index_retriver_config.bm25_num_workers,
+            query_mode= self.index_retriver_config.bm25_query_mode,
+        )
+
+    def _sync_documents(self, documents: List[Document]) -> List[Document]:
+        """Delete the stale indexed documents and get the documents to index."""
+        assert self.retriever is not None
+        ref_doc_ids = list((self.docstore.get_all_ref_doc_info() or {}).keys())
+        ref_doc_hashes = {
+            self.docstore.get_document_hash(ref_doc_id): ref_doc_id
+            for ref_doc_id in ref_doc_ids
+        }
+
+        kept_ref_doc_ids = set()
+        new_documents = []
+        for document in documents:
+            doc_hash = self.docstore.get_document_hash(document.doc_id)
+            content_hash = _document_hash(document)
+            if doc_hash is None and content_hash in ref_doc_hashes:
+                # same content indexed under the doc id of a previous run
+                kept_ref_doc_ids.add(ref_doc_hashes[content_hash])
+            elif doc_hash == content_hash:
+                kept_ref_doc_ids.add(document.doc_id)
+            else:
+                new_documents.append(document)
+
+        # changed documents and documents not passed anymore
+        for ref_doc_id in ref_doc_ids:
+            if ref_doc_id not in kept_ref_doc_ids:
+                self.retriever.delete_ref_doc(ref_doc_id)
+                self.docstore.delete_ref_doc(ref_doc_id, raise_error=False)
+        return new_documents
 
     def main(self, query, documents):
 
         """Wrap time"""
         start_build_collection_index = int(round(time.time() * 1000))
 
-        # TODO: Get nodes from documents
+        #TODO: build retriever
+        """
+        tokenizer of bm25 retriever use remove_stopwords() function, 
+        which different from the tokenizer of node_parser
+        """
+        if self.retriever is None:
+            self.retriever = self._load_retriever()
+        retriever = self.retriever
+
+        # TODO: Get nodes from the documents not indexed yet
+        num_docs = retriever.bm25.num_docs
+        new_documents = self._sync_documents(documents)
         nodes = []
         for each_parser in self.service_context.transformations: 
             parsing_nodes = each_parser.get_nodes_from_documents(
-                documents=documents,
+                documents=new_documents,
                 show_progress=True,
             )
             nodes.extend(parsing_nodes)
 
+        retriever.insert_nodes(nodes)
+        self.docstore.add_documents(nodes)
+        for document in new_documents:
+            self.docstore.set_document_hash(document.doc_id, _document_hash(document))
+        if new_documents or retriever.bm25.num_docs != num_docs:
+            persist_dir = self.index_retriver_config.bm25_persist_dir
+            if persist_dir:
+                retriever.persist(persist_dir)
+                self.docstore.persist(os.path.join(persist_dir, DOCSTORE_FNAME))
+
         end_build_collection_index = int(round(time.time() * 1000))
         print(f"Time for build collection and index: {end_build_collection_index - start_build_collection_index} ms")
 
         """Wrap for loading retriever and search"""
         start_build_retrieve_search = int(round(time.time() * 1000))
 
-        #TODO: build retriever
-        """
-        tokenizer of bm25 retriever use remove_stopwords() function, 
-        which different from the tokenizer of node_parser
-        """
-        retriever = BM25Retriever(
-            nodes= nodes,
-            similarity_top_k= self.index_retriver_config.similarity_top_k,
-            callback_manager= self.service_context.callback_manager,
-        )
-
         #TODO: assemble query engine
         query_engine = RetrieverEngine(
             retriever= retriever,
@@ -80,7 +80,10 @@ class MilvusSubquetionPipeline:
         start_build_collection_index = int(round(time.time() * 1000))
 
         #TODO: build milvus vector from documents
-        milvus_vector_store = MilvusVectorStore(self.milvus_config)
+        milvus_vector_store = MilvusVectorStore(
+            self.milvus_config,
+            callback_manager= self.service_context.callback_manager,
+        )
 
         # construct index and customize storage context
         storage_context = StorageContext.from_defaults(
@@ -97,15 +100,17 @@ class MilvusSubquetionPipeline:
             nodes.extend(parsing_nodes)
 
         # build index
-        index = VectorStoreIndex(
-            nodes=nodes,
-            storage_context= storage_context,
-            service_context= self.service_context,
-            store_nodes_override= self.index_retriver_config.store_nodes_override,
-            insert_batch_size= self.index_retriver_config.insert_batch_size,
-            use_async= self.index_retriver_config.use_async,
-            show_progress= self.index_retriver_config.show_progress,
-        )
+        # bulk load: build the milvus index once after all batches are inserted
+        with milvus_vector_store.bulk_load():
+            index = VectorStoreIndex(
+                nodes=nodes,
+                storage_context= storage_context,
+                service_context= self.service_context,
+                store_nodes_override= self.index_retriver_config.store_nodes_override,
+                insert_batch_size= self.index_retriver_config.insert_batch_size,
+                use_async= self.index_retriver_config.use_async,
+                show_progress= self.index_retriver_config.show_progress,
+            )
 
         end_build_collection_index = int(round(time.time() * 1000))
         print(f"Time for build collection and index: {end_build_collection_index - start_build_collection_index} ms")
@@ -161,5 +166,6 @@ class MilvusSubquetionPipeline:
             embed_batch_size= config.embedding_batch_size,
             cache_folder= config.cache_folder,
             trust_remote_code= config.trust_remote_code,
+            max_batch_tokens= config.max_batch_tokens,
         )
         return emb_model
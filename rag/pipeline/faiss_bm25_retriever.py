@@ -1,6 +1,5 @@
 import logging 
 import time
-import faiss
 from typing import List
 from transformers import AutoTokenizer
 
@@ -17,7 +16,7 @@ from rag.callbacks import CallbackManager
 from rag.core.storage_context import StorageContext
 from rag.core.service_context import ServiceContext
 from rag.indices.vector_store import VectorStoreIndex
-from rag.vector_stores.faiss import FaissVectorStore 
+from rag.vector_stores.faiss import FaissVectorStore, create_faiss_index
 
 from rag.retrievers.hybrid_retriever import HybridSearchRetriever
 from rag.retrievers.dense.vector_retriver import VectorIndexRetriever
@@ -27,9 +26,11 @@ from rag.retrievers.types import QueryBundle, QueryType
 from rag.engine.retriever_engine import RetrieverQueryEngine
 from rag.core.prompt_helper import PromptHelper
 from rag.synthesizer.utils import get_response_synthesizer
-from rag.node.base_node import Document
+from rag.node.base_node import Document, MetadataMode
 from rag.rerank.cohere_rerank import CohereRerank
 from rag.embeddings.huggingface import HuggingFaceEmbedding
+from rag.embeddings.reduction import DEFAULT_PERSIST_PATH as REDUCER_PERSIST_PATH
+from rag.embeddings.reduction import ReducedEmbedding
 
 logger = logging.getLogger(__name__)
 
@@ -67,19 +68,34 @@ class HybridSearchRetrieverPipeline:
 
         #embed model
         embed_model = self.get_embed_mode(embed_config)
+        if embed_config.reduction is not None:
+            # the faiss index holds the reduced embeddings
+            embed_model = ReducedEmbedding(
+                embed_model,
+                reduction= embed_config.reduction,
+                output_dim= embed_config.reduced_dim,
+                persist_path= embed_config.reduction_path or REDUCER_PERSIST_PATH,
+                normalize= embed_config.normalize,
+            )
 
 
         # check if embed_model.embedding_dim == faiss_config.embedding_dim
         assert embed_model.get_model_dim() == self.faiss_config.embedding_dim, f"""
         The embedding_dim of embed_model: {embed_model.get_model_dim()} is not equal to the embedding_dim of faiss_config: {self.faiss_config.embedding_dim}"""
 
-        # resole index_type for faiss
-        if self.faiss_config.index_build == "l2":
-            self.faiss_index = faiss.IndexFlatL2(self.faiss_config.embedding_dim)
-        elif self.faiss_config.index_build == "ip":
-            self.faiss_index = faiss.IndexFlatIP(self.faiss_config.embedding_dim)
-        elif self.faiss_config.index_build == "ivf":
-            self.faiss_index = faiss.IndexIVFFlat(self.faiss_config.embedding_dim)
+        # resole index_type for faiss, ivf / pq indexes are trained on the first batch
+        self.faiss_index = create_faiss_index(
+            embedding_dim= self.faiss_config.embedding_dim,
+            index_build= self.faiss_config.index_build,
+            metric= self.faiss_config.metric,
+            nlist= self.faiss_config.nlist,
+            nprobe= self.faiss_config.nprobe,
+            pq_m= self.faiss_config.pq_m,
+            pq_nbits= self.faiss_config.pq_nbits,
+            hnsw_m= self.faiss_config.hnsw_m,
+            ef_construction= self.faiss_config.ef_construction,
+            ef_search= self.faiss_config.ef_search,
+        )
 
 
         # prompt helper - tong hop 3 cai params cua llm, emb, node parser
@@ -96,6 +112,7 @@ class HybridSearchRetrieverPipeline:
         #TODO: build faiss vector from documents
         faiss_vector = FaissVectorStore(
             faiss_index= self.faiss_index,
+            train_sample_size= self.faiss_config.train_sample_size,
         )
 
         # construct index and customize storage context
@@ -112,6 +129,12 @@ class HybridSearchRetrieverPipeline:
             )
             nodes.extend(parsing_nodes)
 
+        # fit the reducer on a sample of the corpus, not on the first insert batch
+        if isinstance(embed_model, ReducedEmbedding) and not embed_model.reducer.is_fitted:
+            embed_model.fit(
+                [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes],
+                show_progress= self.index_retriver_config.show_progress,
+            )
 
         self.index = VectorStoreIndex(
             nodes=nodes,
@@ -202,5 +225,6 @@ class HybridSearchRetrieverPipeline:
             embed_batch_size= config.embedding_batch_size,
             cache_folder= config.cache_folder,
             trust_remote_code= config.trust_remote_code,
+            max_batch_tokens= config.max_batch_tokens,
         )
         return emb_model
@@ -1,9 +1,10 @@
 """Base vector store index query."""
 from typing import Any, Dict, List, Optional, TYPE_CHECKING
 
-from rag.callbacks.callback_manager import CallbackManager
+from rag.callbacks import CallbackManager, CBEventType, EventPayload
 from rag.constants import DEFAULT_SIMILARITY_TOP_K
 from rag.retrievers.base import BaseRetriever, QueryBundle
+from rag.retrievers.types import QueryType
 from rag.node.base_node import NodeWithScore, ObjectType
 from rag.vector_stores.types import (
     MetadataFilters,
@@ -30,6 +31,10 @@ class VectorIndexRetriever(BaseRetriever):
         alpha (float): weight for sparse/dense retrieval, only used for
             hybrid query mode.
         doc_ids (Optional[List[str]]): list of documents to constrain search.
+        nprobe (Optional[int]): number of IVF lists visited per query, for
+            vector stores backed by an IVF index.
+        ef_search (Optional[int]): HNSW candidate list size per query, for
+            vector stores backed by an HNSW index.
         vector_store_kwargs (dict): Additional vector store specific kwargs to pass
             through to the vector store at query time.
 
@@ -45,6 +50,8 @@ class VectorIndexRetriever(BaseRetriever):
         node_ids: Optional[List[str]] = None,
         doc_ids: Optional[List[str]] = None,
         sparse_top_k: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
         callback_manager: Optional[CallbackManager] = None,
         **kwargs: Any,
     ) -> None:
@@ -61,6 +68,8 @@ class VectorIndexRetriever(BaseRetriever):
         self._doc_ids = doc_ids
         self._filters = filters
         self._sparse_top_k = sparse_top_k
+        self._nprobe = nprobe
+        self._ef_search = ef_search
         self._kwargs: Dict[str, Any] = kwargs.get("vector_store_kwargs", {})
         super().__init__(callback_manager)
 
@@ -98,6 +107,66 @@ class VectorIndexRetriever(BaseRetriever):
                 )
         return await self._aget_nodes_with_embeddings(query_bundle)
 
+    def batch_retrieve(
+        self, str_or_query_bundles: List[QueryType]
+    ) -> List[List[NodeWithScore]]:
+        """Retrieve nodes for many queries with a single vector store call.
+
+        Uses `VectorStore.batch_query`, which stores like Faiss, Milvus and
+        pgvector answer natively in one search / round-trip.
+
+        Args:
+            str_or_query_bundles (List[QueryType]): query strings or
+                QueryBundle objects.
+
+        Returns:
+            List[List[NodeWithScore]]: retrieved nodes, one list per query.
+        """
+        self._check_callback_manager()
+
+        query_bundles = [
+            QueryBundle(q) if isinstance(q, str) else q for q in str_or_query_bundles
+        ]
+        with self.callback_manager.as_trace("query"):
+            event_ids = [
+                self.callback_manager.on_event_start(
+                    CBEventType.RETRIEVE,
+                    payload={EventPayload.QUERY_STR: query_bundle.query_str},
+                )
+                for query_bundle in query_bundles
+            ]
+
+            if self._vector_store.is_embedding_query:
+                embed_model = self._service_context.embed_model
+                for query_bundle in query_bundles:
+                    if (
+                        query_bundle.embedding is None
+                        and len(query_bundle.embedding_strs) > 0
+                    ):
+                        query_bundle.embedding = (
+                            embed_model.get_agg_embedding_from_queries(
+                                query_bundle.embedding_strs
+                            )
+                        )
+
+            queries = [
+                self._build_vector_store_query(query_bundle)
+                for query_bundle in query_bundles
+            ]
+            query_results = self._vector_store.batch_query(queries, **self._kwargs)
+            nodes_per_query = [
+                self._build_node_list_from_query_result(query_result)
+                for query_result in query_results
+            ]
+
+            for event_id, nodes in zip(event_ids, nodes_per_query):
+                self.callback_manager.on_event_end(
+                    CBEventType.RETRIEVE,
+                    payload={EventPayload.NODES: nodes},
+                    event_id=event_id,
+                )
+        return nodes_per_query
+
     def _build_vector_store_query(
         self, query_bundle_with_embeddings: QueryBundle
     ) -> VectorStoreQuery:
@@ -111,6 +180,8 @@ class VectorIndexRetriever(BaseRetriever):
             alpha=self._alpha,
             filters=self._filters,
             sparse_top_k=self._sparse_top_k,
+            nprobe=self._nprobe,
+            ef_search=self._ef_search,
         )
 
     def _build_node_list_from_query_result(
@@ -1,7 +1,12 @@
+from .analyzer import BM25Analyzer
 from .bm25 import BM25Retriever
+from .bm25_index import BM25Index, BM25QueryMode
 from .keyword_retriever import KeywordTableSimpleRetriever, KeywordTableRAKERetriever, KeywordTableRetriever
 
 __all__ = [
+    "BM25Analyzer",
+    "BM25Index",
+    "BM25QueryMode",
     "BM25Retriever",
     "KeywordTableRetriever",
     "KeywordTableSimpleRetriever",
@@ -0,0 +1,127 @@
+"""Text analyzer of the sparse retrievers.
+
+Turns a text into the list of terms indexed by BM25: regex tokenization,
+lowercasing, stopword removal and stemming. Repeated terms are kept, so term
+frequencies are preserved.
+
+"""
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional
+
+from rag.rag_utils.utils import globals_helper
+
+DEFAULT_LANGUAGE = "english"
+DEFAULT_TOKEN_PATTERN = r"\w+"
+DEFAULT_STEM_CACHE_SIZE = 2**16
+
+
+def get_stopwords(language: str = DEFAULT_LANGUAGE) -> FrozenSet[str]:
+    """Get the nltk stopwords of a language."""
+    # loading the english stopwords downloads the corpus of all the languages
+    english_stopwords = globals_helper.stopwords
+    if language == DEFAULT_LANGUAGE:
+        return frozenset(english_stopwords)
+
+    from nltk.corpus import stopwords
+
+    return frozenset(stopwords.words(language))
+
+
+def get_stemmer(language: str = DEFAULT_LANGUAGE) -> Callable[[str], str]:
+    """Get the nltk stemmer of a language, Porter for english, else Snowball."""
+    from nltk.stem import PorterStemmer, SnowballStemmer
+
+    if language == DEFAULT_LANGUAGE:
+        return PorterStemmer().stem
+    return SnowballStemmer(language).stem
+
+
+class BM25Analyzer:
+    """Tokenize, filter stopwords and stem a text, keeping repeated terms.
+
+    Stems are memoized in an LRU cache, the vocabulary of a corpus being much
+    smaller than its number of tokens.
+
+    Args:
+        language (str): nltk language of the default stopwords and stemmer.
+        stopwords (Optional[Iterable[str]]): stopwords to remove, defaults to
+            the nltk stopwords of language.
+        stemmer (Optional[Callable[[str], str]]): stems a lowercased token,
+            defaults to the nltk stemmer of language.
+        token_pattern (str): regex of a token.
+        stem_cache_size (int): max number of memoized stems.
+        remove_stopwords (bool): remove the stopwords or not.
+        stem (bool): stem the tokens or not.
+
+    """
+
+    def __init__(
+        self,
+        language: str = DEFAULT_LANGUAGE,
+        stopwords: Optional[Iterable[str]] = None,
+        stemmer: Optional[Callable[[str], str]] = None,
+        token_pattern: str = DEFAULT_TOKEN_PATTERN,
+        stem_cache_size: int = DEFAULT_STEM_CACHE_SIZE,
+        remove_stopwords: bool = True,
+        stem: bool = True,
+    ) -> None:
+        self.language = language
+        self.token_pattern = token_pattern
+        self.stem_cache_size = stem_cache_size
+        self.remove_stopwords = remove_stopwords
+        self.stem = stem
+        self._stopwords = frozenset(stopwords) if stopwords is not None else None
+        self._stemmer = stemmer
+        self._init_state()
+
+    def _init_state(self) -> None:
+        self._token_regex = re.compile(self.token_pattern)
+        self._stem_cached: Optional[Callable[[str], str]] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # compiled regexes and lru caches are rebuilt on unpickling
+        state = self.__dict__.copy()
+        del state["_token_regex"]
+        del state["_stem_cached"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._init_state()
+
+    @property
+    def stopwords(self) -> FrozenSet[str]:
+        if self._stopwords is None:
+            self._stopwords = get_stopwords(self.language)
+        return self._stopwords
+
+    @property
+    def stemmer(self) -> Callable[[str], str]:
+        if self._stemmer is None:
+            self._stemmer = get_stemmer(self.language)
+        return self._stemmer
+
+    def _get_stem_cached(self) -> Callable[[str], str]:
+        if self._stem_cached is None:
+            self._stem_cached = lru_cache(maxsize=self.stem_cache_size)(self.stemmer)
+        return self._stem_cached
+
+    @property
+    def stem_cache_info(self) -> Any:
+        """Hits and misses of the stem cache, as `functools.lru_cache`."""
+        return self._get_stem_cached().cache_info()  # type: ignore[attr-defined]
+
+    def tokenize(self, text: str) -> List[str]:
+        """Split a text into lowercased tokens, without filtering or stemming."""
+        return self._token_regex.findall(text.lower())
+
+    def __call__(self, text: str) -> List[str]:
+        tokens = self.tokenize(text)
+        if self.remove_stopwords:
+            stopwords = self.stopwords
+            tokens = [token for token in tokens if token not in stopwords]
+        if self.stem:
+            stem = self._get_stem_cached()
+            tokens = [stem(token) for token in tokens]
+        return tokens
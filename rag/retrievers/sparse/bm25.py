@@ -1,15 +1,25 @@
-import re
+import json
 import logging
-from typing import Callable, List, Optional, Set, cast, TYPE_CHECKING
-
-import pandas as pd
-from nltk.stem import PorterStemmer
+import multiprocessing
+import os
+from functools import partial
+from typing import Callable, Dict, List, Optional, Sequence, cast, TYPE_CHECKING
 
 from rag.callbacks.callback_manager import CallbackManager
 from rag.constants import DEFAULT_SIMILARITY_TOP_K
+from rag.constants.default_storage import DEFAULT_PERSIST_DIR
 from rag.retrievers.base import BaseRetriever, QueryBundle
+from rag.retrievers.sparse.analyzer import BM25Analyzer
+from rag.retrievers.sparse.bm25_index import (
+    DEFAULT_B,
+    DEFAULT_K1,
+    DEFAULT_PERSIST_DIRNAME as BM25_PERSIST_DIRNAME,
+    BM25Index,
+    BM25QueryMode,
+    TermCounts,
+    count_terms,
+)
 from rag.node.base_node import BaseNode, NodeWithScore
-from rag.rag_utils.utils import globals_helper
 
 if TYPE_CHECKING:
     from rag.storage.docstore.base import BaseDocumentStore
@@ -17,44 +27,93 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
-def simple_extract_keywords(
-    text_chunk: str, max_keywords: Optional[int] = None, filter_stopwords: bool = True
-) -> Set[str]:
-    """Extract keywords with simple algorithm."""
-    tokens = [t.strip().lower() for t in re.findall(r"\w+", text_chunk)]
-    if filter_stopwords:
-        tokens = [t for t in tokens if t not in globals_helper.stopwords]
-    value_counts = pd.Series(tokens).value_counts()
-    keywords = value_counts.index.tolist()[:max_keywords]
-    return set(keywords)
+# doc id -> node id of a persisted index
+NODE_IDS_FNAME = "node_ids.json"
+
+# max number of texts per work unit of a parallel build
+DEFAULT_TOKENIZE_CHUNK_SIZE = 4096
+
+_default_analyzer: Optional[BM25Analyzer] = None
 
 
 def tokenize_remove_stopwords(text: str) -> List[str]:
-    # lowercase and stem words
-    text = text.lower()
-    stemmer = PorterStemmer()
-    words = list(simple_extract_keywords(text))
-    return [stemmer.stem(word) for word in words]
+    """Lowercase, remove the english stopwords and stem, keeping repeated terms."""
+    global _default_analyzer
+    if _default_analyzer is None:
+        _default_analyzer = BM25Analyzer()
+    return _default_analyzer(text)
+
+
+def _tokenize_and_count(
+    tokenizer: Callable[[str], List[str]], texts: List[str]
+) -> TermCounts:
+    return count_terms([tokenizer(text) for text in texts])
 
 
 class BM25Retriever(BaseRetriever):
+    """BM25 retriever over an inverted index (see `BM25Index`).
+
+    Nodes can be inserted and deleted without rebuilding the index, and the
+    index persisted next to the storage context to skip tokenizing the nodes
+    again on the next start, see `persist` and `from_persist_dir`.
+
+    Args:
+        nodes (List[BaseNode]): the nodes to retrieve from.
+        tokenizer (Optional[Callable[[str], List[str]]]): tokenizer of the
+            nodes and queries, defaults to `tokenize_remove_stopwords`. Pass
+            a `BM25Analyzer` for other languages.
+        similarity_top_k (int): number of nodes to retrieve.
+        k1 (float): BM25 term frequency saturation.
+        b (float): BM25 document length normalization.
+        index (Optional[BM25Index]): an existing index of the nodes, built
+            with the same tokenizer, instead of indexing them.
+        node_ids (Optional[List[Optional[str]]]): with index, the node id of
+            each doc id of the index, None for the deleted ones.
+        num_workers (Optional[int]): number of processes tokenizing the nodes
+            inserted in bulk, the tokenizer must then be picklable.
+        query_mode (BM25QueryMode): how the top k nodes are searched, see
+            `BM25Index.top_k`.
+
+    """
+
     def __init__(
         self,
         nodes: List[BaseNode],
         tokenizer: Optional[Callable[[str], List[str]]] = None,
         similarity_top_k: int = DEFAULT_SIMILARITY_TOP_K,
         callback_manager: Optional[CallbackManager] = None,
+        k1: float = DEFAULT_K1,
+        b: float = DEFAULT_B,
+        index: Optional[BM25Index] = None,
+        node_ids: Optional[List[Optional[str]]] = None,
+        num_workers: Optional[int] = None,
+        query_mode: BM25QueryMode = BM25QueryMode.EXHAUSTIVE,
     ) -> None:
-        try:
-            from rank_bm25 import BM25Okapi
-        except ImportError:
-            raise ImportError("Please install rank_bm25: pip install rank-bm25")
-
-        self._nodes = nodes
         self._tokenizer = tokenizer or tokenize_remove_stopwords
         self._similarity_top_k = similarity_top_k
-        self._corpus = [self._tokenizer(node.get_content()) for node in self._nodes]
-        self.bm25 = BM25Okapi(self._corpus)
+        self._num_workers = num_workers
+        self._query_mode = BM25QueryMode(query_mode)
+        self._nodes: Dict[str, BaseNode] = {node.node_id: node for node in nodes}
+        if index is None:
+            self.bm25 = BM25Index(k1=k1, b=b)
+            # doc id -> node id, None once deleted
+            self._node_ids: List[Optional[str]] = []
+            self._doc_ids: Dict[str, int] = {}
+            self.insert_nodes(nodes)
+            self.bm25.merge()
+        else:
+            if node_ids is None or len(node_ids) != index.max_doc_id:
+                raise ValueError("Please pass the node id of each doc id of index.")
+            self.bm25 = index
+            self._node_ids = node_ids
+            self._doc_ids = {
+                node_id: doc_id
+                for doc_id, node_id in enumerate(node_ids)
+                if node_id is not None
+            }
+            missing = self._doc_ids.keys() - self._nodes.keys()
+            if missing:
+                raise ValueError(f"Missing {len(missing)} nodes of the BM25 index.")
         super().__init__(callback_manager)
 
     @classmethod
@@ -65,6 +124,8 @@ class BM25Retriever(BaseRetriever):
         docstore: Optional["BaseDocumentStore"] = None,
         tokenizer: Optional[Callable[[str], List[str]]] = None,
         similarity_top_k: int = DEFAULT_SIMILARITY_TOP_K,
+        num_workers: Optional[int] = None,
+        query_mode: BM25QueryMode = BM25QueryMode.EXHAUSTIVE,
     ) -> "BM25Retriever":
         # ensure only one of index, nodes, or docstore is passed
         if sum(bool(val) for val in [index, nodes, docstore]) != 1:
@@ -85,24 +146,144 @@ class BM25Retriever(BaseRetriever):
             nodes=nodes,
             tokenizer=tokenizer,
             similarity_top_k=similarity_top_k,
+            num_workers=num_workers,
+            query_mode=query_mode,
         )
 
-    def _get_scored_nodes(self, query: str) -> List[NodeWithScore]:
-        tokenized_query = self._tokenizer(query)
-        doc_scores = self.bm25.get_scores(tokenized_query)
+    @classmethod
+    def from_persist_dir(
+        cls,
+        persist_dir: str = DEFAULT_PERSIST_DIR,
+        nodes: Optional[List[BaseNode]] = None,
+        docstore: Optional["BaseDocumentStore"] = None,
+        tokenizer: Optional[Callable[[str], List[str]]] = None,
+        similarity_top_k: int = DEFAULT_SIMILARITY_TOP_K,
+        callback_manager: Optional[CallbackManager] = None,
+        mmap: bool = True,
+        num_workers: Optional[int] = None,
+        query_mode: BM25QueryMode = BM25QueryMode.EXHAUSTIVE,
+    ) -> "BM25Retriever":
+        """Load a retriever saved with `persist`.
 
-        nodes: List[NodeWithScore] = []
-        for i, node in enumerate(self._nodes):
-            nodes.append(NodeWithScore(node=node, score=doc_scores[i]))
+        Args:
+            persist_dir (str): the directory passed to `persist`.
+            nodes (Optional[List[BaseNode]]): the indexed nodes, or
+            docstore (Optional[BaseDocumentStore]): a docstore holding them.
+            tokenizer (Optional[Callable[[str], List[str]]]): must be the
+                tokenizer the index was built with.
+            mmap (bool): memory-map the posting lists instead of reading them.
 
-        return nodes
+        """
+        index_dir = os.path.join(persist_dir, BM25_PERSIST_DIRNAME)
+        index = BM25Index.from_persist_dir(index_dir, mmap=mmap)
+        with open(os.path.join(index_dir, NODE_IDS_FNAME)) as f:
+            node_ids = json.load(f)
+
+        if nodes is None:
+            if docstore is None:
+                raise ValueError("Please pass the indexed nodes or their docstore.")
+            nodes = docstore.get_nodes(
+                [node_id for node_id in node_ids if node_id is not None]
+            )
+        return cls(
+            nodes=nodes,
+            tokenizer=tokenizer,
+            similarity_top_k=similarity_top_k,
+            callback_manager=callback_manager,
+            index=index,
+            node_ids=node_ids,
+            num_workers=num_workers,
+            query_mode=query_mode,
+        )
+
+    def persist(self, persist_dir: str = DEFAULT_PERSIST_DIR) -> None:
+        """Save the index under persist_dir, the nodes are not saved."""
+        index_dir = os.path.join(persist_dir, BM25_PERSIST_DIRNAME)
+        self.bm25.persist(index_dir)
+        with open(os.path.join(index_dir, NODE_IDS_FNAME), "w") as f:
+            json.dump(self._node_ids, f)
+
+    def insert_nodes(self, nodes: Sequence[BaseNode]) -> None:
+        """Index nodes, replacing the already indexed nodes with the same id.
+
+        Within nodes, the last node of an id is indexed.
+        """
+        nodes = list({node.node_id: node for node in nodes}.values())
+        self.delete_nodes(
+            [node.node_id for node in nodes if node.node_id in self._doc_ids]
+        )
+        num_workers = self._num_workers or 1
+        if num_workers > 1 and len(nodes) > num_workers:
+            doc_ids = self.bm25.add_counts(self._count_terms_parallel(nodes))
+        else:
+            doc_ids = self.bm25.add(
+                self._tokenizer(node.get_content()) for node in nodes
+            )
+        for doc_id, node in zip(doc_ids, nodes):
+            self._nodes[node.node_id] = node
+            self._node_ids.append(node.node_id)
+            self._doc_ids[node.node_id] = int(doc_id)
+
+    def _count_terms_parallel(self, nodes: Sequence[BaseNode]) -> List[TermCounts]:
+        """Tokenize and count the terms of chunks of nodes in a process pool."""
+        assert self._num_workers is not None
+        num_workers = min(self._num_workers, multiprocessing.cpu_count())
+        chunk_size = max(
+            1, min(DEFAULT_TOKENIZE_CHUNK_SIZE, len(nodes) // (4 * num_workers))
+        )
+        texts = [node.get_content() for node in nodes]
+        chunks = [texts[i : i + chunk_size] for i in range(0, len(texts), chunk_size)]
+        with multiprocessing.Pool(num_workers) as p:
+            return p.map(partial(_tokenize_and_count, self._tokenizer), chunks)
+
+    def delete_nodes(self, node_ids: Sequence[str]) -> None:
+        """Remove nodes from the index, unknown node ids are ignored."""
+        doc_ids = []
+        for node_id in node_ids:
+            doc_id = self._doc_ids.pop(node_id, None)
+            if doc_id is None:
+                continue
+            del self._nodes[node_id]
+            self._node_ids[doc_id] = None
+            doc_ids.append(doc_id)
+        self.bm25.delete(doc_ids)
+
+    def delete_ref_doc(self, ref_doc_id: str) -> None:
+        """Remove the nodes of a document from the index."""
+        self.delete_nodes(
+            [
+                node_id
+                for node_id, node in self._nodes.items()
+                if node.ref_doc_id == ref_doc_id
+            ]
+        )
+
+    def compact(self) -> None:
+        """Drop the deleted nodes from the index, see `BM25Index.compact`."""
+        remap = self.bm25.compact()
+        node_ids: List[Optional[str]] = [None] * self.bm25.max_doc_id
+        for old_doc_id, node_id in enumerate(self._node_ids):
+            if node_id is not None:
+                node_ids[remap[old_doc_id]] = node_id
+        self._node_ids = node_ids
+        self._doc_ids = {node_id: i for i, node_id in enumerate(node_ids) if node_id}
+
+    def _get_scored_nodes(self, query: str) -> List[NodeWithScore]:
+        """Get the top k nodes of a query, by decreasing score."""
+        tokenized_query = self._tokenizer(query)
+        doc_ids, doc_scores = self.bm25.top_k(
+            tokenized_query, self._similarity_top_k, query_mode=self._query_mode
+        )
+        return [
+            NodeWithScore(
+                node=self._nodes[cast(str, self._node_ids[doc_id])], score=float(score)
+            )
+            for doc_id, score in zip(doc_ids, doc_scores)
+        ]
 
     def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
         if query_bundle.custom_embedding_strs or query_bundle.embedding:
             logger.warning("BM25Retriever does not support embeddings, skipping...")
 
-        scored_nodes = self._get_scored_nodes(query_bundle.query_str)
-
-        # Sort and get top_k nodes, score range => 0..1, closer to 1 means more relevant
-        nodes = sorted(scored_nodes, key=lambda x: x.score or 0.0, reverse=True)
-        return nodes[: self._similarity_top_k]
\ No newline at end of file
+        # only the nodes sharing a term with the query can be returned
+        return self._get_scored_nodes(query_bundle.query_str)
\ No newline at end of file
@@ -0,0 +1,810 @@
+"""Inverted index BM25 engine.
+
+The corpus is stored as a compressed inverted index: for each term, a posting
+list of the ids of the documents containing it and the term frequencies, all
+posting lists laid out back to back in flat numpy arrays (CSR layout). A query
+only reads the posting lists of its terms, so its cost scales with their
+length rather than with the corpus size.
+
+Documents are added to an in-memory delta segment, merged into the CSR arrays
+on `persist` or `merge`. Deleted documents are masked out until `compact`.
+The corpus statistics (document frequencies, average document length) are
+kept up to date on both, so scores always match `rank_bm25.BM25Okapi` over
+the live documents.
+
+A persisted index is a directory of `.npy` arrays and a json of the
+vocabulary, the posting arrays are memory-mapped on load.
+
+"""
+import json
+import logging
+import os
+from collections import Counter
+from dataclasses import dataclass
+from enum import Enum
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_K1 = 1.5
+DEFAULT_B = 0.75
+DEFAULT_EPSILON = 0.25
+
+# term frequencies are stored as uint16
+MAX_TERM_FREQUENCY = np.iinfo(np.uint16).max
+
+BM25_INDEX_FORMAT_VERSION = 1
+DEFAULT_PERSIST_DIRNAME = "bm25_index"
+META_FNAME = "meta.json"
+# memory-mapped on load
+POSTING_ARRAYS = (
+    "offsets",
+    "doc_ids",
+    "term_freqs",
+    "doc_term_offsets",
+    "doc_term_ids",
+)
+# loaded in memory, updated in place
+STATS_ARRAYS = ("doc_lengths", "doc_freqs", "deleted")
+
+# number of postings per block of the block max scores
+BLOCK_SIZE = 128
+# block-max top k falls back to the exhaustive one when the essential terms
+# hold more than this share of the postings of the query
+MAX_ESSENTIAL_RATIO = 0.5
+# a binary search costs about as much as scanning SEARCH_COST postings
+SEARCH_COST = 16
+# scores are summed in per doc id accumulators rather than by sorting the doc
+# ids once there is more than 1 / DENSE_SUM_RATIO posting per document
+DENSE_SUM_RATIO = 8
+# float32 scores summed in another order can differ in the last bits, upper
+# bounds are inflated to stay upper bounds
+UPPER_BOUND_MARGIN = 1 + 1e-5
+
+
+class BM25QueryMode(str, Enum):
+    """Evaluation of a `BM25Index.top_k` query."""
+
+    # score all the postings of the query terms
+    EXHAUSTIVE = "exhaustive"
+    # Block-Max MaxScore: skip the documents whose score upper bound, from the
+    # per term and per block max scores, can't reach the top k
+    BLOCK_MAX = "block_max"
+
+
+@dataclass
+class TermCounts:
+    """Term counts of a batch of tokenized documents, see `count_terms`.
+
+    Term ids are local to the batch, `BM25Index.add_counts` maps them to the
+    ids of its vocabulary.
+    """
+
+    terms: List[str]  # local term id -> term
+    term_ids: np.ndarray  # the term ids of each document, document after document
+    term_freqs: np.ndarray  # the frequency of each of term_ids
+    doc_num_terms: np.ndarray  # the number of term ids per document
+    doc_lengths: np.ndarray  # the number of tokens per document
+
+
+def count_terms(corpus: Iterable[Sequence[str]]) -> TermCounts:
+    """Count the terms of tokenized documents."""
+    vocab: Dict[str, int] = {}
+    term_ids: List[int] = []
+    term_freqs: List[int] = []
+    doc_num_terms: List[int] = []
+    doc_lengths: List[int] = []
+    for tokens in corpus:
+        counts = Counter(tokens)
+        for term, term_freq in counts.items():
+            term_ids.append(vocab.setdefault(term, len(vocab)))
+            term_freqs.append(term_freq)
+        doc_num_terms.append(len(counts))
+        doc_lengths.append(len(tokens))
+    return TermCounts(
+        terms=list(vocab),
+        term_ids=np.asarray(term_ids, dtype=np.int64),
+        term_freqs=np.asarray(term_freqs, dtype=np.int64),
+        doc_num_terms=np.asarray(doc_num_terms, dtype=np.int64),
+        doc_lengths=np.asarray(doc_lengths, dtype=np.float32),
+    )
+
+
+def _search_sorted(
+    sorted_array: np.ndarray, values: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the positions of values in a sorted array, and which are found."""
+    positions = np.searchsorted(sorted_array, values)
+    found = positions < len(sorted_array)
+    found[found] = sorted_array[positions[found]] == values[found]
+    return positions, found
+
+
+def _save_array(path: str, array: np.ndarray) -> None:
+    # replace rather than overwrite, the old file may be memory-mapped
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+class BM25Index:
+    """BM25 (Okapi) over an updatable inverted index.
+
+    Doc ids are assigned in insertion order and stay stable across `delete`
+    and `merge`, only `compact` renumbers them.
+
+    Args:
+        k1 (float): term frequency saturation.
+        b (float): document length normalization.
+        epsilon (float): the idf of the terms in more than half the documents,
+            negative with Okapi idf, is floored to epsilon * mean idf.
+
+    """
+
+    def __init__(
+        self,
+        k1: float = DEFAULT_K1,
+        b: float = DEFAULT_B,
+        epsilon: float = DEFAULT_EPSILON,
+    ) -> None:
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.vocab: Dict[str, int] = {}
+
+        # merged segment, posting list of term t: [offsets[t], offsets[t + 1])
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.empty(0, dtype=np.int32)
+        self.term_freqs = np.empty(0, dtype=np.uint16)
+        # forward index of the merged segment, to update doc_freqs on delete
+        self.doc_term_offsets = np.zeros(1, dtype=np.int64)
+        self.doc_term_ids = np.empty(0, dtype=np.int32)
+
+        # delta segment, as postings: term id -> (doc ids, term frequencies),
+        # and per document: (term ids, term frequencies)
+        self._delta_postings: Dict[int, Tuple[List[int], List[int]]] = {}
+        self._delta_docs: List[Tuple[List[int], List[int]]] = []
+
+        # corpus statistics, over merged and delta documents
+        self.doc_lengths = np.empty(0, dtype=np.float32)
+        self.doc_freqs = np.empty(0, dtype=np.int64)  # live documents only
+        self.deleted = np.empty(0, dtype=np.bool_)
+        self._num_deleted = 0
+        self._total_length = 0.0  # of the live documents
+
+        # derived from the statistics, recomputed lazily after an update
+        self._idf: Optional[np.ndarray] = None
+        # k1 * (1 - b + b * doc_length / avgdl), per document
+        self._length_norms: Optional[np.ndarray] = None
+        # term id -> last doc id and max score of its blocks of postings
+        self._block_maxes: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+
+    @classmethod
+    def from_corpus(
+        cls,
+        corpus: Sequence[Sequence[str]],
+        k1: float = DEFAULT_K1,
+        b: float = DEFAULT_B,
+        epsilon: float = DEFAULT_EPSILON,
+    ) -> "BM25Index":
+        """Build the index of a tokenized corpus, doc ids are corpus positions."""
+        index = cls(k1=k1, b=b, epsilon=epsilon)
+        index.add_counts([count_terms(corpus)])
+        return index
+
+    @property
+    def num_docs(self) -> int:
+        """Number of live documents."""
+        return len(self.doc_lengths) - self._num_deleted
+
+    @property
+    def max_doc_id(self) -> int:
+        """Upper bound of the doc ids, deleted documents included."""
+        return len(self.doc_lengths)
+
+    @property
+    def _num_merged_docs(self) -> int:
+        return len(self.doc_term_offsets) - 1
+
+    def __len__(self) -> int:
+        return self.num_docs
+
+    def _invalidate(self) -> None:
+        self._idf = None
+        self._length_norms = None
+        self._block_maxes = {}
+
+    def _get_term_ids(self, terms: Sequence[str]) -> np.ndarray:
+        """Get the ids of terms, adding the new ones to the vocabulary."""
+        vocab = self.vocab
+        return np.fromiter(
+            (vocab.setdefault(term, len(vocab)) for term in terms),
+            dtype=np.int64,
+            count=len(terms),
+        )
+
+    def _add_doc_stats(self, doc_lengths: np.ndarray, term_ids: np.ndarray) -> None:
+        """Update the corpus statistics with new documents."""
+        self.doc_lengths = np.concatenate((self.doc_lengths, doc_lengths))
+        self.deleted = np.concatenate(
+            (self.deleted, np.zeros(len(doc_lengths), dtype=np.bool_))
+        )
+        if len(self.vocab) > len(self.doc_freqs):
+            self.doc_freqs = np.concatenate(
+                (
+                    self.doc_freqs,
+                    np.zeros(len(self.vocab) - len(self.doc_freqs), dtype=np.int64),
+                )
+            )
+        self.doc_freqs += np.bincount(term_ids, minlength=len(self.doc_freqs))
+        self._total_length += float(doc_lengths.sum(dtype=np.float64))
+        self._invalidate()
+
+    def add(self, corpus: Iterable[Sequence[str]]) -> np.ndarray:
+        """Add tokenized documents to the delta segment, returns their doc ids."""
+        counts = count_terms(corpus)
+        term_ids = self._get_term_ids(counts.terms)[counts.term_ids]
+        start = self.max_doc_id
+        bounds = np.concatenate(([0], np.cumsum(counts.doc_num_terms))).tolist()
+        for i, doc_id in enumerate(range(start, start + len(counts.doc_lengths))):
+            doc_term_ids = term_ids[bounds[i] : bounds[i + 1]].tolist()
+            doc_term_freqs = counts.term_freqs[bounds[i] : bounds[i + 1]].tolist()
+            self._delta_docs.append((doc_term_ids, doc_term_freqs))
+            for term_id, term_freq in zip(doc_term_ids, doc_term_freqs):
+                postings = self._delta_postings.get(term_id)
+                if postings is None:
+                    postings = self._delta_postings[term_id] = ([], [])
+                postings[0].append(doc_id)
+                postings[1].append(term_freq)
+
+        self._add_doc_stats(counts.doc_lengths, term_ids)
+        return np.arange(start, self.max_doc_id)
+
+    def add_counts(self, batches: Iterable["TermCounts"]) -> np.ndarray:
+        """Add documents counted with `count_terms`, returns their doc ids.
+
+        The documents go straight to the CSR arrays, with a single merge for
+        all the batches, e.g. the partial postings of parallel workers.
+        """
+        self.merge()
+        start = self.max_doc_id
+        all_term_ids: List[np.ndarray] = []
+        all_term_freqs: List[np.ndarray] = []
+        all_doc_num_terms: List[np.ndarray] = []
+        all_doc_lengths: List[np.ndarray] = []
+        for counts in batches:
+            all_term_ids.append(self._get_term_ids(counts.terms)[counts.term_ids])
+            all_term_freqs.append(counts.term_freqs)
+            all_doc_num_terms.append(counts.doc_num_terms)
+            all_doc_lengths.append(counts.doc_lengths)
+        if not all_doc_lengths:
+            return np.arange(start, start)
+
+        term_ids = np.concatenate(all_term_ids)
+        self._add_doc_stats(np.concatenate(all_doc_lengths), term_ids)
+        self._extend_merged(
+            term_ids, np.concatenate(all_term_freqs), np.concatenate(all_doc_num_terms)
+        )
+        return np.arange(start, self.max_doc_id)
+
+    def _get_doc_term_ids(self, doc_id: int) -> np.ndarray:
+        if doc_id < self._num_merged_docs:
+            start = self.doc_term_offsets[doc_id]
+            end = self.doc_term_offsets[doc_id + 1]
+            return self.doc_term_ids[start:end]
+        return np.asarray(
+            self._delta_docs[doc_id - self._num_merged_docs][0], dtype=np.int32
+        )
+
+    def delete(self, doc_ids: Iterable[int]) -> None:
+        """Delete documents, their postings are dropped on `compact`."""
+        for doc_id in doc_ids:
+            if not 0 <= doc_id < self.max_doc_id:
+                raise IndexError(f"Unknown BM25 doc id {doc_id}.")
+            if self.deleted[doc_id]:
+                continue
+            self.deleted[doc_id] = True
+            np.subtract.at(self.doc_freqs, self._get_doc_term_ids(doc_id), 1)
+            self._num_deleted += 1
+            self._total_length -= float(self.doc_lengths[doc_id])
+        self._invalidate()
+
+    def _extend_merged(
+        self, term_ids: np.ndarray, term_freqs: np.ndarray, doc_num_terms: np.ndarray
+    ) -> None:
+        """Append documents to the CSR arrays.
+
+        Args:
+            term_ids (np.ndarray): the term ids of each document, document
+                after document.
+            term_freqs (np.ndarray): the frequency of each of term_ids.
+            doc_num_terms (np.ndarray): the number of term ids per document.
+
+        """
+        doc_ids = self._num_merged_docs + np.repeat(
+            np.arange(len(doc_num_terms)), doc_num_terms
+        )
+        merged_terms = np.repeat(
+            np.arange(len(self.offsets) - 1), np.diff(self.offsets)
+        )
+        # the new doc ids come after the merged ones, so a stable sort by
+        # term keeps the postings sorted by doc id
+        terms = np.concatenate((merged_terms, term_ids))
+        order = np.argsort(terms, kind="stable")
+        self.doc_ids = np.concatenate((self.doc_ids, doc_ids.astype(np.int32)))[order]
+        self.term_freqs = np.concatenate(
+            (
+                self.term_freqs,
+                np.minimum(term_freqs, MAX_TERM_FREQUENCY).astype(np.uint16),
+            )
+        )[order]
+        self.offsets = np.concatenate(
+            ([0], np.cumsum(np.bincount(terms, minlength=len(self.vocab))))
+        ).astype(np.int64)
+
+        self.doc_term_offsets = np.concatenate(
+            (
+                self.doc_term_offsets,
+                self.doc_term_offsets[-1] + np.cumsum(doc_num_terms, dtype=np.int64),
+            )
+        )
+        self.doc_term_ids = np.concatenate(
+            (self.doc_term_ids, term_ids.astype(np.int32))
+        )
+
+    def merge(self) -> None:
+        """Merge the delta segment into the CSR arrays, doc ids are unchanged."""
+        if not self._delta_docs:
+            return
+        term_ids = [t for doc_term_ids, _ in self._delta_docs for t in doc_term_ids]
+        term_freqs = [f for _, doc_freqs in self._delta_docs for f in doc_freqs]
+        doc_num_terms = [len(doc_term_ids) for doc_term_ids, _ in self._delta_docs]
+        self._delta_postings = {}
+        self._delta_docs = []
+        self._extend_merged(
+            np.asarray(term_ids, dtype=np.int64),
+            np.asarray(term_freqs, dtype=np.int64),
+            np.asarray(doc_num_terms, dtype=np.int64),
+        )
+
+    def compact(self) -> np.ndarray:
+        """Merge, then drop the postings of the deleted documents.
+
+        Returns:
+            np.ndarray: the new id of each old doc id, -1 for deleted documents.
+        """
+        self.merge()
+        live = ~self.deleted
+        remap = np.full(self.max_doc_id, -1, dtype=np.int64)
+        remap[live] = np.arange(self.num_docs)
+        if not self._num_deleted:
+            return remap
+
+        terms = np.repeat(np.arange(len(self.offsets) - 1), np.diff(self.offsets))
+        keep = live[self.doc_ids]
+        self.doc_ids = remap[self.doc_ids[keep]].astype(np.int32)
+        self.term_freqs = self.term_freqs[keep]
+        self.offsets = np.concatenate(
+            ([0], np.cumsum(np.bincount(terms[keep], minlength=len(self.vocab))))
+        ).astype(np.int64)
+
+        doc_num_terms = np.diff(self.doc_term_offsets)
+        self.doc_term_ids = self.doc_term_ids[np.repeat(live, doc_num_terms)]
+        self.doc_term_offsets = np.concatenate(
+            ([0], np.cumsum(doc_num_terms[live]))
+        ).astype(np.int64)
+
+        self.doc_lengths = self.doc_lengths[live]
+        self.deleted = np.zeros(len(self.doc_lengths), dtype=np.bool_)
+        self._num_deleted = 0
+        self._invalidate()
+        return remap
+
+    def _get_weights(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the idf of the terms and the length norms of the documents."""
+        if self._idf is None:
+            num_docs = self.num_docs
+            doc_freqs = self.doc_freqs.astype(np.float64)
+            idf = np.log(num_docs - doc_freqs + 0.5) - np.log(doc_freqs + 0.5)
+            # the terms left in no live document are not part of the corpus
+            present = self.doc_freqs > 0
+            mean_idf = idf[present].mean() if present.any() else 0.0
+            idf[idf < 0] = self.epsilon * mean_idf
+            self._idf = idf.astype(np.float32)
+        if self._length_norms is None:
+            avgdl = (self._total_length / self.num_docs if self.num_docs else 0) or 1.0
+            self._length_norms = (
+                self.k1 * (1 - self.b + self.b * self.doc_lengths / avgdl)
+            ).astype(np.float32)
+        return self._idf, self._length_norms
+
+    def _get_raw_postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the doc ids and term frequencies of a term, deleted docs included.
+
+        The doc ids are sorted, the merged postings being followed by the
+        delta ones.
+        """
+        doc_ids = np.empty(0, dtype=np.int32)
+        term_freqs = np.empty(0, dtype=np.uint16)
+        if term_id < len(self.offsets) - 1:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            doc_ids = self.doc_ids[start:end]
+            term_freqs = self.term_freqs[start:end]
+        delta = self._delta_postings.get(term_id)
+        if delta is not None:
+            doc_ids = np.concatenate((doc_ids, np.asarray(delta[0], dtype=np.int32)))
+            term_freqs = np.concatenate(
+                (term_freqs, np.asarray(delta[1], dtype=np.uint16))
+            )
+        return doc_ids, term_freqs
+
+    def _get_postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the live doc ids and term frequencies of a term."""
+        doc_ids, term_freqs = self._get_raw_postings(term_id)
+        if self._num_deleted:
+            live = ~self.deleted[doc_ids]
+            doc_ids, term_freqs = doc_ids[live], term_freqs[live]
+        return doc_ids, term_freqs
+
+    def _score_postings(
+        self,
+        term_id: int,
+        query_freq: int,
+        doc_ids: np.ndarray,
+        term_freqs: np.ndarray,
+    ) -> np.ndarray:
+        """Get the score contributions of postings of a query term."""
+        idf, length_norms = self._get_weights()
+        term_freqs = term_freqs.astype(np.float32)
+        return (
+            query_freq
+            * idf[term_id]
+            * term_freqs
+            * (self.k1 + 1)
+            / (term_freqs + length_norms[doc_ids])
+        )
+
+    def _get_query_terms(self, query_tokens: Sequence[str]) -> List[Tuple[int, int]]:
+        """Get the ids and query frequencies of the indexed query terms."""
+        return [
+            (self.vocab[term], query_freq)
+            for term, query_freq in Counter(query_tokens).items()
+            if term in self.vocab
+        ]
+
+    def _query_postings(
+        self, query_terms: List[Tuple[int, int]]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the doc ids and score contributions of the query terms' postings."""
+        all_doc_ids: List[np.ndarray] = []
+        all_scores: List[np.ndarray] = []
+        for term_id, query_freq in query_terms:
+            doc_ids, term_freqs = self._get_postings(term_id)
+            all_doc_ids.append(doc_ids)
+            all_scores.append(
+                self._score_postings(term_id, query_freq, doc_ids, term_freqs)
+            )
+        if not all_doc_ids:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        return np.concatenate(all_doc_ids), np.concatenate(all_scores)
+
+    def _lookup_postings(
+        self,
+        query_terms: List[Tuple[int, int]],
+        raw_postings: List[Tuple[np.ndarray, np.ndarray]],
+        doc_ids: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the doc ids and score contributions of the query terms' postings,
+        restricted to the sorted doc_ids, without reading the whole postings."""
+        all_doc_ids: List[np.ndarray] = [np.empty(0, dtype=np.int32)]
+        all_scores: List[np.ndarray] = [np.empty(0, dtype=np.float32)]
+        is_doc: Optional[np.ndarray] = None
+        for (term_id, query_freq), (posting_doc_ids, term_freqs) in zip(
+            query_terms, raw_postings
+        ):
+            if len(doc_ids) * SEARCH_COST < len(posting_doc_ids):
+                positions, found = _search_sorted(posting_doc_ids, doc_ids)
+                positions = positions[found]
+            else:
+                # scanning the postings is cheaper than searching them
+                if is_doc is None:
+                    is_doc = np.zeros(self.max_doc_id, dtype=np.bool_)
+                    is_doc[doc_ids] = True
+                positions = np.flatnonzero(is_doc[posting_doc_ids])
+            all_doc_ids.append(posting_doc_ids[positions])
+            all_scores.append(
+                self._score_postings(
+                    term_id,
+                    query_freq,
+                    posting_doc_ids[positions],
+                    term_freqs[positions],
+                )
+            )
+        return np.concatenate(all_doc_ids), np.concatenate(all_scores)
+
+    def _get_block_maxes(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the last doc id and the max score contribution of each block of
+        BLOCK_SIZE postings of a term, computed once per corpus update."""
+        block_maxes = self._block_maxes.get(term_id)
+        if block_maxes is None:
+            doc_ids, term_freqs = self._get_raw_postings(term_id)
+            scores = self._score_postings(term_id, 1, doc_ids, term_freqs)
+            starts = np.arange(0, len(doc_ids), BLOCK_SIZE)
+            ends = np.minimum(starts + BLOCK_SIZE, len(doc_ids))
+            block_maxes = self._block_maxes[term_id] = (
+                doc_ids[ends - 1],
+                np.maximum.reduceat(scores, starts) if len(scores) else scores,
+            )
+        return block_maxes
+
+    def _get_block_upper_bounds(
+        self, term_id: int, query_freq: int, doc_ids: np.ndarray
+    ) -> np.ndarray:
+        """Get an upper bound of the score contribution of a term to doc_ids."""
+        block_last_doc_ids, block_maxes = self._get_block_maxes(term_id)
+        if len(doc_ids) * SEARCH_COST < len(block_maxes) * BLOCK_SIZE:
+            blocks = np.searchsorted(block_last_doc_ids, doc_ids)
+            upper_bounds = np.zeros(len(doc_ids), dtype=np.float64)
+            in_range = blocks < len(block_maxes)
+            upper_bounds[in_range] = query_freq * block_maxes[blocks[in_range]]
+        else:
+            # scanning the postings is cheaper, and bounds only their docs
+            posting_doc_ids, _ = self._get_raw_postings(term_id)
+            doc_upper_bounds = np.zeros(self.max_doc_id, dtype=np.float64)
+            doc_upper_bounds[posting_doc_ids] = query_freq * np.repeat(
+                block_maxes, BLOCK_SIZE
+            )[: len(posting_doc_ids)]
+            upper_bounds = doc_upper_bounds[doc_ids]
+        return upper_bounds * UPPER_BOUND_MARGIN
+
+    def _sum_scores(
+        self, doc_ids: np.ndarray, scores: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Sum the contributions of the terms per document."""
+        if len(doc_ids) * DENSE_SUM_RATIO < self.max_doc_id:
+            candidates, inverse = np.unique(doc_ids, return_inverse=True)
+            return candidates, np.bincount(inverse, weights=scores).astype(np.float32)
+        # one accumulator per doc id is cheaper than sorting the doc ids
+        candidates = np.flatnonzero(np.bincount(doc_ids, minlength=self.max_doc_id))
+        doc_scores = np.bincount(doc_ids, weights=scores, minlength=self.max_doc_id)
+        return candidates, doc_scores[candidates].astype(np.float32)
+
+    def _select_top_k(
+        self, candidates: np.ndarray, candidate_scores: np.ndarray, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the k best candidates, ties broken by doc id."""
+        if len(candidates) > k:
+            kth_score = -np.partition(-candidate_scores, k - 1)[k - 1]
+            top = np.flatnonzero(candidate_scores >= kth_score)
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.lexsort((candidates[top], -candidate_scores[top]))][:k]
+        return candidates[top], candidate_scores[top]
+
+    def _top_k_exhaustive(
+        self, query_terms: List[Tuple[int, int]], k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        doc_ids, scores = self._query_postings(query_terms)
+        return self._select_top_k(*self._sum_scores(doc_ids, scores), k)
+
+    def _top_k_block_max(
+        self, query_terms: List[Tuple[int, int]], k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top k by Block-Max MaxScore dynamic pruning.
+
+        A threshold is first set by the exact scores of the best block of each
+        term. The terms whose summed max scores stay under it can't make a
+        document reach the top k alone: only the postings of the other,
+        essential terms are read. Their candidates are then pruned with the
+        block max scores of the non essential terms before their exact scores
+        are looked up. The result is the exhaustive one.
+
+        The bounds need non negative contributions: queries with a term whose
+        idf is not positive, once floored at epsilon * mean idf in corpora of
+        mostly common terms, are scored exhaustively.
+        """
+        idf, _ = self._get_weights()
+        if (idf[[term_id for term_id, _ in query_terms]] <= 0).any():
+            return self._top_k_exhaustive(query_terms, k)
+
+        raw_postings = [self._get_raw_postings(term_id) for term_id, _ in query_terms]
+        term_block_maxes = [
+            self._get_block_maxes(term_id) for term_id, _ in query_terms
+        ]
+        term_max_scores = np.array(
+            [
+                query_freq * block_maxes.max() if len(block_maxes) else 0.0
+                for (_, query_freq), (_, block_maxes) in zip(
+                    query_terms, term_block_maxes
+                )
+            ]
+        )
+
+        # threshold: the kth best exact score of the docs of the best blocks
+        seeds = [np.empty(0, dtype=np.int32)]
+        for (doc_ids, _), (_, block_maxes) in zip(raw_postings, term_block_maxes):
+            if len(block_maxes):
+                start = int(block_maxes.argmax()) * BLOCK_SIZE
+                seeds.append(doc_ids[start : start + BLOCK_SIZE])
+        seed_doc_ids = np.unique(np.concatenate(seeds))
+        seed_doc_ids = seed_doc_ids[~self.deleted[seed_doc_ids]]
+        _, seed_scores = self._sum_scores(
+            *self._lookup_postings(query_terms, raw_postings, seed_doc_ids)
+        )
+        if len(seed_scores) < k:
+            return self._top_k_exhaustive(query_terms, k)
+        threshold = -np.partition(-seed_scores, k - 1)[k - 1]
+
+        # the non essential terms: the lowest max scores summing under threshold
+        order = np.argsort(term_max_scores, kind="stable")
+        cumulative_max_scores = np.cumsum(term_max_scores[order]) * UPPER_BOUND_MARGIN
+        num_non_essential = min(
+            int(np.searchsorted(cumulative_max_scores, threshold)), len(order) - 1
+        )
+        posting_lens = np.array([len(doc_ids) for doc_ids, _ in raw_postings])
+        if posting_lens[order[num_non_essential:]].sum() > (
+            MAX_ESSENTIAL_RATIO * posting_lens.sum()
+        ):
+            # too few postings can be skipped to pay for the pruning
+            return self._top_k_exhaustive(query_terms, k)
+
+        # candidates: the docs of the essential terms, by their partial scores
+        essential_scores: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        for i in order[num_non_essential:]:
+            term_id, query_freq = query_terms[i]
+            doc_ids, term_freqs = raw_postings[i]
+            if self._num_deleted:
+                live = ~self.deleted[doc_ids]
+                doc_ids, term_freqs = doc_ids[live], term_freqs[live]
+            essential_scores[i] = (
+                doc_ids,
+                self._score_postings(term_id, query_freq, doc_ids, term_freqs),
+            )
+        essential_doc_ids = np.concatenate(
+            [doc_ids for doc_ids, _ in essential_scores.values()]
+        )
+        partial_scores = np.bincount(
+            essential_doc_ids,
+            weights=np.concatenate([scores for _, scores in essential_scores.values()]),
+            minlength=self.max_doc_id,
+        )
+        is_candidate = np.zeros(self.max_doc_id, dtype=np.bool_)
+        is_candidate[essential_doc_ids] = True
+        candidates = np.flatnonzero(is_candidate)
+        partial_scores = partial_scores[candidates]
+        if len(candidates) > k:
+            # raise the threshold with the exact scores of the best candidates
+            best = candidates[np.argpartition(-partial_scores, k - 1)[:k]]
+            _, best_scores = self._sum_scores(
+                *self._lookup_postings(query_terms, raw_postings, np.sort(best))
+            )
+            threshold = max(threshold, best_scores.min())
+
+        upper_bounds = partial_scores * UPPER_BOUND_MARGIN
+        for i in order[:num_non_essential]:
+            upper_bounds += self._get_block_upper_bounds(*query_terms[i], candidates)
+        candidates = candidates[upper_bounds >= threshold]
+        is_candidate[:] = False
+        is_candidate[candidates] = True
+
+        # exact scores, summed in the query terms order as in exhaustive mode
+        all_doc_ids: List[np.ndarray] = []
+        all_scores: List[np.ndarray] = []
+        for i, query_term in enumerate(query_terms):
+            if i in essential_scores:
+                doc_ids, scores = essential_scores[i]
+                found = is_candidate[doc_ids]
+                all_doc_ids.append(doc_ids[found])
+                all_scores.append(scores[found])
+            else:
+                doc_ids, scores = self._lookup_postings(
+                    [query_term], [raw_postings[i]], candidates
+                )
+                all_doc_ids.append(doc_ids)
+                all_scores.append(scores)
+        return self._select_top_k(
+            *self._sum_scores(np.concatenate(all_doc_ids), np.concatenate(all_scores)),
+            k,
+        )
+
+    def top_k(
+        self,
+        query_tokens: Sequence[str],
+        k: int,
+        query_mode: str = BM25QueryMode.EXHAUSTIVE,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the k best documents of a query.
+
+        Only the documents sharing a term with the query are scored, so fewer
+        than k documents are returned if fewer match. Both query modes return
+        the same documents and scores.
+
+        Args:
+            query_tokens (Sequence[str]): the tokenized query.
+            k (int): number of documents to return.
+            query_mode (str): one of `BM25QueryMode`.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: the doc ids and their scores, by
+                decreasing score then increasing doc id.
+        """
+        query_terms = self._get_query_terms(query_tokens)
+        if not query_terms or k <= 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        if BM25QueryMode(query_mode) == BM25QueryMode.BLOCK_MAX:
+            return self._top_k_block_max(query_terms, k)
+        return self._top_k_exhaustive(query_terms, k)
+
+    def get_scores(self, query_tokens: Sequence[str]) -> np.ndarray:
+        """Get the scores of all the doc ids, as `BM25Okapi.get_scores`."""
+        all_scores = np.zeros(self.max_doc_id, dtype=np.float32)
+        doc_ids, scores = self._query_postings(self._get_query_terms(query_tokens))
+        np.add.at(all_scores, doc_ids, scores)
+        return all_scores
+
+    def get_doc_freq(self, term: str) -> int:
+        """Get the number of live documents containing a term."""
+        term_id = self.vocab.get(term)
+        if term_id is None:
+            return 0
+        return int(self.doc_freqs[term_id])
+
+    def persist(self, persist_dir: str) -> None:
+        """Merge the delta segment, then save the index to a directory."""
+        self.merge()
+        os.makedirs(persist_dir, exist_ok=True)
+        for name in POSTING_ARRAYS + STATS_ARRAYS:
+            _save_array(os.path.join(persist_dir, f"{name}.npy"), getattr(self, name))
+
+        meta = {
+            "version": BM25_INDEX_FORMAT_VERSION,
+            "k1": self.k1,
+            "b": self.b,
+            "epsilon": self.epsilon,
+            "vocab": list(self.vocab),
+        }
+        meta_path = os.path.join(persist_dir, META_FNAME)
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str, mmap: bool = True) -> "BM25Index":
+        """Load an index saved with `persist`.
+
+        Args:
+            persist_dir (str): directory of the saved index.
+            mmap (bool): memory-map the posting arrays instead of reading them.
+
+        """
+        meta_path = os.path.join(persist_dir, META_FNAME)
+        if not os.path.exists(meta_path):
+            raise ValueError(f"No existing {__name__} found at {persist_dir}.")
+        with open(meta_path) as f:
+            meta = json.load(f)
+        version = meta.get("version")
+        if version != BM25_INDEX_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported BM25 index version {version}, "
+                f"expected {BM25_INDEX_FORMAT_VERSION}."
+            )
+
+        logger.info(f"Loading {__name__} from {persist_dir}.")
+        index = cls(k1=meta["k1"], b=meta["b"], epsilon=meta["epsilon"])
+        index.vocab = {term: term_id for term_id, term in enumerate(meta["vocab"])}
+        for name in POSTING_ARRAYS:
+            array = np.load(
+                os.path.join(persist_dir, f"{name}.npy"),
+                mmap_mode="r" if mmap else None,
+            )
+            setattr(index, name, array)
+        for name in STATS_ARRAYS:
+            setattr(index, name, np.load(os.path.join(persist_dir, f"{name}.npy")))
+
+        live = ~index.deleted
+        index._num_deleted = int(index.deleted.sum())
+        index._total_length = float(index.doc_lengths[live].sum(dtype=np.float64))
+        return index
@@ -200,7 +200,7 @@ class KVDocumentStore(BaseDocumentStore):
 
                 ref_doc_info["metadata"] = ref_doc_info.get("extra_info", {})
                 ref_doc_info.pop("extra_info")
-                all_ref_doc_infos[doc_id] = RefDocInfo(**ref_doc_info)
+            all_ref_doc_infos[doc_id] = RefDocInfo(**ref_doc_info)
 
         return all_ref_doc_infos
 
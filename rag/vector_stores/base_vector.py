@@ -68,6 +68,17 @@ class VectorStore(Protocol):
         """
         return self.query(query, **kwargs)
 
+    def batch_query(
+        self, queries: List[VectorStoreQuery], **kwargs: Any
+    ) -> List[VectorStoreQueryResult]:
+        """
+        Query vector store with many queries at once.
+        Results are returned in the same order as queries.
+        NOTE: this is not implemented natively for all vector stores. If not
+        implemented, it will just call query for each query.
+        """
+        return [self.query(query, **kwargs) for query in queries]
+
     def persist(
         self, persist_path: str, fs: Optional[fsspec.AbstractFileSystem] = None
     ) -> None:
@@ -4,9 +4,11 @@ An index that is built on top of an existing vector store.
 
 """
 
+import json
 import logging
 import os
-from typing import Any, List, Optional, cast
+from enum import Enum
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple, cast
 
 import fsspec
 import numpy as np
@@ -20,6 +22,7 @@ from rag.constants.default_storage import (
 from rag.vector_stores.base_vector import VectorStore
 from .simple import DEFAULT_VECTOR_STORE, NAMESPACE_SEP
 from .types import (
+    MetadataFilters,
     VectorStoreQuery,
     VectorStoreQueryResult,
 )
@@ -31,17 +34,233 @@ DEFAULT_PERSIST_PATH = os.path.join(
     DEFAULT_PERSIST_DIR, f"{DEFAULT_VECTOR_STORE}{NAMESPACE_SEP}{DEFAULT_PERSIST_FNAME}"
 )
 
+# version of the id map sidecar persisted next to the faiss index
+ID_MAP_FORMAT_VERSION = 1
+
+# number of embeddings buffered to train an index, then its max training sample
+DEFAULT_TRAIN_SAMPLE_SIZE = 100_000
+
+
+class FaissIndexType(str, Enum):
+    """Faiss index types built by `create_faiss_index`."""
+
+    # exact (brute force) search
+    FLAT_L2 = "l2"
+    FLAT_IP = "ip"
+
+    # inverted file, needs training, searched with `nprobe`
+    IVF = "ivf"
+    # inverted file with product quantized vectors, for compression
+    IVF_PQ = "ivfpq"
+    # IVF-PQ with an OPQ rotation learned before quantization
+    OPQ_IVF_PQ = "opq_ivfpq"
+
+    # graph based, no training, searched with `ef_search`
+    HNSW = "hnsw"
+
+
+def create_faiss_index(
+    embedding_dim: int,
+    index_build: str = FaissIndexType.FLAT_L2,
+    metric: str = "l2",
+    nlist: int = 1024,
+    nprobe: int = 8,
+    pq_m: int = 16,
+    pq_nbits: int = 8,
+    hnsw_m: int = 32,
+    ef_construction: int = 40,
+    ef_search: int = 16,
+) -> Any:
+    """Build an empty faiss index.
+
+    IVF / PQ indexes are untrained, `FaissVectorStore` trains them once it
+    has buffered enough embeddings.
+
+    Args:
+        embedding_dim (int): dimension of the embeddings.
+        index_build (str): one of `FaissIndexType`.
+        metric (str): "l2" or "ip", ignored by the flat index types which
+            carry their own metric.
+        nlist (int): number of IVF lists.
+        nprobe (int): default number of IVF lists visited per query.
+        pq_m (int): number of PQ sub-quantizers, must divide embedding_dim.
+        pq_nbits (int): bits per PQ sub-quantizer code.
+        hnsw_m (int): number of HNSW neighbors per node.
+        ef_construction (int): HNSW candidate list size while adding.
+        ef_search (int): default HNSW candidate list size per query.
+
+    """
+    import faiss
+
+    index_type = FaissIndexType(index_build)
+    if index_type == FaissIndexType.FLAT_L2:
+        return faiss.IndexFlatL2(embedding_dim)
+    if index_type == FaissIndexType.FLAT_IP:
+        return faiss.IndexFlatIP(embedding_dim)
+
+    if metric == "l2":
+        metric_type = faiss.METRIC_L2
+    elif metric == "ip":
+        metric_type = faiss.METRIC_INNER_PRODUCT
+    else:
+        raise ValueError(f"Unsupported faiss metric: {metric}, use l2 or ip.")
+
+    if index_type == FaissIndexType.IVF:
+        factory_str = f"IVF{nlist},Flat"
+    elif index_type == FaissIndexType.IVF_PQ:
+        factory_str = f"IVF{nlist},PQ{pq_m}x{pq_nbits}"
+    elif index_type == FaissIndexType.OPQ_IVF_PQ:
+        factory_str = f"OPQ{pq_m},IVF{nlist},PQ{pq_m}x{pq_nbits}"
+    else:
+        factory_str = f"HNSW{hnsw_m}"
+    faiss_index = faiss.index_factory(embedding_dim, factory_str, metric_type)
+
+    search_index, _ = _unwrap_index(faiss_index)
+    if isinstance(search_index, faiss.IndexIVF):
+        search_index.nprobe = nprobe
+    else:
+        search_index.hnsw.efConstruction = ef_construction
+        search_index.hnsw.efSearch = ef_search
+    return faiss_index
+
+
+def _unwrap_index(faiss_index: Any) -> Tuple[Any, bool]:
+    """Get the searching index under IDMap / PreTransform wrappers.
+
+    Returns:
+        The inner index and whether it sits under an IndexPreTransform.
+
+    """
+    import faiss
+
+    index = faiss.downcast_index(faiss_index)
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    is_pretransform = isinstance(index, faiss.IndexPreTransform)
+    if is_pretransform:
+        index = faiss.downcast_index(index.index)
+    return index, is_pretransform
+
+
+def _supports_remove_ids(faiss_index: Any) -> bool:
+    """Whether vectors can be removed from an index, graph indexes can't."""
+    import faiss
+
+    search_index, _ = _unwrap_index(faiss_index)
+    return not isinstance(search_index, (faiss.IndexHNSW, faiss.IndexNSG))
+
+
+def _id_map_path(persist_path: str) -> str:
+    """Get the id map sidecar path for a faiss index persist path."""
+    base, _ = os.path.splitext(persist_path)
+    return f"{base}.idmap.json"
+
+
+class MetadataColumnStore:
+    """Inverted metadata columns over int64 faiss ids.
+
+    Each metadata key is a column mapping a value to the set of ids having
+    it, so exact match filters resolve to an id set without touching the
+    vectors. List values index each of their items, matching the list
+    membership semantics of SimpleVectorStore filters.
+
+    """
+
+    def __init__(self) -> None:
+        """Init params."""
+        self._columns: Dict[str, Dict[Hashable, Set[int]]] = {}
+        # (key, value) cells of each id, to unindex it on delete
+        self._cells: Dict[int, List[Tuple[str, Hashable]]] = {}
+
+    def add(self, faiss_id: int, metadata: Dict[str, Any]) -> None:
+        """Index the metadata of an id."""
+        cells = []
+        for key, value in metadata.items():
+            values = value if isinstance(value, list) else [value]
+            for item in values:
+                if isinstance(item, (str, int, float, bool)):
+                    self._columns.setdefault(key, {}).setdefault(item, set()).add(
+                        faiss_id
+                    )
+                    cells.append((key, item))
+        self._cells[faiss_id] = cells
+
+    def delete(self, faiss_id: int) -> None:
+        """Unindex an id."""
+        for key, value in self._cells.pop(faiss_id, []):
+            column = self._columns[key]
+            column[value].discard(faiss_id)
+            if not column[value]:
+                del column[value]
+            if not column:
+                del self._columns[key]
+
+    def select(self, metadata_filters: MetadataFilters) -> Set[int]:
+        """Get ids matching all filters."""
+        selected: Optional[Set[int]] = None
+        for filter_ in metadata_filters.filters:
+            ids = self._columns.get(filter_.key, {}).get(filter_.value, set())
+            selected = set(ids) if selected is None else selected & ids
+            if not selected:
+                return set()
+        return selected if selected is not None else set(self._cells)
+
+    def to_dict(self) -> Dict[str, List[Tuple[Any, List[int]]]]:
+        """Column-wise export: key -> [(value, ids), ...]."""
+        return {
+            key: [(value, sorted(ids)) for value, ids in column.items()]
+            for key, column in self._columns.items()
+        }
+
+    @classmethod
+    def from_dict(
+        cls, columns: Dict[str, List[Tuple[Any, List[int]]]], ids: Iterable[int]
+    ) -> "MetadataColumnStore":
+        store = cls()
+        store._cells = {faiss_id: [] for faiss_id in ids}
+        for key, column in columns.items():
+            for value, value_ids in column:
+                store._columns.setdefault(key, {})[value] = set(value_ids)
+                for faiss_id in value_ids:
+                    store._cells[faiss_id].append((key, value))
+        return store
+
 
 class FaissVectorStore(VectorStore):
     """Faiss Vector Store.
 
     Embeddings are stored within a Faiss index.
 
-    During query time, the index uses Faiss to query for the top
-    k embeddings, and returns the corresponding indices.
+    An empty index is wrapped in a `faiss.IndexIDMap2` (IVF indexes store ids
+    themselves and are used as is), so every node gets a stable int64 id. The
+    store keeps the node_id <-> int64 map and a metadata column store next to
+    the index, which gives:
+    - query results identified by node_id, unaffected by deletions,
+    - `delete` by ref_doc_id through `remove_ids`. Graph indexes (HNSW) can't
+      remove vectors: their deleted ids are masked at search time instead and
+      keep their memory until the index is rebuilt,
+    - metadata / node_id / doc_id filtering resolved to an id selector
+      before the search, so faiss only scores matching vectors.
+
+    Indexes that already hold vectors without an id map (e.g. persisted by an
+    older version) keep positional ids and do not support delete or metadata
+    filters.
+
+    Untrained indexes (IVF, PQ, see `create_faiss_index`) buffer the added
+    embeddings until train_sample_size of them arrived, so training sees more
+    than the first insert batch, then are trained on them. A query, `persist`
+    or `client` trains the index on the buffered embeddings earlier, faiss
+    wants about 39 training embeddings per IVF list. `VectorStoreQuery.nprobe`
+    and
+    `VectorStoreQuery.ef_search` override the IVF / HNSW search defaults per
+    query.
 
     Args:
         faiss_index (faiss.Index): Faiss index instance
+        id_map (Optional[dict]): persisted node_id <-> int64 id map, see
+            `from_persist_path`.
+        train_sample_size (int): number of embeddings buffered before training
+            an untrained index, and max number of embeddings it is trained on.
 
     """
 
@@ -52,6 +271,8 @@ class FaissVectorStore(VectorStore):
     def __init__(
         self,
         faiss_index: Any,
+        id_map: Optional[Dict[str, Any]] = None,
+        train_sample_size: int = DEFAULT_TRAIN_SAMPLE_SIZE,
     ) -> None:
         """Initialize params."""
         import_err_msg = """
@@ -64,7 +285,39 @@ class FaissVectorStore(VectorStore):
         except ImportError:
             raise ImportError(import_err_msg)
 
+        # positional ids are only kept for populated indexes without an id map
+        self._legacy_ids = False
+        search_index, _ = _unwrap_index(faiss_index)
+        if not isinstance(faiss_index, faiss.IndexIDMap) and not isinstance(
+            search_index, faiss.IndexIVF
+        ):
+            if faiss_index.ntotal == 0:
+                faiss_index = faiss.IndexIDMap2(faiss_index)
+            else:
+                logger.warning(
+                    "Faiss index already holds vectors without an id map, "
+                    "falling back to positional ids: delete and metadata "
+                    "filters are not supported."
+                )
+                self._legacy_ids = True
+
         self._faiss_index = cast(faiss.Index, faiss_index)
+        self._train_sample_size = train_sample_size
+        self._supports_remove_ids = _supports_remove_ids(faiss_index)
+
+        self._next_id = 0
+        self._node_id_to_faiss_id: Dict[str, int] = {}
+        self._faiss_id_to_node_id: Dict[int, str] = {}
+        self._ref_doc_id_to_faiss_ids: Dict[str, Set[int]] = {}
+        self._faiss_id_to_ref_doc_id: Dict[int, str] = {}
+        self._metadata_columns = MetadataColumnStore()
+        # ids deleted from indexes without remove_ids, masked at search time
+        self._deleted_faiss_ids: Set[int] = set()
+        # embeddings and ids added before the index is trained
+        self._pending_embeddings: List[np.ndarray] = []
+        self._pending_faiss_ids: List[np.ndarray] = []
+        if id_map is not None:
+            self._load_id_map(id_map)
 
         super().__init__()
 
@@ -101,7 +354,45 @@ class FaissVectorStore(VectorStore):
 
         logger.info(f"Loading {__name__} from {persist_path}.")
         faiss_index = faiss.read_index(persist_path)
-        return cls(faiss_index=faiss_index)
+
+        id_map = None
+        id_map_path = _id_map_path(persist_path)
+        if os.path.exists(id_map_path):
+            with open(id_map_path) as f:
+                id_map = json.load(f)
+        return cls(faiss_index=faiss_index, id_map=id_map)
+
+    def _load_id_map(self, id_map: Dict[str, Any]) -> None:
+        """Restore ids and metadata columns from a persisted id map."""
+        version = id_map.get("version")
+        if version != ID_MAP_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported faiss id map version {version}, "
+                f"expected {ID_MAP_FORMAT_VERSION}."
+            )
+        faiss_ids = id_map["faiss_ids"]
+        self._next_id = id_map["next_id"]
+        self._faiss_id_to_node_id = dict(zip(faiss_ids, id_map["node_ids"]))
+        self._node_id_to_faiss_id = dict(zip(id_map["node_ids"], faiss_ids))
+        self._faiss_id_to_ref_doc_id = dict(zip(faiss_ids, id_map["ref_doc_ids"]))
+        for faiss_id, ref_doc_id in self._faiss_id_to_ref_doc_id.items():
+            self._ref_doc_id_to_faiss_ids.setdefault(ref_doc_id, set()).add(faiss_id)
+        self._metadata_columns = MetadataColumnStore.from_dict(
+            id_map["metadata_columns"], faiss_ids
+        )
+        self._deleted_faiss_ids = set(id_map.get("deleted_faiss_ids", []))
+
+    def _id_map_to_dict(self) -> Dict[str, Any]:
+        faiss_ids = list(self._faiss_id_to_node_id.keys())
+        return {
+            "version": ID_MAP_FORMAT_VERSION,
+            "next_id": self._next_id,
+            "faiss_ids": faiss_ids,
+            "node_ids": [self._faiss_id_to_node_id[i] for i in faiss_ids],
+            "ref_doc_ids": [self._faiss_id_to_ref_doc_id[i] for i in faiss_ids],
+            "metadata_columns": self._metadata_columns.to_dict(),
+            "deleted_faiss_ids": sorted(self._deleted_faiss_ids),
+        }
 
     def add(
         self,
@@ -116,18 +407,85 @@ class FaissVectorStore(VectorStore):
             nodes: List[BaseNode]: list of nodes with embeddings
 
         """
-        new_ids = []
-        for node in nodes:
-            text_embedding = node.get_embedding()
-            text_embedding_np = np.array(text_embedding, dtype="float32")[np.newaxis, :]
-            new_id = str(self._faiss_index.ntotal)
-            self._faiss_index.add(text_embedding_np)
-            new_ids.append(new_id)
-        return new_ids
+        if not nodes:
+            return []
+
+        # stack the whole batch so faiss is called once, not once per node
+        text_embeddings_np = np.ascontiguousarray(
+            [node.get_embedding() for node in nodes], dtype="float32"
+        )
+        if self._legacy_ids:
+            start_id = self._faiss_index.ntotal
+            self._faiss_index.add(text_embeddings_np)
+            return [str(start_id + i) for i in range(len(nodes))]
+
+        # re-added nodes replace their previous vector
+        self._remove_faiss_ids(
+            [
+                self._node_id_to_faiss_id[node.node_id]
+                for node in nodes
+                if node.node_id in self._node_id_to_faiss_id
+            ]
+        )
+
+        faiss_ids = np.arange(
+            self._next_id, self._next_id + len(nodes), dtype="int64"
+        )
+        if self._faiss_index.is_trained:
+            self._faiss_index.add_with_ids(text_embeddings_np, faiss_ids)
+        else:
+            self._pending_embeddings.append(text_embeddings_np)
+            self._pending_faiss_ids.append(faiss_ids)
+            if self._num_pending >= self._train_sample_size:
+                self._train_pending()
+        self._next_id += len(nodes)
+
+        for faiss_id, node in zip(faiss_ids.tolist(), nodes):
+            ref_doc_id = node.ref_doc_id or "None"
+            self._node_id_to_faiss_id[node.node_id] = faiss_id
+            self._faiss_id_to_node_id[faiss_id] = node.node_id
+            self._faiss_id_to_ref_doc_id[faiss_id] = ref_doc_id
+            self._ref_doc_id_to_faiss_ids.setdefault(ref_doc_id, set()).add(faiss_id)
+            self._metadata_columns.add(faiss_id, node.metadata)
+        return [node.node_id for node in nodes]
+
+    @property
+    def _num_pending(self) -> int:
+        return sum(len(faiss_ids) for faiss_ids in self._pending_faiss_ids)
+
+    def _train_pending(self) -> None:
+        """Train the index on the buffered embeddings, then add them."""
+        if not self._pending_faiss_ids:
+            return
+        embeddings = np.concatenate(self._pending_embeddings)
+        faiss_ids = np.concatenate(self._pending_faiss_ids)
+        self._train(embeddings)
+        self._faiss_index.add_with_ids(embeddings, faiss_ids)
+        self._pending_embeddings = []
+        self._pending_faiss_ids = []
+
+    def _train(self, embeddings: np.ndarray) -> None:
+        """Train the index on a sample of the given embeddings."""
+        if len(embeddings) > self._train_sample_size:
+            rng = np.random.default_rng(seed=0)
+            sample_rows = rng.choice(
+                len(embeddings), self._train_sample_size, replace=False
+            )
+            embeddings = embeddings[np.sort(sample_rows)]
+
+        logger.info(f"Training faiss index on {len(embeddings)} embeddings.")
+        try:
+            self._faiss_index.train(embeddings)
+        except RuntimeError as e:
+            raise ValueError(
+                f"Failed to train the faiss index on {len(embeddings)} "
+                f"embeddings, add more embeddings or lower nlist / pq_nbits: {e}"
+            ) from e
 
     @property
     def client(self) -> Any:
-        """Return the faiss index."""
+        """Return the faiss index, trained on the buffered embeddings."""
+        self._train_pending()
         return self._faiss_index
 
     def persist(
@@ -137,7 +495,8 @@ class FaissVectorStore(VectorStore):
     ) -> None:
         """Save to file.
 
-        This method saves the vector store to disk.
+        This method saves the vector store to disk. The node_id <-> int64 id
+        map and the metadata columns are written to a json sidecar next to it.
 
         Args:
             persist_path (str): The save_path of the file.
@@ -149,6 +508,7 @@ class FaissVectorStore(VectorStore):
             raise NotImplementedError("FAISS only supports local storage for now.")
         import faiss
 
+        self._train_pending()
         dirpath = os.path.dirname(persist_path)
         if not os.path.exists(dirpath):
             os.makedirs(dirpath)
@@ -159,6 +519,34 @@ class FaissVectorStore(VectorStore):
             index_cpu = faiss.index_gpu_to_cpu(self._faiss_index)
             faiss.write_index(index_cpu, persist_path)
 
+        if not self._legacy_ids:
+            with open(_id_map_path(persist_path), "w") as f:
+                json.dump(self._id_map_to_dict(), f)
+
+    def _remove_faiss_ids(self, faiss_ids: List[int]) -> None:
+        """Remove vectors and their id map / metadata entries."""
+        if not faiss_ids:
+            return
+        if self._pending_faiss_ids:
+            removed = np.array(faiss_ids, dtype="int64")
+            for i, pending_ids in enumerate(self._pending_faiss_ids):
+                keep = ~np.isin(pending_ids, removed)
+                self._pending_faiss_ids[i] = pending_ids[keep]
+                self._pending_embeddings[i] = self._pending_embeddings[i][keep]
+        if self._supports_remove_ids:
+            self._faiss_index.remove_ids(np.array(faiss_ids, dtype="int64"))
+        else:
+            self._deleted_faiss_ids.update(faiss_ids)
+        for faiss_id in faiss_ids:
+            node_id = self._faiss_id_to_node_id.pop(faiss_id)
+            del self._node_id_to_faiss_id[node_id]
+            ref_doc_id = self._faiss_id_to_ref_doc_id.pop(faiss_id)
+            ref_doc_faiss_ids = self._ref_doc_id_to_faiss_ids[ref_doc_id]
+            ref_doc_faiss_ids.discard(faiss_id)
+            if not ref_doc_faiss_ids:
+                del self._ref_doc_id_to_faiss_ids[ref_doc_id]
+            self._metadata_columns.delete(faiss_id)
+
     def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
         """
         Delete nodes using with ref_doc_id.
@@ -167,7 +555,106 @@ class FaissVectorStore(VectorStore):
             ref_doc_id (str): The doc_id of the document to delete.
 
         """
-        raise NotImplementedError("Delete not yet implemented for Faiss index.")
+        if self._legacy_ids:
+            raise NotImplementedError(
+                "Delete not supported for Faiss indexes without an id map, "
+                "please rebuild the index."
+            )
+        self._remove_faiss_ids(list(self._ref_doc_id_to_faiss_ids.get(ref_doc_id, ())))
+
+    def _select_faiss_ids(self, query: VectorStoreQuery) -> Optional[Set[int]]:
+        """Resolve query restrictions to faiss ids, None if unrestricted."""
+        if self._legacy_ids:
+            if query.filters is not None or query.doc_ids is not None:
+                raise ValueError(
+                    "Metadata filters not supported for Faiss indexes without "
+                    "an id map, please rebuild the index."
+                )
+            if query.node_ids is None:
+                return None
+            return {int(node_id) for node_id in query.node_ids}
+
+        selected: Optional[Set[int]] = None
+        if query.node_ids is not None:
+            selected = {
+                self._node_id_to_faiss_id[node_id]
+                for node_id in query.node_ids
+                if node_id in self._node_id_to_faiss_id
+            }
+        if query.doc_ids is not None:
+            doc_faiss_ids: Set[int] = set()
+            for doc_id in query.doc_ids:
+                doc_faiss_ids |= self._ref_doc_id_to_faiss_ids.get(doc_id, set())
+            selected = doc_faiss_ids if selected is None else selected & doc_faiss_ids
+        if query.filters is not None:
+            filter_faiss_ids = self._metadata_columns.select(query.filters)
+            selected = (
+                filter_faiss_ids if selected is None else selected & filter_faiss_ids
+            )
+        return selected
+
+    def _search(
+        self,
+        query_embeddings_np: np.ndarray,
+        similarity_top_k: int,
+        faiss_ids: Optional[Set[int]] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Search the index.
+
+        Restricts the search to faiss_ids through an id selector, and applies
+        nprobe / ef_search through search parameters, leaving the index
+        defaults untouched for other queries. Without faiss_ids, the ids
+        deleted from an index without remove_ids are excluded instead.
+
+        """
+        deleted_faiss_ids = self._deleted_faiss_ids if faiss_ids is None else None
+        if (
+            faiss_ids is None
+            and not deleted_faiss_ids
+            and nprobe is None
+            and ef_search is None
+        ):
+            return self._faiss_index.search(query_embeddings_np, similarity_top_k)
+
+        import faiss
+
+        id_selector = None
+        if faiss_ids is not None:
+            # the selected ids come from the id map, which only has live ids
+            id_selector = faiss.IDSelectorBatch(
+                np.fromiter(faiss_ids, dtype="int64", count=len(faiss_ids))
+            )
+        elif deleted_faiss_ids:
+            deleted_selector = faiss.IDSelectorBatch(
+                np.fromiter(
+                    deleted_faiss_ids, dtype="int64", count=len(deleted_faiss_ids)
+                )
+            )
+            id_selector = faiss.IDSelectorNot(deleted_selector)
+
+        search_index, is_pretransform = _unwrap_index(self._faiss_index)
+        if isinstance(search_index, faiss.IndexIVF):
+            index_params = faiss.SearchParametersIVF(
+                sel=id_selector, nprobe=nprobe or search_index.nprobe
+            )
+        elif isinstance(search_index, faiss.IndexHNSW):
+            index_params = faiss.SearchParametersHNSW(
+                sel=id_selector, efSearch=ef_search or search_index.hnsw.efSearch
+            )
+        else:
+            index_params = faiss.SearchParameters(sel=id_selector)
+
+        search_params = index_params
+        if is_pretransform:
+            # the pre transform forwards its index_params to the inner index
+            search_params = faiss.SearchParametersPreTransform(
+                index_params=index_params
+            )
+        return self._faiss_index.search(
+            query_embeddings_np, similarity_top_k, params=search_params
+        )
 
     def query(
         self,
@@ -179,32 +666,87 @@ class FaissVectorStore(VectorStore):
         Args:
             query_embedding (List[float]): query embedding
             similarity_top_k (int): top k most similar nodes
+            node_ids / doc_ids / filters: restrict the search, resolved to an
+                id selector before searching
+            nprobe / ef_search: IVF / HNSW search knobs for this query
 
         """
-        if query.filters is not None:
-            raise ValueError("Metadata filters not implemented for Faiss yet.")
+        self._train_pending()
+        faiss_ids = self._select_faiss_ids(query)
+        if faiss_ids is not None and len(faiss_ids) == 0:
+            return VectorStoreQueryResult(similarities=[], ids=[])
 
         query_embedding = cast(List[float], query.query_embedding)
         query_embedding_np = np.array(query_embedding, dtype="float32")[np.newaxis, :]
-        dists, indices = self._faiss_index.search(
-            query_embedding_np, query.similarity_top_k
+        dists, indices = self._search(
+            query_embedding_np,
+            query.similarity_top_k,
+            faiss_ids,
+            nprobe=query.nprobe,
+            ef_search=query.ef_search,
         )
-        dists = list(dists[0])
         # if empty, then return an empty response
         if len(indices) == 0:
             return VectorStoreQueryResult(similarities=[], ids=[])
 
         # returned dimension is 1 x k
-        node_idxs = indices[0]
+        return self._to_query_result(dists[0], indices[0])
 
+    def batch_query(
+        self,
+        queries: List[VectorStoreQuery],
+        **kwargs: Any,
+    ) -> List[VectorStoreQueryResult]:
+        """Query index for many queries with a single faiss search.
+
+        Unrestricted queries sharing the same nprobe / ef_search are searched
+        together with the largest `similarity_top_k` among them, then each
+        result is cut to its own top k. Queries with filters, node_ids or
+        doc_ids are searched one by one.
+
+        """
+        self._train_pending()
+        results: List[Optional[VectorStoreQueryResult]] = [None] * len(queries)
+        batches: Dict[Tuple[Optional[int], Optional[int]], List[int]] = {}
+        for idx, query in enumerate(queries):
+            if query.filters is None and query.node_ids is None and query.doc_ids is None:
+                batches.setdefault((query.nprobe, query.ef_search), []).append(idx)
+            else:
+                results[idx] = self.query(query, **kwargs)
+
+        for (nprobe, ef_search), batch_idxs in batches.items():
+            query_embeddings_np = np.array(
+                [queries[idx].query_embedding for idx in batch_idxs], dtype="float32"
+            )
+            top_k = max(queries[idx].similarity_top_k for idx in batch_idxs)
+            dists, indices = self._search(
+                query_embeddings_np, top_k, nprobe=nprobe, ef_search=ef_search
+            )
+
+            # returned dimension is num_queries x k
+            for i, idx in enumerate(batch_idxs):
+                query_top_k = queries[idx].similarity_top_k
+                results[idx] = self._to_query_result(
+                    dists[i][:query_top_k], indices[i][:query_top_k]
+                )
+
+        return cast(List[VectorStoreQueryResult], results)
+
+    def _to_query_result(
+        self, dists: np.ndarray, faiss_ids: np.ndarray
+    ) -> VectorStoreQueryResult:
+        """Convert one row of faiss search output, dropping missing (-1) hits."""
         filtered_dists = []
-        filtered_node_idxs = []
-        for dist, idx in zip(dists, node_idxs):
-            if idx < 0:
+        filtered_node_ids = []
+        for dist, faiss_id in zip(dists, faiss_ids):
+            if faiss_id < 0:
                 continue
             filtered_dists.append(dist)
-            filtered_node_idxs.append(str(idx))
+            if self._legacy_ids:
+                filtered_node_ids.append(str(faiss_id))
+            else:
+                filtered_node_ids.append(self._faiss_id_to_node_id[int(faiss_id)])
 
         return VectorStoreQueryResult(
-            similarities=filtered_dists, ids=filtered_node_idxs
-        )
\ No newline at end of file
+            similarities=filtered_dists, ids=filtered_node_ids
+        )
@@ -3,10 +3,22 @@
 An index that is built within Milvus.
 
 """
+import asyncio
+import contextvars
 import logging
-from typing import Any, List, Dict, Optional, Union, TYPE_CHECKING
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import partial
+from typing import (
+    Any, Callable, List, Dict, Iterator, Optional, Tuple, TypeVar, Union, cast,
+    TYPE_CHECKING
+)
 from omegaconf import OmegaConf, DictConfig
 
+from rag.callbacks import CallbackManager, CBEventType, EventPayload
+
 from .types import (
     MetadataFilters,
     VectorStoreQuery,
@@ -34,6 +46,11 @@ logger = logging.getLogger(__name__)
 
 MILVUS_ID_FIELD = "id"
 
+T = TypeVar("T")
+
+# max payload of an insert rpc, below the 64MB default grpc message limit of Milvus
+DEFAULT_MAX_INSERT_BYTES = 32 * 1024 * 1024
+
 
 def _to_milvus_filter(standard_filters: MetadataFilters) -> List[str]:
     """Translate standard metadata filters to Milvus specific spec."""
@@ -46,6 +63,41 @@ def _to_milvus_filter(standard_filters: MetadataFilters) -> List[str]:
     return filters
 
 
+def _node_to_entry(node: BaseNode, embedding_field: str) -> Tuple[Dict[str, Any], int]:
+    """Serialize a node to a Milvus row and estimate its size on the wire."""
+    entry = node_to_metadata_dict(node)
+    entry[MILVUS_ID_FIELD] = node.node_id
+    entry[embedding_field] = node.embedding
+
+    num_bytes = 0
+    for key, value in entry.items():
+        num_bytes += len(key)
+        if key == embedding_field:
+            # sent as float32
+            num_bytes += 4 * len(value)
+        elif isinstance(value, str):
+            num_bytes += len(value.encode("utf-8"))
+        else:
+            num_bytes += 8
+    return entry, num_bytes
+
+
+def _split_by_bytes(
+    entries: List[Tuple[Dict[str, Any], int]], max_bytes: int
+) -> Iterator[Tuple[List[Dict[str, Any]], int]]:
+    """Split rows into chunks of at most max_bytes, a larger row goes alone."""
+    chunk: List[Dict[str, Any]] = []
+    chunk_bytes = 0
+    for entry, num_bytes in entries:
+        if chunk and chunk_bytes + num_bytes > max_bytes:
+            yield chunk, chunk_bytes
+            chunk, chunk_bytes = [], 0
+        chunk.append(entry)
+        chunk_bytes += num_bytes
+    if chunk:
+        yield chunk, chunk_bytes
+
+
 class MilvusVectorStore(VectorStore):
     """The Milvus Vector Store.
 
@@ -76,6 +128,25 @@ class MilvusVectorStore(VectorStore):
             name. Defaults to False.
         text_key (str, optional): What key text is stored in in the passed collection.
             Used when bringing your own collection. Defaults to None.
+        insert_batch_size (int, optional): Number of entities buffered before they
+            are inserted, in deferred index mode. Defaults to 2048.
+        deferred_index (bool, optional): Start in deferred index mode, i.e. a bulk
+            load: inserts are buffered and the index of an empty collection is only
+            built by `finalize()`.
+            Defaults to False, see also `bulk_load()`.
+        max_insert_bytes (int, optional): Max estimated payload of one insert rpc,
+            rows are split into chunks below it. Defaults to 32MB.
+        max_concurrent_inserts (int, optional): Number of insert rpcs in flight at
+            once. Defaults to 4.
+        callback_manager (CallbackManager, optional): Receives an INSERT event
+            per insert rpc with the progress and throughput of the load.
+        max_async_workers (int, optional): Number of threads running the async
+            methods, sharing this store's connection. Bounds the number of
+            concurrent `aquery` / `async_add` / `adelete` calls. Defaults to 8.
+
+    Outside of deferred index mode, inserted entities go to growing segments
+    which Milvus searches and indexes on its own once sealed, so the index is
+    built once and never rebuilt on insert.
 
     Raises:
         ImportError: Unable to import `pymilvus`.
@@ -105,6 +176,12 @@ class MilvusVectorStore(VectorStore):
         overwrite: bool = False,
         search_params: Optional[Dict[str, Union[str, dict]]] = None, 
         index_params: Optional[Dict[str, Union[str, dict]]] = None, 
+        insert_batch_size: int = 2048,
+        deferred_index: bool = False,
+        max_insert_bytes: int = DEFAULT_MAX_INSERT_BYTES,
+        max_concurrent_inserts: int = 4,
+        callback_manager: Optional[CallbackManager] = None,
+        max_async_workers: int = 8,
         **kwargs,
     ) -> None:
         """Init config."""
@@ -132,6 +209,16 @@ class MilvusVectorStore(VectorStore):
         self.overwrite = overwrite
         self.search_params = search_params
         self.index_params = index_params
+        self.insert_batch_size = insert_batch_size
+        self._deferred_index = deferred_index
+        self._insert_buffer: List[Tuple[Dict[str, Any], int]] = []
+        # async_add may add from several threads at once
+        self._insert_buffer_lock = threading.Lock()
+        self.max_insert_bytes = max_insert_bytes
+        self.max_concurrent_inserts = max_concurrent_inserts
+        self.callback_manager = callback_manager or CallbackManager([])
+        self.max_async_workers = max_async_workers
+        self._async_executor: Optional[ThreadPoolExecutor] = None
 
         # resolve config when passing DictConfig of omega to Milvus
         if isinstance(search_params, DictConfig):
@@ -153,7 +240,8 @@ class MilvusVectorStore(VectorStore):
             logger.debug(f"Successfully drop old collection: {self.collection_name}")
 
         # Create the collection if it does not exist
-        if self.collection_name not in self.milvusclient.list_collections():
+        created = self.collection_name not in self.milvusclient.list_collections()
+        if created:
             if self.dim is None:
                 raise ValueError("Dim argument required for collection creation.")
             self.milvusclient.create_collection(
@@ -170,7 +258,11 @@ class MilvusVectorStore(VectorStore):
         self.collection = Collection(
             self.collection_name, using=self.milvusclient._using
         )
-        self._create_index_if_required()
+        if self._deferred_index:
+            self._begin_deferred_index()
+        else:
+            # replace the default index of a new collection by index_params
+            self._create_index_if_required(force=created)
         logger.debug(f"Successfully load collection: {self.collection_name}")
 
     
@@ -187,6 +279,12 @@ class MilvusVectorStore(VectorStore):
     def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
         """Add the embeddings and their nodes into Milvus.
 
+        Nodes are serialized into rows, split into
+        chunks of at most `max_insert_bytes` and inserted with up to
+        `max_concurrent_inserts` rpcs in flight. In deferred index mode the
+        entities are buffered and inserted by batches of `insert_batch_size`,
+        see `finalize()`.
+
         Args:
             nodes (List[BaseNode]): List of nodes with embeddings
                 to insert.
@@ -197,26 +295,132 @@ class MilvusVectorStore(VectorStore):
         Returns:
             List[str]: List of ids inserted.
         """
-        insert_list: List[Any] = []
-        insert_ids: List[Any] = []
+        insert_ids = [node.node_id for node in nodes]
 
         # Process that data we are going to insert
-        for node in nodes:
-            entry = node_to_metadata_dict(node)
-            entry[MILVUS_ID_FIELD] = node.node_id
-            entry[self.embedding_field] = node.embedding
+        entries = [_node_to_entry(node, self.embedding_field) for node in nodes]
 
-            insert_ids.append(node.node_id)
-            insert_list.append(entry)
+        if self._deferred_index:
+            with self._insert_buffer_lock:
+                self._insert_buffer.extend(entries)
+                if len(self._insert_buffer) < self.insert_batch_size:
+                    return insert_ids
+                entries, self._insert_buffer = self._insert_buffer, []
 
         # Insert the data into milvus
-        self.milvusclient.insert(self.collection_name, insert_list)
-        self._create_index_if_required(force=True)
-        print(
+        self._insert_entries(entries)
+        return insert_ids
+
+    def _insert_entries(self, entries: List[Tuple[Dict[str, Any], int]]) -> None:
+        """Insert rows by byte-bounded chunks, several rpcs in flight at once.
+
+        Each chunk is reported as an INSERT event carrying its own rows, bytes
+        and throughput, and the progress of the whole call.
+        """
+        if not entries:
+            return
+        chunks = list(_split_by_bytes(entries, self.max_insert_bytes))
+        total_rows = len(entries)
+        inserted_rows = 0
+        start_time = time.perf_counter()
+
+        def _insert(chunk: List[Dict[str, Any]]) -> float:
+            chunk_start_time = time.perf_counter()
+            self.milvusclient.insert(self.collection_name, chunk)
+            return time.perf_counter() - chunk_start_time
+
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(self.max_concurrent_inserts, len(chunks)))
+        ) as executor:
+            futures = {}
+            for chunk, chunk_bytes in chunks:
+                # events are sent from this thread, handlers need not be thread safe
+                event_id = self.callback_manager.on_event_start(
+                    CBEventType.INSERT,
+                    payload={
+                        EventPayload.INSERT_STATS: {
+                            "rows": len(chunk),
+                            "bytes": chunk_bytes,
+                        }
+                    },
+                )
+                futures[executor.submit(_insert, chunk)] = (
+                    len(chunk),
+                    chunk_bytes,
+                    event_id,
+                )
+            for future in as_completed(futures):
+                num_rows, chunk_bytes, event_id = futures[future]
+                seconds = future.result()
+                inserted_rows += num_rows
+                self.callback_manager.on_event_end(
+                    CBEventType.INSERT,
+                    payload={
+                        EventPayload.INSERT_STATS: {
+                            "rows": num_rows,
+                            "bytes": chunk_bytes,
+                            "seconds": seconds,
+                            "rows_per_second": num_rows / seconds if seconds else None,
+                            "inserted_rows": inserted_rows,
+                            "total_rows": total_rows,
+                        }
+                    },
+                    event_id=event_id,
+                )
+
+        seconds = time.perf_counter() - start_time
+        logger.debug(
             f"Successfully inserted embeddings into: {self.collection_name} "
-            f"Num Inserted: {len(insert_list)}"
+            f"Num Inserted: {total_rows} Num Rpcs: {len(chunks)} "
+            f"Rows/s: {total_rows / seconds:.1f}"
         )
-        return insert_ids
+
+    def _flush_insert_buffer(self) -> None:
+        """Insert the buffered entities."""
+        with self._insert_buffer_lock:
+            entries, self._insert_buffer = self._insert_buffer, []
+        self._insert_entries(entries)
+
+    async def async_add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        """Asynchronously add the embeddings and their nodes into Milvus.
+
+        Runs `add` in the async worker threads, see `max_async_workers`.
+        """
+        return await self._run_async(self.add, nodes, **add_kwargs)
+
+    def finalize(self) -> None:
+        """End a bulk load started in deferred index mode.
+
+        Inserts the buffered entities, flushes the collection so they are
+        sealed, then builds the index once over all of them and loads the
+        collection. Following adds are inserted directly.
+        """
+        if not self._deferred_index:
+            return
+        self._flush_insert_buffer()
+        self.collection.flush()
+        self._create_index_if_required()
+        self._deferred_index = False
+        logger.debug(f"Successfully finalized bulk load into: {self.collection_name}")
+
+    @contextmanager
+    def bulk_load(self) -> Iterator["MilvusVectorStore"]:
+        """Defer indexing for the adds made within the context.
+
+        Adds are buffered and `finalize()` indexes and loads the collection on
+        exit. An empty collection is indexed once at the end, a populated one
+        keeps its index and stays searchable during the load.
+
+        Example:
+            with vector_store.bulk_load():
+                index = VectorStoreIndex(nodes, storage_context=storage_context)
+        """
+        if not self._deferred_index:
+            self._begin_deferred_index()
+        try:
+            yield self
+        finally:
+            self.finalize()
 
     def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
         """
@@ -245,6 +449,10 @@ class MilvusVectorStore(VectorStore):
         self.milvusclient.delete(collection_name=self.collection_name, pks=ids)
         logger.debug(f"Successfully deleted embedding with doc_id: {doc_ids}")
 
+    async def adelete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        """Asynchronously delete nodes using with ref_doc_id."""
+        await self._run_async(self.delete, ref_doc_id, **delete_kwargs)
+
     def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
         """Query index for top k most similar nodes.
 
@@ -256,6 +464,87 @@ class MilvusVectorStore(VectorStore):
             output_fields (Optional[List[str]]): list of fields to return
             embedding_field (Optional[str]): name of embedding field
         """
+        string_expr, output_fields = self._parse_query(query)
+
+        # Perform the search
+        res = self.milvusclient.search(
+            collection_name=self.collection_name,
+            data=[query.query_embedding],
+            filter=string_expr,
+            limit=query.similarity_top_k,
+            output_fields=output_fields,
+            search_config=self.search_params,
+        )
+
+        logger.debug(
+            f"Successfully searched embedding in collection: {self.collection_name}"
+            f" Num Results: {len(res[0])}"
+        )
+
+        return self._hits_to_query_result(res[0])
+
+    async def aquery(
+        self, query: VectorStoreQuery, **kwargs: Any
+    ) -> VectorStoreQueryResult:
+        """Asynchronously query index for top k most similar nodes.
+
+        The search runs in the async worker threads, so the event loop keeps
+        serving other coroutines and concurrent queries overlap their network
+        waits, up to `max_async_workers` at once.
+        """
+        return await self._run_async(self.query, query, **kwargs)
+
+    async def _run_async(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run a blocking call in the async worker threads."""
+        if self._async_executor is None:
+            self._async_executor = ThreadPoolExecutor(
+                max_workers=self.max_async_workers,
+                thread_name_prefix="milvus-async",
+            )
+        # keep the callback trace of the calling task in the worker thread
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._async_executor, partial(context.run, func, *args, **kwargs)
+        )
+
+    def batch_query(
+        self, queries: List[VectorStoreQuery], **kwargs: Any
+    ) -> List[VectorStoreQueryResult]:
+        """Query index for many queries with as few searches as possible.
+
+        Queries sharing the same filter expression and output fields are sent
+        together in one `search(data=[...])` call, using the largest
+        `similarity_top_k` of the group as limit.
+        """
+        groups: Dict[Tuple[str, Tuple[str, ...]], List[int]] = {}
+        for idx, query in enumerate(queries):
+            string_expr, output_fields = self._parse_query(query)
+            groups.setdefault((string_expr, tuple(output_fields)), []).append(idx)
+
+        results: List[Optional[VectorStoreQueryResult]] = [None] * len(queries)
+        for (string_expr, output_fields), idxs in groups.items():
+            res = self.milvusclient.search(
+                collection_name=self.collection_name,
+                data=[queries[idx].query_embedding for idx in idxs],
+                filter=string_expr,
+                limit=max(queries[idx].similarity_top_k for idx in idxs),
+                output_fields=list(output_fields),
+                search_config=self.search_params,
+            )
+            for idx, hits in zip(idxs, res):
+                results[idx] = self._hits_to_query_result(
+                    hits[: queries[idx].similarity_top_k]
+                )
+
+        logger.debug(
+            f"Successfully searched {len(queries)} embeddings in collection: "
+            f"{self.collection_name} Num Searches: {len(groups)}"
+        )
+        return cast(List[VectorStoreQueryResult], results)
+
+    def _parse_query(self, query: VectorStoreQuery) -> Tuple[str, List[str]]:
+        """Build the Milvus filter expression and output fields of a query."""
         if query.mode != VectorStoreQueryMode.DEFAULT:
             raise ValueError(f"Milvus does not support {query.mode} yet.")
 
@@ -285,27 +574,16 @@ class MilvusVectorStore(VectorStore):
         if len(expr) != 0:
             string_expr = " and ".join(expr)
 
-        # Perform the search
-        res = self.milvusclient.search(
-            collection_name=self.collection_name,
-            data=[query.query_embedding],
-            filter=string_expr,
-            limit=query.similarity_top_k,
-            output_fields=output_fields,
-            search_config=self.search_params,
-        )
-
-        logger.debug(
-            f"Successfully searched embedding in collection: {self.collection_name}"
-            f" Num Results: {len(res[0])}"
-        )
+        return string_expr, output_fields
 
+    def _hits_to_query_result(self, hits: List[Any]) -> VectorStoreQueryResult:
+        """Parse the hits of a single search query."""
         nodes: List[Any] = []
         similarities: List[Any] = []
         ids: List[Any] = []
 
         # Parse the results
-        for hit in res[0]:
+        for hit in hits:
             if not self.text_field:
                 node = metadata_dict_to_node(
                     {"_node_content": hit["entity"].get("_node_content", None)}
@@ -328,19 +606,27 @@ class MilvusVectorStore(VectorStore):
         return VectorStoreQueryResult(nodes=nodes, similarities=similarities, ids=ids)
     
     def _create_index_if_required(self, force: bool = False) -> None:
-        # This helper method is introduced to allow the index to be created
-        # both in the constructor and in the `add` method. The `force` flag is
-        # provided to ensure that the index is created in the constructor even
-        # if self.overwrite is false. In the `add` method, the index is
-        # recreated only if self.overwrite is true.
+        # The index is created once, when the collection has none. The `force`
+        # flag rebuilds it with index_params, which is only needed for a newly
+        # created collection still holding the default index of create_collection.
+        # Inserts never rebuild it: Milvus indexes new segments on its own.
+        if self.collection.has_index() and force:
+            self._drop_index_if_exists()
         if not self.collection.has_index():
             self.collection.create_index(
                 self.embedding_field, index_config=self.index_params,
             )
-        if (self.collection.has_index() and self.overwrite) or force:
+        self.collection.load()
+
+    def _begin_deferred_index(self) -> None:
+        # An empty collection has its index dropped, so that it is built once
+        # over all the loaded data by finalize. A populated collection keeps its
+        # index and stays searchable, Milvus indexes the new segments as they seal.
+        self._deferred_index = True
+        if self.collection.num_entities == 0:
+            self._drop_index_if_exists()
+
+    def _drop_index_if_exists(self) -> None:
+        if self.collection.has_index():
             self.collection.release()
-            self.collection.drop_index()
-            self.collection.create_index(
-                self.embedding_field, index_config=self.index_params,
-            )
-        self.collection.load()
\ No newline at end of file
+            self.collection.drop_index()
\ No newline at end of file
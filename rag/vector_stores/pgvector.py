@@ -1,5 +1,7 @@
+import io
+import json
 import logging
-from typing import Any, List, NamedTuple, Optional, Type
+from typing import Any, Dict, List, NamedTuple, Optional, Type
 
 import asyncpg  # noqa
 import pgvector  # noqa
@@ -32,6 +34,16 @@ class DBEmbeddingRow(NamedTuple):
 _logger = logging.getLogger(__name__)
 
 
+def _copy_escape(value: str) -> str:
+    """Escape a value for the text format of COPY."""
+    return (
+        value.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
 def get_data_model(
     base: Type,
     index_name: str,
@@ -108,6 +120,26 @@ def get_data_model(
 
 
 class PGVectorStore(VectorStore):
+    """Postgres (pgvector) vector store.
+
+    Ingestion uses a single COPY per `add` with the psycopg2 driver, and a
+    multi-row executemany otherwise (e.g. asyncpg for `async_add`).
+
+    Both engines are pooled, and `ivfflat_probes` / `hnsw_ef_search` are set once
+    per pooled connection rather than per query. The same kwargs passed at query
+    time still override them, with SET LOCAL so the override stays in its own
+    transaction. With psycopg2 the unfiltered dense query runs as a server-side
+    prepared statement, PREPAREd once per connection; asyncpg already caches
+    prepared statements per connection.
+
+    Args:
+        pool_size (int): number of connections kept open by each engine pool.
+        max_overflow (int): extra connections opened under load.
+        ivfflat_probes (Optional[int]): ivfflat.probes set on each connection.
+        hnsw_ef_search (Optional[int]): hnsw.ef_search set on each connection.
+
+    """
+
     from sqlalchemy.sql.selectable import Select
 
     stores_text = True
@@ -124,6 +156,10 @@ class PGVectorStore(VectorStore):
     perform_setup: bool
     debug: bool
     use_jsonb: bool
+    pool_size: int
+    max_overflow: int
+    ivfflat_probes: Optional[int]
+    hnsw_ef_search: Optional[int]
 
     _base: Any = PrivateAttr()
     _table_class: Any = PrivateAttr()
@@ -146,6 +182,10 @@ class PGVectorStore(VectorStore):
         perform_setup: bool = True,
         debug: bool = False,
         use_jsonb: bool = False,
+        pool_size: int = 10,
+        max_overflow: int = 20,
+        ivfflat_probes: Optional[int] = None,
+        hnsw_ef_search: Optional[int] = None,
     ) -> None:
         table_name = table_name.lower()
         schema_name = schema_name.lower()
@@ -183,6 +223,10 @@ class PGVectorStore(VectorStore):
             perform_setup=perform_setup,
             debug=debug,
             use_jsonb=use_jsonb,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            ivfflat_probes=ivfflat_probes,
+            hnsw_ef_search=hnsw_ef_search,
         )
 
     async def close(self) -> None:
@@ -217,6 +261,10 @@ class PGVectorStore(VectorStore):
         perform_setup: bool = True,
         debug: bool = False,
         use_jsonb: bool = False,
+        pool_size: int = 10,
+        max_overflow: int = 20,
+        ivfflat_probes: Optional[int] = None,
+        hnsw_ef_search: Optional[int] = None,
     ) -> "PGVectorStore":
         """Return connection string from database parameters."""
         conn_str = (
@@ -238,6 +286,10 @@ class PGVectorStore(VectorStore):
             perform_setup=perform_setup,
             debug=debug,
             use_jsonb=use_jsonb,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            ivfflat_probes=ivfflat_probes,
+            hnsw_ef_search=hnsw_ef_search,
         )
 
     @property
@@ -247,16 +299,55 @@ class PGVectorStore(VectorStore):
         return self._engine
 
     def _connect(self) -> Any:
-        from sqlalchemy import create_engine
+        from sqlalchemy import create_engine, event
         from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
         from sqlalchemy.orm import sessionmaker
 
-        self._engine = create_engine(self.connection_string, echo=self.debug)
+        pool_kwargs = {
+            "pool_size": self.pool_size,
+            "max_overflow": self.max_overflow,
+            "pool_pre_ping": True,
+        }
+        self._engine = create_engine(
+            self.connection_string, echo=self.debug, **pool_kwargs
+        )
         self._session = sessionmaker(self._engine)
 
-        self._async_engine = create_async_engine(self.async_connection_string)
+        self._async_engine = create_async_engine(
+            self.async_connection_string, **pool_kwargs
+        )
         self._async_session = sessionmaker(self._async_engine, class_=AsyncSession)  # type: ignore
 
+        # search settings are applied once per pooled connection
+        event.listen(self._engine, "connect", self._on_connect)
+        event.listen(self._async_engine.sync_engine, "connect", self._on_connect)
+
+    def _on_connect(self, dbapi_connection: Any, connection_record: Any) -> None:
+        statements = []
+        if self.ivfflat_probes:
+            statements.append(f"SET ivfflat.probes = {int(self.ivfflat_probes)}")
+        if self.hnsw_ef_search:
+            statements.append(f"SET hnsw.ef_search = {int(self.hnsw_ef_search)}")
+        if not statements:
+            return
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
+        # commit, otherwise the pool rolls the settings back on checkin
+        dbapi_connection.commit()
+
+    def _search_settings(self, **kwargs: Any) -> List[str]:
+        """SET LOCAL statements for query time overrides of the search settings."""
+        statements = []
+        ivfflat_probes = kwargs.get("ivfflat_probes")
+        if ivfflat_probes and ivfflat_probes != self.ivfflat_probes:
+            statements.append(f"SET LOCAL ivfflat.probes = {int(ivfflat_probes)}")
+        hnsw_ef_search = kwargs.get("hnsw_ef_search")
+        if hnsw_ef_search and hnsw_ef_search != self.hnsw_ef_search:
+            statements.append(f"SET LOCAL hnsw.ef_search = {int(hnsw_ef_search)}")
+        return statements
+
     def _create_schema_if_not_exists(self) -> None:
         with self._session() as session, session.begin():
             from sqlalchemy import text
@@ -297,39 +388,82 @@ class PGVectorStore(VectorStore):
                 self._create_tables_if_not_exists()
             self._is_initialized = True
 
-    def _node_to_table_row(self, node: BaseNode) -> Any:
-        return self._table_class(
-            node_id=node.node_id,
-            embedding=node.get_embedding(),
-            text=node.get_content(metadata_mode=MetadataMode.NONE),
-            metadata_=node_to_metadata_dict(
+    def _node_to_row_values(self, node: BaseNode) -> Dict[str, Any]:
+        return {
+            "node_id": node.node_id,
+            "embedding": node.get_embedding(),
+            "text": node.get_content(metadata_mode=MetadataMode.NONE),
+            "metadata_": node_to_metadata_dict(
                 node,
                 remove_text=True,
                 flat_metadata=self.flat_metadata,
             ),
-        )
+        }
+
+    def _node_to_table_row(self, node: BaseNode) -> Any:
+        return self._table_class(**self._node_to_row_values(node))
+
+    def _copy_rows(self, session: Any, nodes: List[BaseNode]) -> None:
+        """Insert the nodes with a single COPY ... FROM STDIN (psycopg2)."""
+        buffer = io.StringIO()
+        for node in nodes:
+            values = self._node_to_row_values(node)
+            embedding = "[" + ",".join(str(x) for x in values["embedding"]) + "]"
+            buffer.write(
+                "\t".join(
+                    [
+                        _copy_escape(values["node_id"]),
+                        _copy_escape(values["text"]),
+                        _copy_escape(json.dumps(values["metadata_"])),
+                        embedding,
+                    ]
+                )
+                + "\n"
+            )
+        buffer.seek(0)
+
+        # raw psycopg2 cursor, in the transaction of the session
+        cursor = session.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {self.schema_name}.{self._table_class.__tablename__} "
+                "(node_id, text, metadata_, embedding) FROM STDIN",
+                buffer,
+            )
+        finally:
+            cursor.close()
 
     def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        from sqlalchemy import insert
+
         self._initialize()
-        ids = []
+        if not nodes:
+            return []
         with self._session() as session, session.begin():
-            for node in nodes:
-                ids.append(node.node_id)
-                item = self._node_to_table_row(node)
-                session.add(item)
+            if self._engine.dialect.driver == "psycopg2":
+                self._copy_rows(session, nodes)
+            else:
+                session.execute(
+                    insert(self._table_class),
+                    [self._node_to_row_values(node) for node in nodes],
+                )
             session.commit()
-        return ids
+        return [node.node_id for node in nodes]
 
     async def async_add(self, nodes: List[BaseNode], **kwargs: Any) -> List[str]:
+        from sqlalchemy import insert
+
         self._initialize()
-        ids = []
+        if not nodes:
+            return []
         async with self._async_session() as session, session.begin():
-            for node in nodes:
-                ids.append(node.node_id)
-                item = self._node_to_table_row(node)
-                session.add(item)
+            # multi-row executemany
+            await session.execute(
+                insert(self._table_class),
+                [self._node_to_row_values(node) for node in nodes],
+            )
             await session.commit()
-        return ids
+        return [node.node_id for node in nodes]
 
     def _to_postgres_operator(self, operator: FilterOperator) -> str:
         if operator == FilterOperator.EQ:
@@ -409,6 +543,34 @@ class PGVectorStore(VectorStore):
 
         return self._apply_filters_and_limit(stmt, limit, metadata_filters)
 
+    def _execute_prepared_query(
+        self, session: Any, embedding: List[float], limit: int
+    ) -> Any:
+        """Run the unfiltered dense query as a server-side prepared statement.
+
+        The statement is PREPAREd the first time a pooled connection runs it,
+        which is recorded in the connection info so the pool keeps it.
+        """
+        from sqlalchemy import text
+
+        statement_name = f"{self.schema_name}_{self.table_name}_dense_query"
+        connection = session.connection()
+        if not connection.info.get(statement_name):
+            connection.exec_driver_sql(
+                f"PREPARE {statement_name} (vector, integer) AS "
+                "SELECT id, node_id, text, metadata_, embedding <=> $1 AS distance "
+                f"FROM {self.schema_name}.{self._table_class.__tablename__} "
+                "ORDER BY distance ASC LIMIT $2"
+            )
+            connection.info[statement_name] = True
+        return connection.execute(
+            text(f"EXECUTE {statement_name}(:embedding, :limit)"),
+            {
+                "embedding": "[" + ",".join(str(x) for x in embedding) + "]",
+                "limit": limit,
+            },
+        )
+
     def _query_with_score(
         self,
         embedding: Optional[List[float]],
@@ -416,22 +578,23 @@ class PGVectorStore(VectorStore):
         metadata_filters: Optional[MetadataFilters] = None,
         **kwargs: Any,
     ) -> List[DBEmbeddingRow]:
-        stmt = self._build_query(embedding, limit, metadata_filters)
         with self._session() as session, session.begin():
             from sqlalchemy import text
 
-            if kwargs.get("ivfflat_probes"):
-                session.execute(
-                    text(f"SET ivfflat.probes = {kwargs.get('ivfflat_probes')}")
+            for statement in self._search_settings(**kwargs):
+                session.execute(text(statement))
+
+            if (
+                metadata_filters is None
+                and embedding is not None
+                and self._engine.dialect.driver == "psycopg2"
+            ):
+                res = self._execute_prepared_query(session, embedding, limit)
+            else:
+                stmt = self._build_query(embedding, limit, metadata_filters)
+                res = session.execute(
+                    stmt,
                 )
-            if kwargs.get("hnsw_ef_search"):
-                session.execute(
-                    text(f"SET hnsw.ef_search = {kwargs.get('hnsw_ef_search')}")
-                )
-
-            res = session.execute(
-                stmt,
-            )
             return [
                 DBEmbeddingRow(
                     node_id=item.node_id,
@@ -442,6 +605,59 @@ class PGVectorStore(VectorStore):
                 for item in res.all()
             ]
 
+    def _build_batch_query(self, queries: List[VectorStoreQuery]) -> Any:
+        """Union the per-query statements so all queries run in one round-trip.
+
+        Each branch keeps its own ORDER BY / LIMIT, so it can still use the
+        vector index, and is tagged with its position in `queries`.
+        """
+        from sqlalchemy import literal, select, union_all
+
+        branches = []
+        for query_idx, query in enumerate(queries):
+            stmt = self._build_query(
+                query.query_embedding, query.similarity_top_k, query.filters
+            )
+            stmt = stmt.add_columns(literal(query_idx).label("query_idx"))
+            branches.append(select(stmt.subquery()))
+        return union_all(*branches)
+
+    def _batch_query_with_score(
+        self,
+        queries: List[VectorStoreQuery],
+        **kwargs: Any,
+    ) -> List[List[DBEmbeddingRow]]:
+        stmt = self._build_batch_query(queries)
+        with self._session() as session, session.begin():
+            from sqlalchemy import text
+
+            for statement in self._search_settings(**kwargs):
+                session.execute(text(statement))
+
+            res = session.execute(stmt)
+            # UNION ALL does not keep branch order, regroup and re-sort by distance
+            grouped_items: List[List[Any]] = [[] for _ in queries]
+            for item in res.all():
+                grouped_items[item.query_idx].append(item)
+
+        results = []
+        for items in grouped_items:
+            items.sort(key=lambda item: (item.distance is None, item.distance))
+            results.append(
+                [
+                    DBEmbeddingRow(
+                        node_id=item.node_id,
+                        text=item.text,
+                        metadata=item.metadata_,
+                        similarity=(1 - item.distance)
+                        if item.distance is not None
+                        else 0,
+                    )
+                    for item in items
+                ]
+            )
+        return results
+
     async def _aquery_with_score(
         self,
         embedding: Optional[List[float]],
@@ -453,14 +669,8 @@ class PGVectorStore(VectorStore):
         async with self._async_session() as async_session, async_session.begin():
             from sqlalchemy import text
 
-            if kwargs.get("hnsw_ef_search"):
-                await async_session.execute(
-                    text(f"SET hnsw.ef_search = {kwargs.get('hnsw_ef_search')}")
-                )
-            if kwargs.get("ivfflat_probes"):
-                await async_session.execute(
-                    text(f"SET ivfflat.probes = {kwargs.get('ivfflat_probes')}")
-                )
+            for statement in self._search_settings(**kwargs):
+                await async_session.execute(text(statement))
 
             res = await async_session.execute(stmt)
             return [
@@ -671,6 +881,32 @@ class PGVectorStore(VectorStore):
 
         return self._db_rows_to_query_result(results)
 
+    def batch_query(
+        self, queries: List[VectorStoreQuery], **kwargs: Any
+    ) -> List[VectorStoreQueryResult]:
+        """Query many embeddings in a single round-trip.
+
+        Default (dense) mode queries are combined into one UNION ALL statement,
+        queries in other modes run one by one.
+        """
+        self._initialize()
+        results: List[Optional[VectorStoreQueryResult]] = [None] * len(queries)
+        dense_idxs = []
+        for idx, query in enumerate(queries):
+            if query.mode == VectorStoreQueryMode.DEFAULT:
+                dense_idxs.append(idx)
+            else:
+                results[idx] = self.query(query, **kwargs)
+
+        if dense_idxs:
+            dense_results = self._batch_query_with_score(
+                [queries[idx] for idx in dense_idxs], **kwargs
+            )
+            for idx, rows in zip(dense_idxs, dense_results):
+                results[idx] = self._db_rows_to_query_result(rows)
+
+        return results  # type: ignore
+
     def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
         import sqlalchemy
 
@@ -4,10 +4,24 @@ import json
 import logging
 import os
 from dataclasses import dataclass, field
-from typing import Any, Callable, Dict, List, Mapping, Optional, cast
+from enum import Enum
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    cast,
+)
 
 import fsspec
+import numpy as np
 from dataclasses_json import DataClassJsonMixin
+from fsspec.implementations.local import LocalFileSystem
 
 from rag.constants.default_storage import (
     DEFAULT_PERSIST_DIR,
@@ -18,6 +32,8 @@ from rag.constants.default_storage import (
 from rag.node.base_node import BaseNode
 from rag.rag_utils.utils import concat_dirs
 from rag.embeddings.get_embeddings import (
+    get_batch_top_k_cosine_rows,
+    get_top_k_cosine_rows,
     get_top_k_embeddings,
     get_top_k_embeddings_learner,
     get_top_k_mmr_embeddings,
@@ -35,6 +51,11 @@ from .utils import node_to_metadata_dict
 
 logger = logging.getLogger(__name__)
 
+# versioned binary layout written by matrix stores: the json file at the persist
+# path becomes a small manifest pointing to .npy / .json sidecars next to it
+BINARY_FORMAT_NAME = "simple_vector_store_binary"
+BINARY_FORMAT_VERSION = 1
+
 
 def _build_metadata_filter_fn(
     metadata_lookup_fn: Callable[[str], Mapping[str, Any]],
@@ -62,6 +83,249 @@ def _build_metadata_filter_fn(
     return filter_fn
 
 
+class SimpleVectorStoreMode(str, Enum):
+    """How SimpleVectorStore keeps embeddings in memory."""
+
+    DICT = "dict"  # node_id -> List[float]
+    MATRIX = "matrix"  # contiguous float32 matrix, one row per node
+
+
+class EmbeddingMatrix:
+    """Contiguous float32 embedding block with a row -> node_id mapping.
+
+    Rows are kept packed: deleting a row moves the last row into its slot, so
+    live embeddings are always ``matrix[:len(self)]``. L2 norms are cached per
+    row so a cosine query is a single matrix-vector product.
+
+    Args:
+        dim (Optional[int]): embedding dimension, inferred from the first add
+            if not given.
+
+    """
+
+    _MIN_CAPACITY = 64
+
+    def __init__(self, dim: Optional[int] = None) -> None:
+        """Init params."""
+        self._dim = dim
+        self._matrix = np.empty((0, dim or 0), dtype=np.float32)
+        self._norms = np.empty((0,), dtype=np.float32)
+        self._row_ids: List[str] = []
+        self._id_to_row: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._row_ids)
+
+    def __contains__(self, node_id: object) -> bool:
+        return node_id in self._id_to_row
+
+    @property
+    def dim(self) -> Optional[int]:
+        """Embedding dimension."""
+        return self._dim
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """Live (n, dim) embedding block."""
+        return self._matrix[: len(self)]
+
+    @property
+    def norms(self) -> np.ndarray:
+        """L2 norms of the live rows."""
+        return self._norms[: len(self)]
+
+    @property
+    def row_ids(self) -> List[str]:
+        """Node ids in row order."""
+        return self._row_ids
+
+    @classmethod
+    def from_arrays(
+        cls,
+        row_ids: List[str],
+        embeddings: np.ndarray,
+        norms: Optional[np.ndarray] = None,
+    ) -> "EmbeddingMatrix":
+        """Wrap existing arrays without copying, e.g. memory-mapped ones.
+
+        Read-only arrays are copied into memory on the first write.
+        """
+        if norms is None:
+            norms = np.linalg.norm(embeddings, axis=1).astype(np.float32)
+        matrix = cls(dim=embeddings.shape[1])
+        matrix._matrix = embeddings
+        matrix._norms = norms
+        matrix._row_ids = list(row_ids)
+        matrix._id_to_row = {node_id: row for row, node_id in enumerate(row_ids)}
+        return matrix
+
+    def _reserve(self, num_rows: int) -> None:
+        """Make the backing arrays writable and large enough for num_rows."""
+        capacity = self._matrix.shape[0]
+        writeable = self._matrix.flags.writeable and self._norms.flags.writeable
+        if num_rows <= capacity and writeable:
+            return
+        if num_rows <= capacity:
+            new_capacity = capacity
+        else:
+            new_capacity = max(num_rows, 2 * capacity, self._MIN_CAPACITY)
+        size = len(self)
+
+        matrix = np.empty((new_capacity, self._dim), dtype=np.float32)
+        matrix[:size] = self._matrix[:size]
+        norms = np.empty((new_capacity,), dtype=np.float32)
+        norms[:size] = self._norms[:size]
+        self._matrix, self._norms = matrix, norms
+
+    def add(self, node_ids: Sequence[str], embeddings: Any) -> None:
+        """Add or overwrite embeddings for the given node ids."""
+        if len(node_ids) == 0:
+            return
+        block = np.asarray(embeddings, dtype=np.float32)
+        if block.ndim == 1:
+            block = block[np.newaxis, :]
+        if block.shape[0] != len(node_ids):
+            raise ValueError(
+                f"Got {len(node_ids)} node ids for {block.shape[0]} embeddings."
+            )
+        if self._dim is None:
+            self._dim = block.shape[1]
+            self._matrix = np.empty((0, self._dim), dtype=np.float32)
+        elif block.shape[1] != self._dim:
+            raise ValueError(
+                f"Embedding dim {block.shape[1]} does not match store dim {self._dim}."
+            )
+
+        self._reserve(len(self) + len(node_ids))
+        rows = np.empty((len(node_ids),), dtype=np.int64)
+        for i, node_id in enumerate(node_ids):
+            row = self._id_to_row.get(node_id)
+            if row is None:
+                row = len(self._row_ids)
+                self._id_to_row[node_id] = row
+                self._row_ids.append(node_id)
+            rows[i] = row
+
+        self._matrix[rows] = block
+        self._norms[rows] = np.linalg.norm(block, axis=1)
+
+    def get(self, node_id: str) -> np.ndarray:
+        """Get the embedding row of a node."""
+        return self._matrix[self._id_to_row[node_id]]
+
+    def delete(self, node_ids: Iterable[str]) -> None:
+        """Delete rows, moving the last row into each freed slot."""
+        self._reserve(len(self))
+        for node_id in node_ids:
+            row = self._id_to_row.pop(node_id, None)
+            if row is None:
+                continue
+            last_row = len(self._row_ids) - 1
+            last_id = self._row_ids.pop()
+            if row != last_row:
+                self._matrix[row] = self._matrix[last_row]
+                self._norms[row] = self._norms[last_row]
+                self._row_ids[row] = last_id
+                self._id_to_row[last_id] = row
+
+    def rows_for(self, node_ids: Iterable[str]) -> np.ndarray:
+        """Get row indices of the given node ids, skipping unknown ids."""
+        return np.fromiter(
+            (self._id_to_row[n] for n in node_ids if n in self._id_to_row),
+            dtype=np.int64,
+        )
+
+    def top_k(
+        self,
+        query_embedding: Any,
+        similarity_top_k: Optional[int] = None,
+        rows: Optional[np.ndarray] = None,
+    ) -> Tuple[List[float], List[str]]:
+        """Get top k node ids by cosine similarity, optionally within rows."""
+        embeddings, norms = self.embeddings, self.norms
+        if rows is not None:
+            embeddings, norms = embeddings[rows], norms[rows]
+
+        top_similarities, top_rows = get_top_k_cosine_rows(
+            query_embedding,
+            embeddings,
+            norms=norms,
+            similarity_top_k=similarity_top_k,
+        )
+        if rows is not None:
+            top_rows = rows[top_rows]
+        return top_similarities.tolist(), [self._row_ids[r] for r in top_rows]
+
+    def batch_top_k(
+        self,
+        query_embeddings: Any,
+        similarity_top_k: Optional[int] = None,
+        rows: Optional[np.ndarray] = None,
+    ) -> List[Tuple[List[float], List[str]]]:
+        """Get top k node ids for many queries with one matrix product."""
+        embeddings, norms = self.embeddings, self.norms
+        if rows is not None:
+            embeddings, norms = embeddings[rows], norms[rows]
+
+        batch_results = get_batch_top_k_cosine_rows(
+            query_embeddings,
+            embeddings,
+            norms=norms,
+            similarity_top_k=similarity_top_k,
+        )
+        if rows is not None:
+            batch_results = [(sims, rows[top_rows]) for sims, top_rows in batch_results]
+        return [
+            (top_similarities.tolist(), [self._row_ids[r] for r in top_rows])
+            for top_similarities, top_rows in batch_results
+        ]
+
+    def to_dict(self) -> Dict[str, List[float]]:
+        """Convert to a node_id -> embedding dict."""
+        return dict(zip(self._row_ids, self.embeddings.tolist()))
+
+
+def _sidecar_paths(persist_path: str) -> Dict[str, str]:
+    """Get sidecar file names of the binary layout for a persist path."""
+    base = os.path.basename(persist_path)
+    if base.endswith(".json"):
+        base = base[: -len(".json")]
+    return {
+        "embeddings": f"{base}.embeddings.npy",
+        "norms": f"{base}.norms.npy",
+        "ids": f"{base}.ids.npy",
+        "metadata": f"{base}.metadata.json",
+    }
+
+
+def _resolve_sidecar(persist_path: str, fname: str) -> str:
+    """Resolve a sidecar file name relative to the manifest's directory."""
+    dirpath = os.path.dirname(persist_path)
+    return concat_dirs(dirpath, fname) if dirpath else fname
+
+
+def _save_array(
+    array: np.ndarray, path: str, fs: fsspec.AbstractFileSystem
+) -> None:
+    """Save an array, replacing any existing file only once fully written.
+
+    The old file may still be memory-mapped by this or another process, so it
+    must not be truncated in place.
+    """
+    tmp_path = f"{path}.tmp"
+    with fs.open(tmp_path, "wb") as f:
+        np.save(f, array, allow_pickle=False)
+    fs.mv(tmp_path, path)
+
+
+def _load_array(path: str, fs: fsspec.AbstractFileSystem) -> np.ndarray:
+    """Load an array, memory-mapped read-only when on local disk."""
+    if isinstance(fs, LocalFileSystem):
+        return np.load(path, mmap_mode="r", allow_pickle=False)
+    with fs.open(path, "rb") as f:
+        return np.load(f, allow_pickle=False)
+
+
 @dataclass
 class SimpleVectorStoreData(DataClassJsonMixin):
     """Simple Vector Store Data container.
@@ -82,11 +346,20 @@ class SimpleVectorStore(VectorStore):
     """Simple Vector Store.
 
     In this vector store, embeddings are stored within a simple, in-memory dictionary.
+    With `storage_mode="matrix"`, embeddings are instead kept in a contiguous
+    float32 matrix (see EmbeddingMatrix) and queries are answered with one
+    matrix-vector product plus a partial sort.
 
     Args:
         simple_vector_store_data_dict (Optional[dict]): data dict
             containing the embeddings and doc_ids. See SimpleVectorStoreData
             for more details.
+        storage_mode (SimpleVectorStoreMode): in-memory layout of embeddings,
+            defaults to "dict". Matrix stores persist to a binary layout
+            (float32 .npy blocks plus id and metadata sidecars) that is
+            memory-mapped back on load.
+        embedding_matrix (Optional[EmbeddingMatrix]): prebuilt embedding matrix,
+            implies the "matrix" storage mode.
     """
 
     stores_text: bool = False
@@ -95,11 +368,33 @@ class SimpleVectorStore(VectorStore):
         self,
         data: Optional[SimpleVectorStoreData] = None,
         fs: Optional[fsspec.AbstractFileSystem] = None,
+        storage_mode: SimpleVectorStoreMode = SimpleVectorStoreMode.DICT,
+        embedding_matrix: Optional[EmbeddingMatrix] = None,
         **kwargs: Any,
     ) -> None:
         """Initialize params."""
         self._data = data or SimpleVectorStoreData()
         self._fs = fs or fsspec.filesystem("file")
+        self._storage_mode = SimpleVectorStoreMode(storage_mode)
+
+        self._matrix: Optional[EmbeddingMatrix] = None
+        if embedding_matrix is not None:
+            self._storage_mode = SimpleVectorStoreMode.MATRIX
+            self._matrix = embedding_matrix
+        elif self._storage_mode == SimpleVectorStoreMode.MATRIX:
+            # the matrix owns the embeddings, the dict is only filled on export
+            self._matrix = EmbeddingMatrix()
+            embedding_dict = self._data.embedding_dict
+            if embedding_dict:
+                self._matrix.add(
+                    list(embedding_dict.keys()), list(embedding_dict.values())
+                )
+            self._data.embedding_dict = {}
+
+    @property
+    def storage_mode(self) -> SimpleVectorStoreMode:
+        """Get storage mode."""
+        return self._storage_mode
 
     @classmethod
     def from_persist_dir(
@@ -107,6 +402,7 @@ class SimpleVectorStore(VectorStore):
         persist_dir: str = DEFAULT_PERSIST_DIR,
         namespace: Optional[str] = None,
         fs: Optional[fsspec.AbstractFileSystem] = None,
+        storage_mode: Optional[SimpleVectorStoreMode] = None,
     ) -> "SimpleVectorStore":
         """Load from persist dir."""
         if namespace:
@@ -118,7 +414,7 @@ class SimpleVectorStore(VectorStore):
             persist_path = concat_dirs(persist_dir, persist_fname)
         else:
             persist_path = os.path.join(persist_dir, persist_fname)
-        return cls.from_persist_path(persist_path, fs=fs)
+        return cls.from_persist_path(persist_path, fs=fs, storage_mode=storage_mode)
 
     @classmethod
     def from_namespaced_persist_dir(
@@ -166,16 +462,33 @@ class SimpleVectorStore(VectorStore):
 
     def get(self, text_id: str) -> List[float]:
         """Get embedding."""
+        if self._matrix is not None:
+            return self._matrix.get(text_id).tolist()
         return self._data.embedding_dict[text_id]
 
+    def _num_embeddings(self) -> int:
+        if self._matrix is not None:
+            return len(self._matrix)
+        return len(self._data.embedding_dict)
+
     def add(
         self,
         nodes: List[BaseNode],
         **add_kwargs: Any,
     ) -> List[str]:
         """Add nodes to index."""
+        if self._matrix is not None:
+            self._matrix.add(
+                [node.node_id for node in nodes],
+                [node.get_embedding() for node in nodes],
+            )
+
         for node in nodes:
-            self._data.embedding_dict[node.node_id] = node.get_embedding()
+            if self._matrix is None:
+                # persisted as json
+                self._data.embedding_dict[node.node_id] = np.asarray(
+                    node.get_embedding(), dtype=np.float32
+                ).tolist()
             self._data.text_id_to_ref_doc_id[node.node_id] = node.ref_doc_id or "None"
 
             metadata = node_to_metadata_dict(
@@ -198,8 +511,12 @@ class SimpleVectorStore(VectorStore):
             if ref_doc_id == ref_doc_id_:
                 text_ids_to_delete.add(text_id)
 
+        if self._matrix is not None:
+            self._matrix.delete(text_ids_to_delete)
+
         for text_id in text_ids_to_delete:
-            del self._data.embedding_dict[text_id]
+            if self._matrix is None:
+                del self._data.embedding_dict[text_id]
             del self._data.text_id_to_ref_doc_id[text_id]
             # Handle metadata_dict not being present in stores that were persisted
             # without metadata, or, not being present for nodes stored
@@ -216,7 +533,7 @@ class SimpleVectorStore(VectorStore):
         # Prevent metadata filtering on stores that were persisted without metadata.
         if (
             query.filters is not None
-            and self._data.embedding_dict
+            and self._num_embeddings() > 0
             and not self._data.metadata_dict
         ):
             raise ValueError(
@@ -228,6 +545,9 @@ class SimpleVectorStore(VectorStore):
             lambda node_id: self._data.metadata_dict[node_id], query.filters
         )
 
+        if self._matrix is not None:
+            return self._matrix_query(query, query_filter_fn)
+
         if query.node_ids is not None:
             available_ids = set(query.node_ids)
 
@@ -261,25 +581,204 @@ class SimpleVectorStore(VectorStore):
 
         return VectorStoreQueryResult(similarities=top_similarities, ids=top_ids)
 
+    def _matrix_query(
+        self,
+        query: VectorStoreQuery,
+        query_filter_fn: Callable[[str], bool],
+    ) -> VectorStoreQueryResult:
+        """Answer a query against the embedding matrix."""
+        matrix = cast(EmbeddingMatrix, self._matrix)
+
+        # restrict scoring to candidate rows only when something is filtered
+        rows: Optional[np.ndarray] = None
+        if query.node_ids is not None:
+            rows = matrix.rows_for(query.node_ids)
+        if query.filters is not None:
+            candidate_ids = (
+                query.node_ids if query.node_ids is not None else matrix.row_ids
+            )
+            rows = matrix.rows_for(
+                [
+                    node_id
+                    for node_id in candidate_ids
+                    if node_id in matrix and query_filter_fn(node_id)
+                ]
+            )
+
+        if query.mode == VectorStoreQueryMode.DEFAULT:
+            top_similarities, top_ids = matrix.top_k(
+                query.query_embedding,
+                similarity_top_k=query.similarity_top_k,
+                rows=rows,
+            )
+        else:
+            raise ValueError(f"Invalid query mode: {query.mode}")
+
+        return VectorStoreQueryResult(similarities=top_similarities, ids=top_ids)
+
+    def batch_query(
+        self,
+        queries: List[VectorStoreQuery],
+        **kwargs: Any,
+    ) -> List[VectorStoreQueryResult]:
+        """Query many embeddings at once.
+
+        In matrix mode, default-mode queries without metadata filters are
+        scored together with a single matrix-matrix product per `node_ids`
+        list (queries built by the same retriever share that list object);
+        other queries run one by one.
+        """
+        if self._matrix is None:
+            return [self.query(query, **kwargs) for query in queries]
+
+        results: List[Optional[VectorStoreQueryResult]] = [None] * len(queries)
+        batches: Dict[Optional[int], List[int]] = {}
+        for idx, query in enumerate(queries):
+            if query.mode == VectorStoreQueryMode.DEFAULT and query.filters is None:
+                node_ids_key = None if query.node_ids is None else id(query.node_ids)
+                batches.setdefault(node_ids_key, []).append(idx)
+            else:
+                results[idx] = self.query(query, **kwargs)
+
+        for batch_idxs in batches.values():
+            batch_queries = [queries[idx] for idx in batch_idxs]
+            node_ids = batch_queries[0].node_ids
+            batch_results = self._matrix.batch_top_k(
+                [query.query_embedding for query in batch_queries],
+                similarity_top_k=max(query.similarity_top_k for query in batch_queries),
+                rows=self._matrix.rows_for(node_ids) if node_ids is not None else None,
+            )
+            for idx, query, (top_similarities, top_ids) in zip(
+                batch_idxs, batch_queries, batch_results
+            ):
+                results[idx] = VectorStoreQueryResult(
+                    similarities=top_similarities[: query.similarity_top_k],
+                    ids=top_ids[: query.similarity_top_k],
+                )
+
+        return cast(List[VectorStoreQueryResult], results)
+
     def persist(
         self,
         persist_path: str = os.path.join(DEFAULT_PERSIST_DIR, DEFAULT_PERSIST_FNAME),
         fs: Optional[fsspec.AbstractFileSystem] = None,
     ) -> None:
-        """Persist the SimpleVectorStore to a directory."""
+        """Persist the SimpleVectorStore to a directory.
+
+        Dict stores are written as a single json document. Matrix stores write
+        the binary layout: a json manifest at `persist_path` plus sidecars.
+        """
         file_path = fs or self._fs
         dirpath = os.path.dirname(persist_path)
         if not file_path.exists(dirpath):
             file_path.makedirs(dirpath)
 
+        if self._matrix is not None:
+            self._persist_binary(persist_path, file_path)
+            return
+
         with file_path.open(persist_path, "w") as f:
-            json.dump(self._data.to_dict(), f)
+            json.dump(self.to_dict(), f)
+
+    def _persist_binary(
+        self, persist_path: str, fs: fsspec.AbstractFileSystem
+    ) -> None:
+        """Persist embeddings as float32 .npy blocks with json sidecars."""
+        matrix = cast(EmbeddingMatrix, self._matrix)
+        sidecars = _sidecar_paths(persist_path)
+
+        embeddings = np.ascontiguousarray(matrix.embeddings, dtype=np.float32)
+        if matrix.dim is None:
+            embeddings = embeddings.reshape(0, 0)
+        _save_array(embeddings, _resolve_sidecar(persist_path, sidecars["embeddings"]), fs)
+        _save_array(
+            np.ascontiguousarray(matrix.norms, dtype=np.float32),
+            _resolve_sidecar(persist_path, sidecars["norms"]),
+            fs,
+        )
+        _save_array(
+            np.array(matrix.row_ids, dtype=str),
+            _resolve_sidecar(persist_path, sidecars["ids"]),
+            fs,
+        )
+        with fs.open(_resolve_sidecar(persist_path, sidecars["metadata"]), "w") as f:
+            json.dump(
+                {
+                    "text_id_to_ref_doc_id": self._data.text_id_to_ref_doc_id,
+                    "metadata_dict": self._data.metadata_dict,
+                },
+                f,
+            )
+
+        # the manifest is written last, so a partial write is never picked up
+        with fs.open(persist_path, "w") as f:
+            json.dump(
+                {
+                    "format": BINARY_FORMAT_NAME,
+                    "version": BINARY_FORMAT_VERSION,
+                    "dtype": "float32",
+                    "dim": matrix.dim,
+                    "count": len(matrix),
+                    **sidecars,
+                },
+                f,
+            )
+
+    @classmethod
+    def _from_binary_manifest(
+        cls,
+        manifest: dict,
+        persist_path: str,
+        fs: fsspec.AbstractFileSystem,
+    ) -> "SimpleVectorStore":
+        """Load a store persisted in the binary layout."""
+        version = manifest.get("version")
+        if version != BINARY_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported {BINARY_FORMAT_NAME} version {version} at "
+                f"{persist_path}, expected {BINARY_FORMAT_VERSION}."
+            )
+
+        embeddings = _load_array(
+            _resolve_sidecar(persist_path, manifest["embeddings"]), fs
+        )
+        norms = _load_array(_resolve_sidecar(persist_path, manifest["norms"]), fs)
+        row_ids = _load_array(
+            _resolve_sidecar(persist_path, manifest["ids"]), fs
+        ).tolist()
+        if len(row_ids) != manifest["count"]:
+            raise ValueError(
+                f"Corrupted {BINARY_FORMAT_NAME} at {persist_path}: expected "
+                f"{manifest['count']} ids, found {len(row_ids)}."
+            )
+        with fs.open(_resolve_sidecar(persist_path, manifest["metadata"]), "rb") as f:
+            metadata = json.load(f)
+
+        data = SimpleVectorStoreData(
+            text_id_to_ref_doc_id=metadata["text_id_to_ref_doc_id"],
+            metadata_dict=metadata["metadata_dict"],
+        )
+        if manifest["dim"] is None:
+            # nothing was ever added
+            return cls(data, embedding_matrix=EmbeddingMatrix())
+        return cls(
+            data,
+            embedding_matrix=EmbeddingMatrix.from_arrays(row_ids, embeddings, norms),
+        )
 
     @classmethod
     def from_persist_path(
-        cls, persist_path: str, fs: Optional[fsspec.AbstractFileSystem] = None
+        cls,
+        persist_path: str,
+        fs: Optional[fsspec.AbstractFileSystem] = None,
+        storage_mode: Optional[SimpleVectorStoreMode] = None,
     ) -> "SimpleVectorStore":
-        """Create a SimpleKVStore from a persist directory."""
+        """Create a SimpleKVStore from a persist directory.
+
+        Both the json document and the binary layout are supported. Unless
+        `storage_mode` is given, json stores load in "dict" mode and binary
+        stores load memory-mapped in "matrix" mode.
+        """
         file_path = fs or fsspec.filesystem("file")
         if not file_path.exists(persist_path):
             raise ValueError(
@@ -289,13 +788,27 @@ class SimpleVectorStore(VectorStore):
         logger.debug(f"Loading {__name__} from {persist_path}.")
         with file_path.open(persist_path, "rb") as f:
             data_dict = json.load(f)
-            data = SimpleVectorStoreData.from_dict(data_dict)
-        return cls(data)
+
+        if data_dict.get("format") == BINARY_FORMAT_NAME:
+            vector_store = cls._from_binary_manifest(data_dict, persist_path, file_path)
+            if storage_mode in (None, SimpleVectorStoreMode.MATRIX):
+                return vector_store
+            return cls.from_dict(vector_store.to_dict(), storage_mode=storage_mode)
+
+        data = SimpleVectorStoreData.from_dict(data_dict)
+        return cls(data, storage_mode=storage_mode or SimpleVectorStoreMode.DICT)
 
     @classmethod
-    def from_dict(cls, save_dict: dict) -> "SimpleVectorStore":
+    def from_dict(
+        cls,
+        save_dict: dict,
+        storage_mode: SimpleVectorStoreMode = SimpleVectorStoreMode.DICT,
+    ) -> "SimpleVectorStore":
         data = SimpleVectorStoreData.from_dict(save_dict)
-        return cls(data)
+        return cls(data, storage_mode=storage_mode)
 
     def to_dict(self) -> dict:
-        return self._data.to_dict()
+        data_dict = self._data.to_dict()
+        if self._matrix is not None:
+            data_dict["embedding_dict"] = self._matrix.to_dict()
+        return data_dict
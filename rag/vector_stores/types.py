@@ -95,6 +95,10 @@ class VectorStoreQuery:
     # NOTE: currently only used by postgres hybrid search
     sparse_top_k: Optional[int] = None
 
+    # NOTE: ANN search knobs, currently only used by faiss IVF / HNSW indexes
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+
 class FilterOperator(str, Enum):
     """Vector store filter operator."""
 
@@ -35,7 +35,8 @@ def node_to_metadata_dict(
     flat_metadata: bool = False,
 ) -> Dict[str, Any]:
     """Common logic for saving Node data into metadata dict."""
-    node_dict = node.dict()
+    # the embedding is not stored in the metadata, don't copy it
+    node_dict = node.dict(exclude={"embedding"})
     metadata: Dict[str, Any] = node_dict.get("metadata", {})
 
     if flat_metadata:
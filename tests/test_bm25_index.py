@@ -0,0 +1,164 @@
+import itertools
+import random
+from typing import List
+
+import numpy as np
+import pytest
+
+from rag.retrievers.sparse.bm25_index import BM25Index, BM25QueryMode, count_terms
+
+VOCAB = [f"w{i}" for i in range(300)]
+
+
+def _make_corpus(num_docs: int, seed: int = 0) -> List[List[str]]:
+    # zipf-like: low term ids are much more frequent
+    rng = random.Random(seed)
+    return [
+        [
+            rng.choice(VOCAB[: rng.randint(5, len(VOCAB))])
+            for _ in range(rng.randint(1, 60))
+        ]
+        for _ in range(num_docs)
+    ]
+
+
+def _make_queries(num_queries: int, seed: int = 1) -> List[List[str]]:
+    rng = random.Random(seed)
+    return [
+        [rng.choice(VOCAB) for _ in range(rng.randint(1, 5))]
+        for _ in range(num_queries)
+    ]
+
+
+def _assert_parity(
+    index: BM25Index, corpus: List[List[str]], doc_ids: np.ndarray
+) -> None:
+    """Check the scores of doc_ids against BM25Okapi over their documents."""
+    rank_bm25 = pytest.importorskip("rank_bm25")
+    reference = rank_bm25.BM25Okapi([corpus[doc_id] for doc_id in doc_ids])
+    for query in _make_queries(30):
+        expected = reference.get_scores(query)
+        np.testing.assert_allclose(
+            index.get_scores(query)[doc_ids], expected, atol=1e-4
+        )
+        top_doc_ids, top_scores = index.top_k(query, 10)
+        assert set(top_doc_ids.tolist()) <= set(doc_ids.tolist())
+        np.testing.assert_allclose(
+            top_scores, np.sort(expected)[::-1][: len(top_scores)], atol=1e-4
+        )
+
+
+def test_scores_match_bm25_okapi() -> None:
+    corpus = _make_corpus(300)
+    index = BM25Index.from_corpus(corpus)
+    _assert_parity(index, corpus, np.arange(len(corpus)))
+
+
+def test_incremental_add_and_delete() -> None:
+    corpus = _make_corpus(300)
+    index = BM25Index.from_corpus(corpus[:200])
+    # delta segment, then straight to the merged arrays
+    np.testing.assert_array_equal(index.add(corpus[200:250]), np.arange(200, 250))
+    np.testing.assert_array_equal(
+        index.add_counts([count_terms(corpus[250:280]), count_terms(corpus[280:])]),
+        np.arange(250, 300),
+    )
+    deleted = set(random.Random(2).sample(range(300), 50))
+    index.delete(deleted)
+
+    live_doc_ids = np.array([i for i in range(300) if i not in deleted])
+    assert index.num_docs == len(live_doc_ids)
+    assert index.max_doc_id == 300
+    assert index.get_doc_freq("w0") == sum(
+        "w0" in corpus[doc_id] for doc_id in live_doc_ids
+    )
+    _assert_parity(index, corpus, live_doc_ids)
+
+    with pytest.raises(IndexError):
+        index.delete([300])
+
+
+def test_persist_mmap_reload_and_compact(tmp_path) -> None:
+    corpus = _make_corpus(300)
+    index = BM25Index.from_corpus(corpus[:250])
+    index.add(corpus[250:])
+    index.delete([3, 120, 260])
+    index.persist(str(tmp_path))
+
+    loaded = BM25Index.from_persist_dir(str(tmp_path), mmap=True)
+    live_doc_ids = np.array([i for i in range(300) if i not in {3, 120, 260}])
+    assert loaded.num_docs == len(live_doc_ids)
+    _assert_parity(loaded, corpus, live_doc_ids)
+
+    # updates after a reload, then saved again over the mmapped files
+    loaded.add([["new", "new", "w1"]])
+    loaded.delete([7])
+    loaded.persist(str(tmp_path))
+    loaded = BM25Index.from_persist_dir(str(tmp_path))
+    corpus = corpus + [["new", "new", "w1"]]
+    live_doc_ids = live_doc_ids[live_doc_ids != 7]
+    live_doc_ids = np.append(live_doc_ids, 300)
+    assert loaded.get_doc_freq("new") == 1
+
+    remap = loaded.compact()
+    assert loaded.max_doc_id == loaded.num_docs == len(live_doc_ids)
+    np.testing.assert_array_equal(remap[live_doc_ids], np.arange(len(live_doc_ids)))
+    assert (remap[[3, 7, 120, 260]] == -1).all()
+    compacted_corpus = [corpus[doc_id] for doc_id in live_doc_ids]
+    _assert_parity(loaded, compacted_corpus, np.arange(len(live_doc_ids)))
+
+
+def test_chunked_counts_build_equals_serial_build() -> None:
+    corpus = _make_corpus(300)
+    serial = BM25Index.from_corpus(corpus)
+    # the partial postings of parallel workers, one count per chunk
+    chunked = BM25Index()
+    chunked.add_counts(count_terms(corpus[i : i + 64]) for i in range(0, 300, 64))
+
+    for query in _make_queries(20):
+        np.testing.assert_array_equal(
+            chunked.get_scores(query), serial.get_scores(query)
+        )
+    for term in VOCAB:
+        assert chunked.get_doc_freq(term) == serial.get_doc_freq(term)
+
+
+@pytest.mark.parametrize("with_updates", [False, True])
+def test_block_max_matches_exhaustive(with_updates: bool) -> None:
+    corpus = _make_corpus(2000)
+    index = BM25Index.from_corpus(corpus)
+    if with_updates:
+        index.add(_make_corpus(300, seed=3))
+        index.delete(random.Random(4).sample(range(2300), 200))
+
+    for query in _make_queries(50):
+        for k in (1, 10):
+            doc_ids, scores = index.top_k(query, k)
+            block_max_doc_ids, block_max_scores = index.top_k(
+                query, k, query_mode=BM25QueryMode.BLOCK_MAX
+            )
+            np.testing.assert_array_equal(block_max_doc_ids, doc_ids)
+            np.testing.assert_array_equal(block_max_scores, scores)
+
+
+def test_block_max_matches_exhaustive_with_negative_idf() -> None:
+    # mostly common terms: their idf is floored at a negative epsilon * mean
+    rng = np.random.default_rng(0)
+    common = [f"c{i}" for i in range(5)]
+    corpus = [
+        [term for term in common if rng.random() < 0.9]
+        + (["r0"] if i % 7 == 0 else [])
+        + (["r1"] if i % 11 == 0 else [])
+        for i in range(300)
+    ]
+    index = BM25Index.from_corpus(corpus)
+    assert (index.get_scores(["c0"]) < 0).any()
+
+    for query in itertools.combinations(common + ["r0", "r1"], 3):
+        for k in (1, 3, 10):
+            doc_ids, scores = index.top_k(list(query), k)
+            block_max_doc_ids, block_max_scores = index.top_k(
+                list(query), k, query_mode=BM25QueryMode.BLOCK_MAX
+            )
+            np.testing.assert_array_equal(block_max_doc_ids, doc_ids)
+            np.testing.assert_array_equal(block_max_scores, scores)
@@ -0,0 +1,62 @@
+from typing import List
+
+from rag.node.base_node import TextNode
+from rag.retrievers.sparse import BM25Retriever
+
+TEXTS = [
+    "apple pie with cinnamon",
+    "banana bread recipe",
+    "apple and banana smoothie",
+    "cherry tart",
+    "green apple sorbet",
+    "plain bread",
+]
+
+
+def _make_nodes() -> List[TextNode]:
+    return [TextNode(id_=f"n{i}", text=text) for i, text in enumerate(TEXTS)]
+
+
+def _retrieve(retriever: BM25Retriever, query: str) -> List[tuple]:
+    return [(n.node.node_id, round(n.score, 6)) for n in retriever.retrieve(query)]
+
+
+def test_parallel_build_equals_serial_build() -> None:
+    serial = BM25Retriever(_make_nodes(), tokenizer=str.split, similarity_top_k=3)
+    parallel = BM25Retriever(
+        _make_nodes(), tokenizer=str.split, similarity_top_k=3, num_workers=2
+    )
+    for query in ["apple", "banana bread", "cherry apple sorbet"]:
+        assert _retrieve(parallel, query) == _retrieve(serial, query)
+
+
+def test_persist_and_reload(tmp_path) -> None:
+    nodes = _make_nodes()
+    retriever = BM25Retriever(nodes, tokenizer=str.split, similarity_top_k=3)
+    retriever.delete_nodes(["n0"])
+    retriever.persist(str(tmp_path))
+
+    loaded = BM25Retriever.from_persist_dir(
+        str(tmp_path), nodes=nodes[1:], tokenizer=str.split, similarity_top_k=3
+    )
+    assert _retrieve(loaded, "apple bread") == _retrieve(retriever, "apple bread")
+    loaded.compact()
+    assert _retrieve(loaded, "apple bread") == _retrieve(retriever, "apple bread")
+
+
+def test_insert_replaces_and_dedups_node_ids() -> None:
+    nodes = [
+        TextNode(id_="x", text="apple pie"),
+        TextNode(id_="x", text="apple tart"),
+        TextNode(id_="y", text="banana"),
+    ]
+    retriever = BM25Retriever(nodes, tokenizer=str.split, similarity_top_k=5)
+    results = retriever.retrieve("apple")
+    assert [n.node.node_id for n in results] == ["x"]
+    assert results[0].node.get_content() == "apple tart"
+
+    retriever.insert_nodes([TextNode(id_="y", text="apple banana")])
+    assert {n.node.node_id for n in retriever.retrieve("apple")} == {"x", "y"}
+
+    retriever.delete_nodes(["x"])
+    assert [n.node.node_id for n in retriever.retrieve("apple")] == ["y"]
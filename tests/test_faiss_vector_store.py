@@ -0,0 +1,190 @@
+from typing import List
+
+import numpy as np
+import pytest
+
+from rag.node.base_node import TextNode
+from rag.node.types import NodeRelationship, RelatedNodeInfo
+from rag.vector_stores.faiss import (
+    FaissIndexType,
+    FaissVectorStore,
+    create_faiss_index,
+)
+from rag.vector_stores.types import (
+    ExactMatchFilter,
+    MetadataFilters,
+    VectorStoreQuery,
+)
+
+faiss = pytest.importorskip("faiss")
+
+DIM = 16
+
+
+def _make_nodes(num_nodes: int = 200, seed: int = 0) -> List[TextNode]:
+    rng = np.random.default_rng(seed)
+    return [
+        TextNode(
+            id_=f"n{i}",
+            text=f"text {i}",
+            embedding=rng.standard_normal(DIM).tolist(),
+            metadata={"parity": i % 2},
+            relationships={
+                NodeRelationship.SOURCE: RelatedNodeInfo(node_id=f"doc{i % 10}")
+            },
+        )
+        for i in range(num_nodes)
+    ]
+
+
+def _make_queries(num_queries: int = 10, seed: int = 1) -> List[VectorStoreQuery]:
+    rng = np.random.default_rng(seed)
+    return [
+        VectorStoreQuery(
+            query_embedding=rng.standard_normal(DIM).tolist(), similarity_top_k=5
+        )
+        for _ in range(num_queries)
+    ]
+
+
+def _brute_force_ids(nodes: List[TextNode], query: VectorStoreQuery) -> List[str]:
+    embeddings = np.array([node.get_embedding() for node in nodes])
+    dists = ((embeddings - np.array(query.query_embedding)) ** 2).sum(axis=1)
+    top_rows = np.argsort(dists)[: query.similarity_top_k]
+    return [nodes[row].node_id for row in top_rows]
+
+
+def _live_nodes(nodes: List[TextNode], deleted_doc_ids: List[str]) -> List[TextNode]:
+    return [node for node in nodes if node.ref_doc_id not in deleted_doc_ids]
+
+
+def _replace_nodes(nodes: List[TextNode], added: List[TextNode]) -> List[TextNode]:
+    live_nodes = {node.node_id: node for node in nodes}
+    live_nodes.update((node.node_id, node) for node in added)
+    return list(live_nodes.values())
+
+
+@pytest.mark.parametrize(
+    "index_build", [FaissIndexType.FLAT_L2, FaissIndexType.HNSW]
+)
+def test_delete_and_re_add(index_build: FaissIndexType) -> None:
+    nodes = _make_nodes()
+    store = FaissVectorStore(
+        create_faiss_index(DIM, index_build=index_build, ef_search=256)
+    )
+    assert store.add(nodes) == [node.node_id for node in nodes]
+    store.delete("doc3")
+    store.delete("doc7")
+
+    live_nodes = _live_nodes(nodes, ["doc3", "doc7"])
+    for query in _make_queries():
+        assert store.query(query).ids == _brute_force_ids(live_nodes, query)
+
+    # re-added nodes replace their previous vector
+    moved = _make_nodes(seed=2)[:5]
+    store.add(moved)
+    live_nodes = _replace_nodes(live_nodes, moved)
+    for query in _make_queries():
+        assert store.query(query).ids == _brute_force_ids(live_nodes, query)
+
+
+def test_restricted_queries() -> None:
+    nodes = _make_nodes()
+    store = FaissVectorStore(create_faiss_index(DIM))
+    store.add(nodes)
+    store.delete("doc3")
+
+    node_ids = [f"n{i}" for i in range(0, 200, 3)]
+    filters = MetadataFilters(filters=[ExactMatchFilter(key="parity", value=1)])
+    for query in _make_queries():
+        query.node_ids = node_ids
+        candidates = [
+            node for node in _live_nodes(nodes, ["doc3"]) if node.node_id in node_ids
+        ]
+        assert store.query(query).ids == _brute_force_ids(candidates, query)
+
+        query.filters = filters
+        candidates = [node for node in candidates if node.metadata["parity"] == 1]
+        assert store.query(query).ids == _brute_force_ids(candidates, query)
+
+        query.node_ids = None
+        query.filters = None
+        query.doc_ids = ["doc1", "doc3"]
+        candidates = [node for node in nodes if node.ref_doc_id == "doc1"]
+        assert store.query(query).ids == _brute_force_ids(candidates, query)
+
+
+def test_batch_query_matches_query() -> None:
+    store = FaissVectorStore(create_faiss_index(DIM))
+    store.add(_make_nodes())
+    queries = _make_queries()
+    queries[1].similarity_top_k = 2
+    queries[2].node_ids = ["n1", "n2", "n3"]
+
+    for query, result in zip(queries, store.batch_query(queries)):
+        expected = store.query(query)
+        assert result.ids == expected.ids
+        np.testing.assert_allclose(result.similarities, expected.similarities)
+
+
+@pytest.mark.parametrize(
+    "index_build", [FaissIndexType.FLAT_L2, FaissIndexType.HNSW]
+)
+def test_persist_and_reload(tmp_path, index_build: FaissIndexType) -> None:
+    nodes = _make_nodes()
+    store = FaissVectorStore(
+        create_faiss_index(DIM, index_build=index_build, ef_search=256)
+    )
+    store.add(nodes)
+    store.delete("doc3")
+    persist_path = str(tmp_path / "vector_store.json")
+    store.persist(persist_path)
+
+    loaded = FaissVectorStore.from_persist_path(persist_path)
+    live_nodes = _live_nodes(nodes, ["doc3"])
+    for query in _make_queries():
+        assert loaded.query(query).ids == _brute_force_ids(live_nodes, query)
+
+    # the id map keeps working after a reload
+    loaded.delete("doc5")
+    loaded.add(_make_nodes(5, seed=2))
+    live_nodes = _live_nodes(live_nodes, ["doc5"])
+    live_nodes = _replace_nodes(live_nodes, _make_nodes(5, seed=2))
+    for query in _make_queries():
+        assert loaded.query(query).ids == _brute_force_ids(live_nodes, query)
+
+
+def test_ivf_trains_on_buffered_embeddings() -> None:
+    nodes = _make_nodes(400)
+    faiss_index = create_faiss_index(
+        DIM, index_build=FaissIndexType.IVF, nlist=4, nprobe=4
+    )
+    store = FaissVectorStore(faiss_index, train_sample_size=300)
+
+    store.add(nodes[:100])
+    store.add(nodes[100:250])
+    # deleted from the buffer, before training
+    store.delete("doc3")
+    assert not faiss_index.is_trained
+    store.add(nodes[250:350])
+    assert faiss_index.is_trained
+    store.add(nodes[350:])
+
+    # visiting every list, IVF-Flat search is exact
+    live_nodes = _live_nodes(nodes[:250], ["doc3"]) + nodes[250:]
+    for query in _make_queries():
+        assert store.query(query).ids == _brute_force_ids(live_nodes, query)
+
+
+def test_ivf_trains_before_querying() -> None:
+    nodes = _make_nodes(100)
+    faiss_index = create_faiss_index(
+        DIM, index_build=FaissIndexType.IVF, nlist=2, nprobe=2
+    )
+    store = FaissVectorStore(faiss_index)
+    store.add(nodes)
+    assert not faiss_index.is_trained
+
+    for query in _make_queries():
+        assert store.query(query).ids == _brute_force_ids(nodes, query)
+    assert faiss_index.is_trained
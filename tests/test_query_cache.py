@@ -0,0 +1,171 @@
+import asyncio
+import threading
+import time
+from typing import List
+
+import pytest
+
+from rag.bridge.pydantic import PrivateAttr
+from rag.embeddings import query_cache
+from rag.embeddings.mock import MockEmbedding
+from rag.embeddings.query_cache import CacheLookup, QueryEmbeddingCache
+
+
+class CountingEmbedding(MockEmbedding):
+    """Mock embedding recording the queries sent to the model."""
+
+    _queries: List[str] = PrivateAttr(default_factory=list)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        self._queries.append(query)
+        return [float(len(query))] * self.embed_dim
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        self._queries.append(query)
+        await asyncio.sleep(0.01)
+        return [float(len(query))] * self.embed_dim
+
+
+def _wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_lru_eviction_and_copies() -> None:
+    cache = QueryEmbeddingCache(max_size=2)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    assert cache.get("a") == [1.0]
+    cache.put("c", [3.0])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0]
+    cache.get("c").append(0.0)
+    assert cache.get("c") == [3.0]
+    assert cache.stats["evictions"] == 1
+    assert cache.stats["size"] == 2
+
+
+def test_ttl_expiry(monkeypatch) -> None:
+    now = [100.0]
+    monkeypatch.setattr(query_cache.time, "monotonic", lambda: now[0])
+    cache = QueryEmbeddingCache(ttl=10)
+    cache.put("a", [1.0])
+    now[0] += 9
+    assert cache.get("a") == [1.0]
+    now[0] += 2
+    assert cache.get("a") is None
+    assert cache.stats["expirations"] == 1
+
+
+def test_concurrent_lookups_share_one_call() -> None:
+    cache = QueryEmbeddingCache()
+    release = threading.Event()
+    calls = []
+
+    def compute() -> List[float]:
+        calls.append(1)
+        release.wait()
+        return [1.0]
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(cache.get_or_compute("q", compute))
+        )
+        for _ in range(3)
+    ]
+    threads[0].start()
+    _wait_for(lambda: calls)
+    for thread in threads[1:]:
+        thread.start()
+    _wait_for(lambda: cache.coalesced == 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(lookup for _, lookup in results) == sorted(
+        [CacheLookup.MISS, CacheLookup.COALESCED, CacheLookup.COALESCED]
+    )
+    assert all(embedding == [1.0] for embedding, _ in results)
+    assert cache.get_or_compute("q", compute) == ([1.0], CacheLookup.HIT)
+
+
+def test_failed_call_is_raised_to_waiters_and_not_cached() -> None:
+    cache = QueryEmbeddingCache()
+    release = threading.Event()
+
+    def compute() -> List[float]:
+        release.wait()
+        raise RuntimeError("model down")
+
+    errors = []
+
+    def lookup() -> None:
+        try:
+            cache.get_or_compute("q", compute)
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=lookup) for _ in range(2)]
+    threads[0].start()
+    _wait_for(lambda: cache.misses == 1)
+    threads[1].start()
+    _wait_for(lambda: cache.coalesced == 1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 2
+    assert len(cache) == 0
+    assert cache.get_or_compute("q", lambda: [2.0]) == ([2.0], CacheLookup.MISS)
+
+
+def test_embedding_model_caches_queries() -> None:
+    embed_model = CountingEmbedding(embed_dim=2, query_cache_size=1)
+    assert embed_model.get_query_embedding("ab") == [2.0, 2.0]
+    assert embed_model.get_query_embedding("ab") == [2.0, 2.0]
+    embed_model.get_query_embedding("c")
+    embed_model.get_query_embedding("ab")
+    assert embed_model._queries == ["ab", "c", "ab"]
+    assert embed_model.query_cache_stats["hits"] == 1
+
+    embed_model.query_cache_size = 0
+    embed_model.get_query_embedding("c")
+    embed_model.get_query_embedding("c")
+    assert embed_model._queries == ["ab", "c", "ab", "c", "c"]
+
+
+def test_embedding_model_coalesces_async_queries() -> None:
+    embed_model = CountingEmbedding(embed_dim=2)
+
+    async def run() -> List[List[float]]:
+        return await asyncio.gather(
+            *[embed_model.aget_query_embedding("ab") for _ in range(5)],
+            embed_model.aget_query_embedding("c"),
+        )
+
+    embeddings = asyncio.run(run())
+    assert embeddings == [[2.0, 2.0]] * 5 + [[1.0, 1.0]]
+    assert sorted(embed_model._queries) == ["ab", "c"]
+    stats = embed_model.query_cache_stats
+    assert (stats["misses"], stats["coalesced"]) == (2, 4)
+
+
+def test_cancelled_waiter_does_not_cancel_the_shared_call() -> None:
+    embed_model = CountingEmbedding(embed_dim=2)
+
+    async def run() -> List[float]:
+        first = asyncio.ensure_future(embed_model.aget_query_embedding("ab"))
+        waiter = asyncio.ensure_future(embed_model.aget_query_embedding("ab"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return await first
+
+    assert asyncio.run(run()) == [2.0, 2.0]
+    assert embed_model._queries == ["ab"]
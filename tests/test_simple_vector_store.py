@@ -0,0 +1,111 @@
+from typing import List
+
+import numpy as np
+import pytest
+
+from rag.node.base_node import TextNode
+from rag.node.types import NodeRelationship, RelatedNodeInfo
+from rag.vector_stores.simple import SimpleVectorStore, SimpleVectorStoreMode
+from rag.vector_stores.types import (
+    ExactMatchFilter,
+    MetadataFilters,
+    VectorStoreQuery,
+)
+
+DIM = 16
+
+
+def _make_nodes(num_nodes: int = 50, seed: int = 0) -> List[TextNode]:
+    rng = np.random.default_rng(seed)
+    return [
+        TextNode(
+            id_=f"n{i}",
+            text=f"text {i}",
+            embedding=rng.standard_normal(DIM).tolist(),
+            metadata={"parity": i % 2},
+            relationships={
+                NodeRelationship.SOURCE: RelatedNodeInfo(node_id=f"doc{i % 5}")
+            },
+        )
+        for i in range(num_nodes)
+    ]
+
+
+def _make_queries(num_queries: int = 10, seed: int = 1) -> List[VectorStoreQuery]:
+    rng = np.random.default_rng(seed)
+    return [
+        VectorStoreQuery(
+            query_embedding=rng.standard_normal(DIM).tolist(), similarity_top_k=5
+        )
+        for _ in range(num_queries)
+    ]
+
+
+def _make_store(storage_mode: SimpleVectorStoreMode) -> SimpleVectorStore:
+    store = SimpleVectorStore(storage_mode=storage_mode)
+    store.add(_make_nodes())
+    store.delete("doc3")
+    return store
+
+
+def _assert_same_results(
+    store: SimpleVectorStore, reference: SimpleVectorStore, query: VectorStoreQuery
+) -> None:
+    result = store.query(query)
+    expected = reference.query(query)
+    assert result.ids == expected.ids
+    np.testing.assert_allclose(result.similarities, expected.similarities, atol=1e-5)
+
+
+def test_matrix_mode_matches_dict_mode() -> None:
+    dict_store = _make_store(SimpleVectorStoreMode.DICT)
+    matrix_store = _make_store(SimpleVectorStoreMode.MATRIX)
+    assert matrix_store.to_dict() == dict_store.to_dict()
+
+    filters = MetadataFilters(filters=[ExactMatchFilter(key="parity", value=1)])
+    node_ids = [f"n{i}" for i in range(0, 50, 3)]
+    for query in _make_queries():
+        _assert_same_results(matrix_store, dict_store, query)
+        query.node_ids = node_ids
+        _assert_same_results(matrix_store, dict_store, query)
+        query.filters = filters
+        _assert_same_results(matrix_store, dict_store, query)
+
+
+def test_batch_query_matches_query() -> None:
+    store = _make_store(SimpleVectorStoreMode.MATRIX)
+    node_ids = [f"n{i}" for i in range(0, 50, 2)]
+    queries = _make_queries()
+    for query in queries[::2]:
+        query.node_ids = node_ids
+    queries[1].similarity_top_k = 2
+
+    for query, result in zip(queries, store.batch_query(queries)):
+        expected = store.query(query)
+        assert result.ids == expected.ids
+        np.testing.assert_allclose(
+            result.similarities, expected.similarities, atol=1e-5
+        )
+
+
+def test_matrix_persist_mmap_reload(tmp_path) -> None:
+    store = _make_store(SimpleVectorStoreMode.MATRIX)
+    persist_path = str(tmp_path / "vector_store.json")
+    store.persist(persist_path)
+
+    loaded = SimpleVectorStore.from_persist_path(persist_path)
+    assert loaded.storage_mode == SimpleVectorStoreMode.MATRIX
+    for query in _make_queries():
+        _assert_same_results(loaded, store, query)
+
+    # the memory-mapped store still takes updates
+    loaded.add(_make_nodes(5, seed=2)[3:])
+    loaded.delete("doc1")
+    assert loaded.get("n3") == pytest.approx(_make_nodes(5, seed=2)[3].embedding)
+
+    dict_store = SimpleVectorStore.from_persist_path(
+        persist_path, storage_mode=SimpleVectorStoreMode.DICT
+    )
+    assert dict_store.storage_mode == SimpleVectorStoreMode.DICT
+    for query in _make_queries():
+        _assert_same_results(dict_store, store, query)